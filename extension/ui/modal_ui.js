@@ -127,6 +127,10 @@ async function submitJobData(modal) {
             toggleModalFeedback('duplicate', 'Smart move — but we already got this one.');
             return;
         }
+        if (result.status === 'possible_duplicate') {
+            toggleModalFeedback('success', 'Logged! Heads up: looks like a repost of a job we already got.');
+            return;
+        }
         if (result.status === 'limit_reached') {
             toggleModalFeedback('error', result.message || 'That’s all for today, legend. Let’s continue the grind tomorrow.');
             return;
@@ -1,8 +1,13 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, send_file, jsonify
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import os
 from dotenv import load_dotenv
-from .zip_utils import generate_zip_for_date, get_past_utc_dates, get_db_connection
+from .zip_utils import generate_zip_for_date, get_past_utc_dates, EXPORT_FORMATS, DEFAULT_EXPORT_FORMAT
+from .range_export import start_range_export, get_range_export, range_zip_path
+from partitions import ArchivePending
+from rollups import MAX_RANGE_DAYS
+from search import parse_search_args, search_page
+from storage import get_storage
 
 # ✅ Load .env variables
 load_dotenv()
@@ -61,12 +66,78 @@ def download_zip(date_str):
     if not session.get("logged_in"):
         return redirect(url_for("auth.admin_login"))
 
-    zip_path = generate_zip_for_date(date_str)
+    export_format = request.args.get("format", DEFAULT_EXPORT_FORMAT).lower()
+    if export_format not in EXPORT_FORMATS:
+        return f"Unsupported format '{export_format}'. Use one of: {', '.join(EXPORT_FORMATS)}", 400
+    try:
+        date.fromisoformat(date_str)
+    except ValueError:
+        return "Invalid date, expected YYYY-MM-DD", 400
+
+    try:
+        zip_path = generate_zip_for_date(date_str, export_format)
+    except ArchivePending as e:
+        return str(e), 503
+    except Exception as e:
+        return f"Export failed: {e}", 500
     if zip_path and os.path.exists(zip_path):
         return send_file(zip_path, as_attachment=True)
     else:
         return f"No data found for {date_str}", 404
 
+# ✅ Range export, built in the background (POST from=2025-01-01&to=2025-01-31&format=csv)
+@auth_bp.route('/admin/exports', methods=['POST'])
+def start_range_export_json():
+    if not session.get("logged_in"):
+        return jsonify({"status": "unauthorized"}), 401
+
+    params = request.get_json(silent=True) or request.form
+    try:
+        start_day = date.fromisoformat(params.get("from", ""))
+        end_day = date.fromisoformat(params.get("to", ""))
+    except ValueError:
+        return jsonify({"status": "error", "message": "from and to must be YYYY-MM-DD dates"}), 400
+
+    try:
+        job = start_range_export(start_day, end_day, params.get("format", DEFAULT_EXPORT_FORMAT).lower())
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    return jsonify({
+        "status": "success",
+        **job,
+        "status_url": url_for("auth.range_export_status", job_id=job["job_id"])
+    }), 202
+
+# ✅ Range export progress, with the download link once it's done
+@auth_bp.route('/admin/exports/<job_id>')
+def range_export_status(job_id):
+    if not session.get("logged_in"):
+        return jsonify({"status": "unauthorized"}), 401
+
+    job = get_range_export(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Unknown export"}), 404
+
+    download_url = None
+    if job["state"] == "done" and job["jobs"]:
+        download_url = url_for("auth.download_range_export", job_id=job_id)
+    return jsonify({"status": "success", **job, "download_url": download_url})
+
+@auth_bp.route('/admin/exports/<job_id>/download')
+def download_range_export(job_id):
+    if not session.get("logged_in"):
+        return redirect(url_for("auth.admin_login"))
+
+    job = get_range_export(job_id)
+    if job is None or job["state"] != "done" or not job["jobs"]:
+        return "Export not found or not ready", 404
+    try:
+        return send_file(range_zip_path(job_id), as_attachment=True,
+                         download_name=f"jobs_{job['from']}_to_{job['to']}_{job['format']}.zip")
+    except FileNotFoundError:
+        return "Export expired, start it again", 404
+
 # ✅ Logout
 @auth_bp.route('/admin/logout')
 def logout():
@@ -80,29 +151,8 @@ def get_summary_json(date_str):
         return jsonify({"status": "unauthorized"}), 401
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        query = """
-        SELECT domain, COUNT(*) as count
-        FROM jobs
-        WHERE DATE(timestamp AT TIME ZONE 'UTC') = %s
-        GROUP BY domain;
-        """
-        cur.execute(query, (date_str,))
-        rows = cur.fetchall()
-
-        total_jobs = sum(row['count'] for row in rows)
-        breakdown = {row['domain']: row['count'] for row in rows}
-
-        cur.execute("""
-        SELECT COUNT(DISTINCT user_id) FROM jobs
-        WHERE DATE(timestamp AT TIME ZONE 'UTC') = %s
-        """, (date_str,))
-        users = cur.fetchone()['count']
-
-        cur.close()
-        conn.close()
+        day = date.fromisoformat(date_str)
+        total_jobs, users, breakdown = get_storage().day_summary(day)
 
         return jsonify({
             "status": "success",
@@ -114,3 +164,52 @@ def get_summary_json(date_str):
 
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)})
+
+# ✅ Range summary (e.g. /admin/summary?from=2025-01-01&to=2025-01-31)
+@auth_bp.route('/admin/summary')
+def get_range_summary_json():
+    if not session.get("logged_in"):
+        return jsonify({"status": "unauthorized"}), 401
+
+    try:
+        start_day = date.fromisoformat(request.args.get("from", ""))
+        end_day = date.fromisoformat(request.args.get("to", ""))
+    except ValueError:
+        return jsonify({"status": "error", "message": "from and to must be YYYY-MM-DD dates"}), 400
+    if end_day < start_day:
+        return jsonify({"status": "error", "message": "'to' must not be before 'from'"}), 400
+    if (end_day - start_day).days + 1 > MAX_RANGE_DAYS:
+        return jsonify({"status": "error", "message": f"Ranges are limited to {MAX_RANGE_DAYS} days"}), 400
+
+    try:
+        summary = get_storage().range_summary(start_day, end_day)
+
+        return jsonify({
+            "status": "success",
+            "from": start_day.isoformat(),
+            "to": end_day.isoformat(),
+            **summary
+        })
+
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)})
+
+# ✅ Job search (e.g. /admin/search?q=kubernetes+fintech&domain=devops&from=2025-01-01&cursor=...)
+@auth_bp.route('/admin/search')
+def search_jobs_json():
+    if not session.get("logged_in"):
+        return jsonify({"status": "unauthorized"}), 401
+
+    try:
+        params = parse_search_args(request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    try:
+        # One extra row tells whether there is a next page
+        limit = params.pop("limit")
+        results = get_storage().search_jobs(limit=limit + 1, **params)
+        return jsonify(search_page(results, limit))
+
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)})
@@ -0,0 +1,109 @@
+# export_cache.py - Background pre-generation and eviction of cached export ZIPs
+#
+# One process per host (whichever grabs the lock file first) rebuilds the ZIPs
+# for the previous EXPORT_PREWARM_DAYS UTC days shown on the dashboard, so
+# downloads are served straight from the cache, and keeps EXPORTS_DIR under
+# EXPORTS_MAX_BYTES / EXPORTS_MAX_AGE_DAYS.
+
+import fcntl
+import os
+import shutil
+import threading
+import time
+
+from .zip_utils import EXPORTS_DIR, DEFAULT_EXPORT_FORMAT, ensure_exports_dir, generate_zip_for_date, get_past_utc_dates
+
+EXPORT_PREWARM_DAYS = int(os.getenv("EXPORT_PREWARM_DAYS", 7))
+EXPORT_PREWARM_FORMATS = os.getenv("EXPORT_PREWARM_FORMATS", DEFAULT_EXPORT_FORMAT).split(",")
+EXPORT_PREWARM_INTERVAL = float(os.getenv("EXPORT_PREWARM_INTERVAL", 900))     # seconds between passes
+EXPORT_PREWARM_DELAY = float(os.getenv("EXPORT_PREWARM_DELAY", 60))            # let startup traffic go first
+EXPORTS_MAX_BYTES = int(os.getenv("EXPORTS_MAX_BYTES", 500 * 1024 * 1024))
+EXPORTS_MAX_AGE_DAYS = float(os.getenv("EXPORTS_MAX_AGE_DAYS", 14))
+STALE_TMP_SECONDS = 3600  # leftovers from a crashed export
+
+
+def evict_exports(max_bytes=EXPORTS_MAX_BYTES, max_age_days=EXPORTS_MAX_AGE_DAYS):
+    """Delete expired ZIPs (and range export status files), then least recently
+    used ZIPs until under max_bytes"""
+    now = time.time()
+    entries = []
+    removed = 0
+    for name in os.listdir(ensure_exports_dir()):
+        path = os.path.join(EXPORTS_DIR, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        age = now - stat.st_mtime
+        if not os.path.isfile(path):
+            if name.endswith(".tmp") and age > STALE_TMP_SECONDS:
+                shutil.rmtree(path, ignore_errors=True)  # A range export's work dir
+                removed += 1
+            continue
+
+        expired = name.endswith((".zip", ".json")) and age > max_age_days * 86400
+        stale_tmp = name.endswith(".tmp") and age > STALE_TMP_SECONDS
+        if expired or stale_tmp:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        elif name.endswith(".zip"):
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+    return removed
+
+
+def prewarm_exports():
+    """Build (or refresh) the cached ZIPs for the recent days on the dashboard"""
+    for date_str in get_past_utc_dates(EXPORT_PREWARM_DAYS):
+        for export_format in EXPORT_PREWARM_FORMATS:
+            try:
+                generate_zip_for_date(date_str, export_format.strip())
+            except Exception as e:
+                print(f"⚠️ Could not prewarm the {export_format.strip()} export for {date_str}: {e}")
+    evict_exports()
+
+
+def _prewarm_loop(lock_file):
+    time.sleep(EXPORT_PREWARM_DELAY)
+    while True:
+        try:
+            prewarm_exports()
+        except Exception as e:
+            print(f"⚠️ Export prewarm failed: {e}")
+        time.sleep(EXPORT_PREWARM_INTERVAL)
+
+
+_prewarm_thread = None
+
+
+def start_export_prewarm():
+    """Start the prewarm thread if no other process on this host runs one"""
+    global _prewarm_thread
+    if _prewarm_thread is not None:
+        return False
+
+    lock_file = open(os.path.join(ensure_exports_dir(), ".prewarm.lock"), "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()  # Another worker already owns it
+        return False
+
+    # The lock is held for the life of the process via lock_file
+    _prewarm_thread = threading.Thread(target=_prewarm_loop, args=(lock_file,),
+                                       name="export-prewarm", daemon=True)
+    _prewarm_thread.start()
+    return True
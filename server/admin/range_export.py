@@ -0,0 +1,262 @@
+# range_export.py - Date-range exports built in the background on a process pool
+#
+# An export of [from, to] is split into one task per (day, domain) with jobs,
+# planned from the rollups and run largest first across EXPORT_WORKERS spawned
+# processes, each streaming its slice from the storage backend (or the day's
+# archive) into a file with the same writers as the one-day export. A runner
+# thread in the process that accepted the request adds each finished file to
+# one ZIP - <domain>/jobs_<domain>_<date>.<ext>, the one-day layout - and ends
+# it with summary.csv (jobs per domain and day, with totals).
+#
+# The job's state lives in EXPORTS_DIR/range_<job_id>.json, rewritten as tasks
+# finish, so whichever worker gets the progress poll can answer it; the ZIP
+# lands next to it and is evicted with the cached ZIPs. Jobs run one at a time
+# per server process, queued behind each other. From the command line:
+#
+#     python -m admin.range_export --from 2025-01-01 --to 2025-01-31 [--format csv] [--out jobs.zip]
+
+import argparse
+import csv
+import io
+import json
+import multiprocessing
+import os
+import re
+import secrets
+import shutil
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+from metrics import EXPORT_ROWS, EXPORT_FAILURES
+from storage import get_storage
+from .zip_utils import EXPORTS_DIR, EXPORT_FORMATS, DEFAULT_EXPORT_FORMAT, ensure_exports_dir, stream_jobs_for_date
+
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", os.cpu_count() or 1))  # processes per range export
+EXPORT_RANGE_MAX_DAYS = int(os.getenv("EXPORT_RANGE_MAX_DAYS", 31))
+
+JOB_ID_RE = re.compile(r"^[0-9a-f]{16}$")
+ACTIVE_STATES = ("queued", "running")
+
+
+# ---- Tasks (run in the pool processes) ------------------------------------
+
+def export_day_domain(date_str, domain, export_format, work_dir):
+    """Write one domain's jobs of one UTC day to a file in work_dir; returns
+    (date_str, domain, file path, job count)"""
+    extension, write_domain_file, _ = EXPORT_FORMATS[export_format]
+    file_path = os.path.join(work_dir, f"jobs_{domain}_{date_str}.{extension}")
+    count = write_domain_file((row[1:] for row in stream_jobs_for_date(date_str, domain)), file_path)
+    return date_str, domain, file_path, count
+
+
+def plan_range_export(start_day, end_day):
+    """(date_str, domain) tasks for the days' domains with jobs, largest first"""
+    storage = get_storage()
+    tasks = []
+    day = start_day
+    while day <= end_day:
+        _, _, breakdown = storage.day_summary(day)
+        tasks.extend((count, day.isoformat(), domain) for domain, count in breakdown.items() if count)
+        day += timedelta(days=1)
+    # Big slices first, so the pool doesn't end waiting on one that started last
+    return [(date_str, domain) for _, date_str, domain in sorted(tasks, key=lambda task: -task[0])]
+
+
+def summary_csv(counts, dates):
+    """Jobs per domain (rows) and day (columns), with totals"""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["domain", *dates, "total"])
+    for domain in sorted(counts):
+        by_day = counts[domain]
+        writer.writerow([domain, *(by_day.get(d, 0) for d in dates), sum(by_day.values())])
+    writer.writerow(["total", *(sum(by_day.get(d, 0) for by_day in counts.values()) for d in dates),
+                     sum(sum(by_day.values()) for by_day in counts.values())])
+    return out.getvalue()
+
+
+def build_range_zip(start_day, end_day, export_format, zip_path, progress=None, workers=EXPORT_WORKERS):
+    """Export [start_day, end_day] into zip_path; returns the job count (0, and
+    no ZIP, if there were none). progress(tasks_done, tasks_total, jobs) is
+    called as tasks finish."""
+    _, _, compression = EXPORT_FORMATS[export_format]
+    tasks = plan_range_export(start_day, end_day)
+    if progress:
+        progress(0, len(tasks), 0)
+    if not tasks:
+        return 0
+
+    dates = [(start_day + timedelta(days=i)).isoformat() for i in range((end_day - start_day).days + 1)]
+    counts = {}  # domain -> {date_str: jobs}
+    total_jobs = 0
+    work_dir = f"{zip_path}.tmp"
+    tmp_zip_path = f"{zip_path}.{os.getpid()}.tmp"
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        # Spawned rather than forked: a fork of a threaded server process could
+        # inherit held locks and its database connections
+        with ProcessPoolExecutor(max(1, min(workers, len(tasks))),
+                                 mp_context=multiprocessing.get_context("spawn")) as pool, \
+                zipfile.ZipFile(tmp_zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
+            futures = [pool.submit(export_day_domain, date_str, domain, export_format, work_dir)
+                       for date_str, domain in tasks]
+            for done, future in enumerate(as_completed(futures), 1):
+                date_str, domain, file_path, count = future.result()
+                try:
+                    zipf.write(file_path, arcname=f"{domain}/{os.path.basename(file_path)}",
+                               compress_type=compression)
+                finally:
+                    os.remove(file_path)
+                counts.setdefault(domain, {})[date_str] = count
+                total_jobs += count
+                if progress:
+                    progress(done, len(tasks), total_jobs)
+            zipf.writestr("summary.csv", summary_csv(counts, dates))
+
+        os.replace(tmp_zip_path, zip_path)
+    finally:
+        if os.path.exists(tmp_zip_path):
+            os.remove(tmp_zip_path)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    EXPORT_ROWS.inc(total_jobs, export_format)
+    return total_jobs
+
+
+# ---- Tracked jobs ---------------------------------------------------------
+
+def _status_path(job_id):
+    return os.path.join(EXPORTS_DIR, f"range_{job_id}.json")
+
+
+def range_zip_path(job_id):
+    return os.path.join(EXPORTS_DIR, f"range_{job_id}.zip")
+
+
+def _write_status(job_id, status):
+    status["updated_at"] = datetime.utcnow().isoformat(timespec="seconds")
+    path = _status_path(job_id)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(status, f)
+    os.replace(tmp_path, path)  # Pollers never read a half-written file
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def get_range_export(job_id):
+    """The job's status dict, None if there is no such job"""
+    if not JOB_ID_RE.match(job_id):
+        return None
+    try:
+        with open(_status_path(job_id)) as f:
+            status = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    if status["state"] in ACTIVE_STATES and not _process_alive(status["pid"]):
+        status.update(state="failed", error="Interrupted: the server process running it exited")
+    elif status["state"] == "done" and status["jobs"] and not os.path.exists(range_zip_path(job_id)):
+        status.update(state="expired")
+    return status
+
+
+def _run_range_export(job_id, status):
+    start_day, end_day = date.fromisoformat(status["from"]), date.fromisoformat(status["to"])
+
+    def progress(tasks_done, tasks_total, jobs):
+        status.update(tasks_done=tasks_done, tasks_total=tasks_total, jobs=jobs)
+        _write_status(job_id, status)
+
+    status["state"] = "running"
+    _write_status(job_id, status)
+    started = time.monotonic()
+    try:
+        build_range_zip(start_day, end_day, status["format"], range_zip_path(job_id), progress)
+        status["state"] = "done"
+        print(f"✅ Range export {job_id} ({status['from']} to {status['to']}): {status['jobs']} jobs "
+              f"in {time.monotonic() - started:.1f}s")
+    except Exception as e:
+        EXPORT_FAILURES.inc(1, status["format"])
+        status.update(state="failed", error=str(e))
+        print(f"❌ Range export {job_id} failed: {e}")
+    _write_status(job_id, status)
+
+
+_runner = None
+_runner_pid = None
+_runner_lock = threading.Lock()
+
+
+def _get_runner():
+    """This process's single export thread (exports queue behind each other)"""
+    global _runner, _runner_pid
+    pid = os.getpid()
+    if _runner is None or _runner_pid != pid:
+        with _runner_lock:
+            if _runner is None or _runner_pid != pid:
+                _runner = ThreadPoolExecutor(1, thread_name_prefix="range-export")
+                _runner_pid = pid
+    return _runner
+
+
+def start_range_export(start_day, end_day, export_format=DEFAULT_EXPORT_FORMAT):
+    """Queue an export of [start_day, end_day]; returns its status dict"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported format '{export_format}'. Use one of: {', '.join(EXPORT_FORMATS)}")
+    if end_day < start_day:
+        raise ValueError("'to' must not be before 'from'")
+    if (end_day - start_day).days + 1 > EXPORT_RANGE_MAX_DAYS:
+        raise ValueError(f"Exports are limited to {EXPORT_RANGE_MAX_DAYS} days")
+
+    ensure_exports_dir()
+    job_id = secrets.token_hex(8)
+    status = {
+        "job_id": job_id,
+        "state": "queued",
+        "from": start_day.isoformat(),
+        "to": end_day.isoformat(),
+        "format": export_format,
+        "tasks_total": None,
+        "tasks_done": 0,
+        "jobs": 0,
+        "error": None,
+        "pid": os.getpid(),
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+    }
+    _write_status(job_id, status)
+    _get_runner().submit(_run_range_export, job_id, dict(status))
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a range of UTC days into one ZIP")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, required=True, help="first UTC day")
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, required=True, help="last UTC day (inclusive)")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default=DEFAULT_EXPORT_FORMAT)
+    parser.add_argument("--workers", type=int, default=EXPORT_WORKERS, help="export processes")
+    parser.add_argument("--out", help="ZIP to write (default: jobs_<from>_to_<to>.zip)")
+    args = parser.parse_args()
+
+    zip_path = args.out or f"jobs_{args.start}_to_{args.end}.zip"
+    started = time.monotonic()
+    total_jobs = build_range_zip(args.start, args.end, args.format, zip_path, workers=args.workers)
+    if total_jobs:
+        print(f"✅ {total_jobs} jobs written to {zip_path} in {time.monotonic() - started:.1f}s")
+    else:
+        print(f"❌ No jobs found between {args.start} and {args.end}")
+
+
+if __name__ == "__main__":
+    main()
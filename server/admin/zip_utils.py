@@ -1,125 +1,230 @@
+import csv
+import gzip
+import heapq
+import json
 import os
+import threading
+import time
 import zipfile
-import pandas as pd
-from datetime import datetime, timedelta, date
-from io import BytesIO
-from psycopg2.extras import RealDictCursor
-from flask import send_file
+from datetime import datetime, timedelta
+from itertools import chain, groupby
 from dotenv import load_dotenv
-import psycopg2
+from metrics import EXPORT_PHASE_SECONDS, EXPORT_ROWS, EXPORT_FAILURES, phase_timer
+from storage import get_storage
+from storage.base import EXPORT_COLUMNS, EXPORT_FETCH_SIZE
+from partitions import find_archive, stream_archived_export_rows
 
 # Load environment variables
 load_dotenv()
-NEON_DB_URL = os.getenv("NEON_DB_URL")
 
-# Directory to store generated ZIPs
+# Directory to store generated ZIPs, created by the first export that needs it
 EXPORTS_DIR = os.path.join(os.path.dirname(__file__), "exports")
-os.makedirs(EXPORTS_DIR, exist_ok=True)
 
-# Database connection helper
-def get_db_connection():
-    return psycopg2.connect(NEON_DB_URL, cursor_factory=RealDictCursor)
+def ensure_exports_dir():
+    os.makedirs(EXPORTS_DIR, exist_ok=True)
+    return EXPORTS_DIR
 
 # Last 7 complete UTC dates (excluding today)
 def get_past_utc_dates(num_days=7):
     today = datetime.utcnow().date()
     return [(today - timedelta(days=i)).isoformat() for i in range(1, num_days + 1)]
 
-import os
-import zipfile
-import pandas as pd
-from datetime import datetime, timedelta
-from io import BytesIO
-from psycopg2.extras import RealDictCursor
-from flask import send_file
-from dotenv import load_dotenv
-import psycopg2
-
-# Load environment variables
-load_dotenv()
-NEON_DB_URL = os.getenv("NEON_DB_URL")
-
-# Folder to store generated ZIPs
-EXPORTS_DIR = os.path.join(os.path.dirname(__file__), "exports")
-os.makedirs(EXPORTS_DIR, exist_ok=True)
-
-def get_db_connection():
-    return psycopg2.connect(NEON_DB_URL, cursor_factory=RealDictCursor)
-
-def get_past_utc_dates(num_days=7):
-    today = datetime.utcnow().date()
-    return [(today - timedelta(days=i)).isoformat() for i in range(1, num_days+1)]
-
-from datetime import date
-
-def generate_zip_for_date(date_str):
-    zip_path = os.path.join(EXPORTS_DIR, f"{date_str}.zip")
-
-    # ✅ Only use cached file if it's not for today's date
-    is_today = (date_str == date.today().isoformat())
-    if os.path.exists(zip_path) and not is_today:
-        return zip_path  # Return cached version if date is not today
+def stream_jobs_for_date(date_str, domain=None):
+    """Yield (domain, company_name, job_title, location, job_description, job_url)
+    tuples for one UTC date (only one domain's if given), grouped by domain,
+    streamed by the storage backend so only EXPORT_FETCH_SIZE rows are held in
+    memory at a time. Archived days are read from their archive (plus any rows
+    that arrived after it was written). Raises ArchivePending while the day is
+    being archived."""
+    rows = get_storage().stream_export_rows(date_str, domain)
+    # Run the live query first: from then on the day can't be archived from
+    # under it, so the archive found next holds exactly the rows it doesn't
+    first = next(rows, None)
+    if first is not None:
+        rows = chain([first], rows)
+    if find_archive(date_str) is None:
+        yield from rows
+    else:
+        yield from heapq.merge(stream_archived_export_rows(date_str, domain), rows, key=lambda row: row[0])
+
+def write_domain_xlsx(rows, file_path):
+    """Write rows to an .xlsx with openpyxl's write-only (streaming) workbook"""
+    # Imported here: openpyxl (and the numpy it pulls in) is the slowest import
+    # in the app and only xlsx exports need it
+    from openpyxl import Workbook
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(EXPORT_COLUMNS)
+    count = 0
+    for row in rows:
+        # Scraped descriptions can carry control characters Excel rejects
+        sheet.append([ILLEGAL_CHARACTERS_RE.sub("", value) if isinstance(value, str) else value
+                      for value in row])
+        count += 1
+    workbook.save(file_path)
+    return count
+
+def write_domain_csv(rows, file_path):
+    """Write rows to a UTF-8 CSV (with BOM so Excel detects the encoding)"""
+    count = 0
+    with open(file_path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_COLUMNS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+def write_domain_jsonl_gz(rows, file_path):
+    """Write rows as gzip-compressed JSON lines, one object per job"""
+    count = 0
+    with gzip.open(file_path, "wt", encoding="utf-8", compresslevel=6) as f:
+        for row in rows:
+            f.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    return count
+
+def write_domain_parquet(rows, file_path):
+    """Write rows to a zstd-compressed Parquet file in EXPORT_FETCH_SIZE row groups"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+
+    schema = pa.schema([(column, pa.string()) for column in EXPORT_COLUMNS])
+    count = 0
+    with pq.ParquetWriter(file_path, schema, compression="zstd") as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= EXPORT_FETCH_SIZE:
+                writer.write_table(pa.Table.from_pylist(
+                    [dict(zip(EXPORT_COLUMNS, r)) for r in batch], schema=schema))
+                count += len(batch)
+                batch = []
+        if batch or not count:
+            writer.write_table(pa.Table.from_pylist(
+                [dict(zip(EXPORT_COLUMNS, r)) for r in batch], schema=schema))
+            count += len(batch)
+    return count
+
+# format -> (file extension, writer, ZIP compression). Formats that are already
+# compressed are stored as-is instead of being deflated a second time.
+EXPORT_FORMATS = {
+    "xlsx": ("xlsx", write_domain_xlsx, zipfile.ZIP_DEFLATED),
+    "csv": ("csv", write_domain_csv, zipfile.ZIP_DEFLATED),
+    "jsonl": ("jsonl.gz", write_domain_jsonl_gz, zipfile.ZIP_STORED),
+    "parquet": ("parquet", write_domain_parquet, zipfile.ZIP_STORED),
+}
+DEFAULT_EXPORT_FORMAT = "xlsx"
+
+class FetchTimer:
+    """Iterator wrapper adding up the time spent waiting for the next row"""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.seconds = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            return next(self.rows)
+        finally:
+            self.seconds += time.perf_counter() - started
+
+def write_export_zip(rows, zip_path, date_str, export_format=DEFAULT_EXPORT_FORMAT):
+    """Write (domain, *EXPORT_COLUMNS) rows, sorted by domain, into a ZIP with
+    one <domain>/jobs_<domain>_<date>.<ext> file per domain. Returns the row count."""
+    extension, write_domain_file, compression = EXPORT_FORMATS[export_format]
+    work_dir = os.path.dirname(zip_path)
+    total_jobs = 0
+    fetch = FetchTimer(rows)
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        # One domain at a time: rows arrive sorted by domain, each group is
+        # streamed into its own file and then added to the ZIP
+        for domain, domain_rows in groupby(fetch, key=lambda row: row[0]):
+            filename = f"jobs_{domain}_{date_str}.{extension}"
+            file_path = os.path.join(work_dir, f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp")
+            try:
+                started, fetched_before = time.perf_counter(), fetch.seconds
+                count = write_domain_file((row[1:] for row in domain_rows), file_path)
+                # Rows are fetched while the file is written; don't count that twice
+                serialize_seconds = time.perf_counter() - started - (fetch.seconds - fetched_before)
+                EXPORT_PHASE_SECONDS.observe(serialize_seconds, "serialize", export_format)
+                with phase_timer("zip", export_format):
+                    zipf.write(file_path, arcname=f"{domain}/{filename}", compress_type=compression)
+            finally:
+                if os.path.exists(file_path):
+                    os.remove(file_path)  # Cleanup
+
+            total_jobs += count
+    EXPORT_PHASE_SECONDS.observe(fetch.seconds, "fetch", export_format)
+    EXPORT_ROWS.inc(total_jobs, export_format)
+    return total_jobs
+
+def get_export_watermark(date_str):
+    """(row count, max id) of a UTC date - changes whenever the day's data does"""
+    count, max_id = get_storage().export_watermark(date_str)
+    archive = find_archive(date_str)
+    if archive:
+        count, max_id = count + archive[1][0], max(max_id, archive[1][1])
+    return count, max_id
+
+def export_cache_path(date_str, export_format, watermark):
+    count, max_id = watermark
+    return os.path.join(EXPORTS_DIR, f"{date_str}_{export_format}_{count}-{max_id}.zip")
+
+def invalidate_exports(date_str, export_format=None):
+    """Remove cached ZIPs for a date (every format unless one is given)"""
+    prefix = f"{date_str}_{export_format}_" if export_format else f"{date_str}_"
+    try:
+        names = os.listdir(EXPORTS_DIR)
+    except FileNotFoundError:
+        return  # Nothing exported yet
+    for name in names:
+        if name.startswith(prefix) and name.endswith(".zip"):
+            try:
+                os.remove(os.path.join(EXPORTS_DIR, name))
+            except FileNotFoundError:
+                pass
+
+def generate_zip_for_date(date_str, export_format=DEFAULT_EXPORT_FORMAT):
+    """Path of the day's ZIP, None if the day has no jobs; raises if the export fails"""
+    # ✅ Cache is keyed on the day's data watermark, so a ZIP is reused until a
+    # job is added to that UTC day - for today as much as for past days
+    watermark = get_export_watermark(date_str)
+    if not watermark[0]:
+        return None  # ❌ No jobs found
+
+    ensure_exports_dir()
+    zip_path = export_cache_path(date_str, export_format, watermark)
+    if os.path.exists(zip_path):
+        os.utime(zip_path)  # Mark as recently used for eviction
+        return zip_path
 
+    # Build into a private temp file and move it into place once complete, so
+    # concurrent requests never see (or serve) a half-written ZIP
+    tmp_zip_path = f"{zip_path}.{os.getpid()}.{threading.get_ident()}.tmp"
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # Get all jobs logged on the given UTC date
-        query = """
-        SELECT * FROM jobs
-        WHERE DATE(timestamp AT TIME ZONE 'UTC') = %s;
-        """
-        cur.execute(query, (date_str,))
-        jobs = cur.fetchall()
-
-        if not jobs:
-            cur.close()
-            conn.close()
+        total_jobs = write_export_zip(stream_jobs_for_date(date_str), tmp_zip_path, date_str, export_format)
+        if not total_jobs:
             return None  # ❌ No jobs found
 
-        # Group jobs by domain
-        domain_groups = {}
-        for job in jobs:
-            domain = job['domain'] or 'other'
-            domain_groups.setdefault(domain, []).append(job)
-
-        # Write Excel files and summary into memory
-        buffer = BytesIO()
-        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            total_jobs = 0
-            summary_lines = []
-
-            for domain, domain_jobs in domain_groups.items():
-                # ✅ Filter only required fields
-                filtered_jobs = [
-                    {
-                        'company_name': job.get('company_name', ''),
-                        'job_title': job.get('job_title', ''),
-                        'location': job.get('location', ''),
-                        'job_description': job.get('job_description', ''),
-                        'job_url': job.get('job_url', '')
-                    }
-                    for job in domain_jobs
-                ]
-
-                df = pd.DataFrame(filtered_jobs)
-                filename = f"jobs_{domain}_{date_str}.xlsx"
-                file_path = os.path.join(EXPORTS_DIR, filename)
-                df.to_excel(file_path, index=False)
-                zipf.write(file_path, arcname=f"{domain}/{filename}")
-                os.remove(file_path)  # Cleanup
-
-                summary_lines.append(f"{domain.capitalize()}: {len(domain_jobs)} jobs")
-                total_jobs += len(domain_jobs)
-
-        # Save ZIP file to disk
-        with open(zip_path, "wb") as f:
-            f.write(buffer.getvalue())
-
-        cur.close()
-        conn.close()
+        invalidate_exports(date_str, export_format)  # Older watermarks are stale now
+        os.replace(tmp_zip_path, zip_path)
         return zip_path
 
     except Exception as e:
+        EXPORT_FAILURES.inc(1, export_format)
         print(f"❌ Error generating ZIP: {e}")
-        return None
+        raise
+    finally:
+        if os.path.exists(tmp_zip_path):
+            os.remove(tmp_zip_path)
@@ -3,26 +3,138 @@ import os
 from datetime import datetime
 import hashlib
 import json
-from domains_config import get_active_domains, get_domain_by_id, suggest_domain_from_text
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from domains_config import get_active_domains, get_domain_by_id, get_registry, suggest_domain_from_text, classify_jobs
 from dotenv import load_dotenv
 from flask_cors import CORS
+from flask_limiter import Limiter
+from werkzeug.middleware.proxy_fix import ProxyFix
 from admin.auth import auth_bp
+from admin.export_cache import start_export_prewarm
+from db import get_pool_stats, utc_day_range
+from storage import get_storage
+from job_store import validate_job, cached_limit_check, MAX_BATCH_SIZE
+from job_store import log_job as store_job, log_jobs as store_jobs
+from quota import get_count
+import metrics
+from ingest_journal import get_journal, get_journal_stats
+from near_duplicates import get_near_duplicate_index
+from classifier import get_classification_stats
+from partitions import start_partition_maintenance
 
 # Create Flask app
 app = Flask(__name__)
 CORS(app)
 load_dotenv()
-NEON_DB_URL = os.getenv("NEON_DB_URL")
 app.register_blueprint(auth_bp)
 app.secret_key = os.getenv("SECRET_KEY")
+metrics.init_app(app)
 
-def get_db_connection():
-    return psycopg2.connect(NEON_DB_URL, cursor_factory=RealDictCursor)
+# Create / migrate the jobs table and its indexes before serving traffic
+if os.getenv("RUN_MIGRATIONS", "1") == "1":
+    try:
+        get_storage().migrate()
+    except Exception as e:
+        print(f"⚠️ Schema migration failed: {e}")
+
+# Build the keyword matcher now rather than on the first request (with a
+# preloaded app, once in the gunicorn master for every worker)
+get_registry()
 
 # Configuration
 PORT = int(os.environ.get('PORT', 5001))  # Using 5001 for Mac compatibility
+MAX_CLASSIFY_BATCH = 200
+INGEST_MODE = os.getenv("INGEST_MODE", "direct")  # "journal" = acknowledge once journaled, write behind
+
+# Request rate limits. Writes are limited per user_id and, so a client can't
+# dodge that by inventing ids, per client IP as well. The default memory://
+# storage is per worker; point RATELIMIT_STORAGE_URI at redis:// etc. to share.
+RATE_LIMIT_LOG_JOB = os.getenv("RATE_LIMIT_LOG_JOB", "30 per minute")
+RATE_LIMIT_LOG_JOBS = os.getenv("RATE_LIMIT_LOG_JOBS", "10 per minute")
+RATE_LIMIT_READS = os.getenv("RATE_LIMIT_READS", "120 per minute")
+RATE_LIMIT_PER_IP = os.getenv("RATE_LIMIT_PER_IP", "300 per minute")
+RATELIMIT_STORAGE_URI = os.getenv("RATELIMIT_STORAGE_URI", "memory://")
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+# Proxies in front of the app that append to X-Forwarded-For (Render's is one).
+# Only that many entries from the right are trusted, the rest is up to the
+# client; 0 when the app is reached directly.
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", 1))
+
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS)
+
+def client_ip():
+    # The address the trusted proxy saw (ProxyFix), not a client-supplied one
+    return request.remote_addr or "unknown"
+
+def rate_limit_key():
+    user_id = request.args.get('user_id')
+    if not user_id:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            user_id = data.get('user_id')
+            jobs = data.get('jobs')
+            if not user_id and isinstance(jobs, list) and jobs and isinstance(jobs[0], dict):
+                user_id = jobs[0].get('user_id')
+    if isinstance(user_id, str) and user_id:
+        return f"user:{user_id}"
+    return f"ip:{client_ip()}"
+
+limiter = Limiter(
+    key_func=rate_limit_key,
+    app=app,
+    storage_uri=RATELIMIT_STORAGE_URI,
+    enabled=RATE_LIMIT_ENABLED,
+    headers_enabled=True,
+)
+per_ip_limit = limiter.shared_limit(RATE_LIMIT_PER_IP, scope="per_ip", key_func=client_ip)
+
+@app.errorhandler(429)
+def rate_limited(e):
+    return jsonify({"status": "rate_limited", "message": f"Too many requests ({e.description}), slow down."}), 429
+
+# Per-worker gauges, read when /metrics is scraped or a snapshot is written
+metrics.Gauge("job_logger_db_pool_in_use", "Pooled connections checked out", lambda: get_pool_stats()["in_use"])
+metrics.Gauge("job_logger_db_pool_idle", "Pooled connections idle", lambda: get_pool_stats()["idle"])
+metrics.Gauge("job_logger_ingest_queue_depth", "Journaled jobs not yet in Postgres",
+              lambda: get_journal_stats()["queue_depth"] if INGEST_MODE == "journal" else None)
+metrics.Gauge("job_logger_ingest_lag_seconds", "Age of the oldest journaled job not yet in Postgres",
+              lambda: get_journal_stats()["lag_seconds"] if INGEST_MODE == "journal" else None)
+metrics.Gauge("job_logger_classify_queue_depth", "Jobs waiting for background domain classification",
+              lambda: get_classification_stats()["queue_depth"])
+
+# Per-process startup: background threads and open connections, neither of
+# which survives a fork. Done here when the serving process imports the app;
+# gunicorn.conf.py preloads it in the master and sets WORKER_STARTUP=post_fork
+# to run start_worker() in each worker after the fork instead.
+WORKER_STARTUP = os.getenv("WORKER_STARTUP", "import")
+
+def start_worker():
+    """Start this process's background work and warm its connections"""
+    if metrics.METRICS_ENABLED:
+        metrics.start_metrics_flusher()
+
+    # Load the last week's near-duplicate signatures in the background
+    get_near_duplicate_index()
+
+    # Create upcoming month partitions and archive old months in the background
+    if os.getenv("PARTITION_MAINTENANCE", "1") == "1":
+        start_partition_maintenance()
+
+    # Keep the dashboard's recent-day ZIPs pre-built and the export cache bounded
+    if os.getenv("EXPORT_PREWARM", "1") == "1":
+        start_export_prewarm()
+
+    # Start the journal writer right away so segments left by a crash get replayed
+    if INGEST_MODE == "journal":
+        get_journal()
+
+    # The first request shouldn't pay for the database handshake
+    try:
+        get_storage().warm()
+    except Exception as e:
+        print(f"⚠️ Could not open database connections: {e}")
+
+if WORKER_STARTUP == "import":
+    start_worker()
 
 # Basic route to test server
 @app.route('/')
@@ -37,111 +149,171 @@ def home():
 # Health check endpoint
 @app.route('/api/health')
 def health_check():
+    near_duplicates = get_near_duplicate_index()
     return jsonify({
         "status": "healthy",
         "database": "connected",
         "timestamp": datetime.now().isoformat(),
         "version": "1.0",
-        "domains_loaded": len(get_active_domains())
+        "domains_loaded": len(get_active_domains()),
+        "db_pool": get_pool_stats(),
+        "storage": get_storage().stats(),
+        "near_duplicates": near_duplicates.stats() if near_duplicates else None,
+        "classifier": get_classification_stats(),
+        "ingest_mode": INGEST_MODE
     })
 
+# Connection pool stats for this worker
+@app.route('/api/pool_stats')
+def pool_stats():
+    return jsonify({"status": "success", "pool": get_pool_stats()})
+
+# Write-behind queue depth / lag for this worker (INGEST_MODE=journal)
+@app.route('/api/ingest_stats')
+def ingest_stats():
+    return jsonify({"status": "success", "mode": INGEST_MODE, "journal": get_journal_stats()})
+
 # Get all available domains
+#
+# The body only changes when the domain registry does, so it is serialized once
+# per registry version and served with an ETag; clients revalidate and get a 304.
+DOMAINS_CACHE_CONTROL = "public, max-age=300"
+_domains_response = None  # (registry version, body, etag)
+
+def domains_response_body():
+    global _domains_response
+    registry = get_registry()
+    cached = _domains_response
+    if cached is None or cached[0] != registry.version:
+        body = app.json.dumps({
+            "status": "success",
+            "total_domains": len(registry.active),
+            "domains": [
+                {
+                    "id": domain["id"],
+                    "display_name": domain["display_name"],
+                    "keywords": domain["keywords"][:3]  # Show first 3 keywords only
+                }
+                for domain in registry.active
+            ]
+        }).encode("utf-8")
+        cached = (registry.version, body, hashlib.sha1(body).hexdigest())
+        _domains_response = cached
+    return cached[1], cached[2]
+
 @app.route('/api/domains')
 def get_domains():
-    domains = get_active_domains()
-    return jsonify({
-        "status": "success",
-        "total_domains": len(domains),
-        "domains": [
-            {
-                "id": domain["id"],
-                "display_name": domain["display_name"],
-                "keywords": domain["keywords"][:3]  # Show first 3 keywords only
-            }
-            for domain in domains
-        ]
-    })
+    body, etag = domains_response_body()
+    response = app.response_class(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = DOMAINS_CACHE_CONTROL
+    return response.make_conditional(request)
+
+# Suggest a domain for one job ({job_title, job_description}) or many ({jobs: [...]})
+@app.route('/api/suggest_domain', methods=['POST'])
+@limiter.limit(RATE_LIMIT_READS)
+def suggest_domain():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"status": "error", "message": "Expected a JSON object"}), 400
+
+    jobs = data.get('jobs') if 'jobs' in data else [data]
+    if not isinstance(jobs, list) or not jobs or not all(isinstance(job, dict) for job in jobs):
+        return jsonify({"status": "error", "message": "Expected job objects with job_title / job_description"}), 400
+    if len(jobs) > MAX_CLASSIFY_BATCH:
+        return jsonify({
+            "status": "error",
+            "message": f"At most {MAX_CLASSIFY_BATCH} jobs can be classified per request"
+        }), 400
+    for job in jobs:
+        for field in ('job_title', 'job_description'):
+            if job.get(field) is not None and not isinstance(job[field], str):
+                return jsonify({"status": "error", "message": f"Field '{field}' must be a string"}), 400
+
+    results = classify_jobs(jobs)
+    for result in results:
+        domain = get_domain_by_id(result['domain']) if result['domain'] else None
+        result['display_name'] = domain['display_name'] if domain else None
+
+    if 'jobs' in data:
+        return jsonify({"status": "success", "results": results})
+    return jsonify({"status": "success", **results[0]})
 
 @app.route('/api/log_job', methods=['POST'])
+@limiter.limit(RATE_LIMIT_LOG_JOB)
+@per_ip_limit
 def log_job():
     try:
         data = request.get_json()
-        required_fields = ['user_id', 'company_name', 'job_title', 'location', 'job_description', 'job_url', 'domain', 'timestamp']
-        if not all(field in data for field in required_fields):
-            return jsonify({"status": "error", "message": "Missing required fields"}), 400
-
-        user_id = data['user_id']
-        job_title = data['job_title'].strip()
-        company_name = data['company_name'].strip()
-        job_url = data['job_url'].strip()
-
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # 1️⃣ Check today's job count for the user
-        today_utc = datetime.utcnow().date().isoformat()
-        count_query = """
-            SELECT COUNT(*) FROM jobs
-            WHERE user_id = %s AND DATE(timestamp AT TIME ZONE 'UTC') = %s;
-        """
-        cur.execute(count_query, (user_id, today_utc))
-        current_count = cur.fetchone()['count']
-
-        if current_count >= 50:
-            cur.close()
-            conn.close()
-            return jsonify({
-                "status": "limit_reached",
-                "message": "You have reached the daily limit of 50 job logs."
-            }), 403
-
-        # 2️⃣ Check for duplicate job within past 7 days
-        check_query = """
-            SELECT id FROM jobs
-            WHERE job_title = %s AND company_name = %s AND job_url = %s
-            AND timestamp >= NOW() - INTERVAL '7 days'
-            LIMIT 1;
-        """
-        cur.execute(check_query, (job_title, company_name, job_url))
-        duplicate = cur.fetchone()
-
-        if duplicate:
-            cur.close()
-            conn.close()
+        error = validate_job(data)
+        if error:
+            return jsonify({"status": "error", "message": error}), 400
+
+        # Users already at the limit are turned away without touching the database
+        over_limit = cached_limit_check(data['user_id'])
+        if over_limit:
+            return jsonify(over_limit), 403
+
+        # The daily limit and duplicate rules are applied when the writer drains it
+        if INGEST_MODE == "journal":
+            depth = get_journal().enqueue([data])
+            return jsonify({"status": "queued", "queue_depth": depth}), 202
+
+        result = store_job(data)
+
+        if result['status'] == 'limit_reached':
+            return jsonify(result), 403
+        return jsonify(result), 200
+
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+def queue_jobs(jobs):
+    """Journal the valid jobs of a batch; invalid ones are answered right away"""
+    results, valid = [], []
+    for index, data in enumerate(jobs):
+        error = validate_job(data)
+        if error:
+            results.append({"index": index, "status": "invalid", "message": error})
+        else:
+            results.append({"index": index, "status": "queued"})
+            valid.append(data)
+    if valid:
+        get_journal().enqueue(valid)
+    return results
+
+# Log many jobs in one request (e.g. triaging a search results page)
+@app.route('/api/log_jobs', methods=['POST'])
+@limiter.limit(RATE_LIMIT_LOG_JOBS)
+@per_ip_limit
+def log_jobs():
+    try:
+        data = request.get_json()
+        jobs = data.get('jobs') if isinstance(data, dict) else data
+        if not isinstance(jobs, list) or not jobs:
+            return jsonify({"status": "error", "message": "Expected a non-empty 'jobs' list"}), 400
+        if len(jobs) > MAX_BATCH_SIZE:
             return jsonify({
-                "status": "duplicate",
-                "duplicate_job_id": duplicate["id"],
-                "message": "Duplicate job entry detected"
-            }), 200
-
-        # 3️⃣ Proceed with insert
-        insert_query = """
-            INSERT INTO jobs (user_id, company_name, job_title, location, job_description, job_url, domain, timestamp)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id;
-        """
-        cur.execute(insert_query, (
-            data['user_id'],
-            data['company_name'],
-            data['job_title'],
-            data['location'],
-            data['job_description'],
-            data['job_url'],
-            data['domain'],
-            data['timestamp']
-        ))
-
-        job_id = cur.fetchone()['id']
-        conn.commit()
-        cur.close()
-        conn.close()
-
-        return jsonify({"status": "success", "job_id": job_id}), 200
+                "status": "error",
+                "message": f"At most {MAX_BATCH_SIZE} jobs can be logged per request"
+            }), 400
+
+        if INGEST_MODE == "journal":
+            results = queue_jobs(jobs)
+        else:
+            results = store_jobs(jobs)
+
+        summary = {}
+        for result in results:
+            summary[result['status']] = summary.get(result['status'], 0) + 1
+
+        return jsonify({"status": "success", "summary": summary, "results": results}), 200
 
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 @app.route('/api/user_job_count')
+@limiter.limit(RATE_LIMIT_READS)
 def get_user_job_count():
     user_id = request.args.get('user_id')
     date = request.args.get('date')  # Expecting UTC YYYY-MM-DD
@@ -150,16 +322,13 @@ def get_user_job_count():
         return jsonify({"status": "error", "message": "Missing user_id or date"}), 400
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        query = """
-            SELECT COUNT(*) FROM jobs
-            WHERE user_id = %s AND DATE(timestamp AT TIME ZONE 'UTC') = %s;
-        """
-        cur.execute(query, (user_id, date))
-        count = cur.fetchone()['count']
-        cur.close()
-        conn.close()
+        day = utc_day_range(date)[0].date()
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid date, expected YYYY-MM-DD"}), 400
+
+    try:
+        # Served from the shared quota counters; the database only on a miss
+        count = get_count(user_id, day, lambda: get_storage().count_user_jobs(user_id, day))
 
         return jsonify({"status": "success", "count": count})
     except Exception as e:
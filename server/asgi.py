@@ -0,0 +1,305 @@
+# asgi.py - Async serving mode
+#
+# The high-traffic endpoints - /api/log_job, /api/user_job_count, /api/domains
+# and the admin summaries - as async handlers on uvicorn workers, their
+# database work awaited through asyncpg (async_db.py, storage/aio.py). A
+# request waiting on Postgres no longer holds a thread, so each worker keeps
+# many in flight instead of --threads. URLs, JSON bodies, status codes, rate
+# limits (without the X-RateLimit headers), admin sessions and the ETag on
+# /api/domains match the Flask routes in app.py / admin/auth.py; every other
+# path is the Flask app itself, mounted behind and run in a thread pool.
+#
+# Start it through gunicorn.conf.py (preloaded, uvicorn workers):
+#
+#     SERVE_MODE=async gunicorn --config gunicorn.conf.py
+#
+# or for development: uvicorn asgi:app --port 5001
+
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import date
+
+from a2wsgi import WSGIMiddleware
+from itsdangerous import BadSignature
+from limits import parse
+from limits.storage import storage_from_string
+from limits.aio.strategies import FixedWindowRateLimiter
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+
+import metrics
+from app import (app as flask_app, domains_response_body, DOMAINS_CACHE_CONTROL, INGEST_MODE, RATE_LIMIT_LOG_JOB,
+                 RATE_LIMIT_READS, RATE_LIMIT_PER_IP, RATELIMIT_STORAGE_URI, RATE_LIMIT_ENABLED, TRUSTED_PROXY_HOPS)
+from async_db import get_async_pool_stats
+from db import utc_day_range
+from ingest_journal import get_journal
+from job_store import validate_job, cached_limit_check, log_job_async
+from quota import get_cached_count, set_count
+from rollups import MAX_RANGE_DAYS
+from storage import get_async_storage
+
+ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", 10))  # threads per worker for the mounted Flask routes
+
+metrics.Gauge("job_logger_async_db_pool_in_use", "Async pool connections checked out",
+              lambda: get_async_pool_stats()["in_use"])
+metrics.Gauge("job_logger_async_db_pool_idle", "Async pool connections idle",
+              lambda: get_async_pool_stats()["idle"])
+
+
+class JSONResponse(Response):
+    """JSON serialized by the Flask app's provider, so bodies match jsonify() byte for byte"""
+    media_type = "application/json"
+
+    def render(self, content):
+        return (flask_app.json.dumps(content, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+# ---- Request helpers (the Starlette side of app.py's) -------------------------
+
+async def read_json(request):
+    """The body as JSON, None if it isn't (like get_json(silent=True))"""
+    try:
+        return json.loads(await request.body())
+    except ValueError:
+        return None
+
+
+def client_ip(request):
+    """The address TRUSTED_PROXY_HOPS proxies from the right of X-Forwarded-For,
+    as ProxyFix gives the Flask routes; entries left of it are client-supplied"""
+    forwarded = [value.strip() for header in request.headers.getlist("x-forwarded-for")
+                 for value in header.split(",") if value.strip()]
+    if TRUSTED_PROXY_HOPS and len(forwarded) >= TRUSTED_PROXY_HOPS:
+        return forwarded[-TRUSTED_PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
+
+
+def rate_limit_key(request, data=None):
+    user_id = request.query_params.get('user_id')
+    if not user_id and isinstance(data, dict):
+        user_id = data.get('user_id')
+        jobs = data.get('jobs')
+        if not user_id and isinstance(jobs, list) and jobs and isinstance(jobs[0], dict):
+            user_id = jobs[0].get('user_id')
+    if isinstance(user_id, str) and user_id:
+        return f"user:{user_id}"
+    return f"ip:{client_ip(request)}"
+
+
+_rate_limiter = None
+
+
+async def rate_limited(*checks):
+    """429 response for the first (limit, scope, key) over its limit, else None"""
+    global _rate_limiter
+    if not RATE_LIMIT_ENABLED:
+        return None
+    if _rate_limiter is None:
+        _rate_limiter = FixedWindowRateLimiter(storage_from_string(f"async+{RATELIMIT_STORAGE_URI}"))
+    for limit, scope, key in checks:
+        item = parse(limit)
+        if not await _rate_limiter.hit(item, scope, key):
+            return JSONResponse({"status": "rate_limited", "message": f"Too many requests ({item}), slow down."},
+                                status_code=429)
+    return None
+
+
+def admin_logged_in(request):
+    """Whether the request carries the Flask session of a logged-in admin"""
+    cookie = request.cookies.get(flask_app.config["SESSION_COOKIE_NAME"])
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    if not cookie or serializer is None:
+        return False
+    try:
+        session = serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return False
+    return bool(session.get("logged_in"))
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == f'"{etag}"' for tag in tags)
+
+
+# ---- Routes -------------------------------------------------------------------
+
+routes = []
+
+
+def route(path, methods=("GET",)):
+    """Register a native route, timed into the same metrics as Flask's"""
+    rule = path.replace("{", "<").replace("}", ">")  # label it like the Flask rule
+
+    def decorator(handler):
+        async def endpoint(request):
+            started = time.perf_counter()
+            status = 500
+            try:
+                response = await handler(request)
+                status = response.status_code
+                return response
+            finally:
+                if metrics.METRICS_ENABLED:
+                    elapsed = time.perf_counter() - started
+                    metrics.HTTP_REQUEST_SECONDS.observe(elapsed, rule, request.method)
+                    metrics.HTTP_REQUESTS.inc(1, rule, request.method, str(status))
+                    if metrics.METRICS_LOG:
+                        metrics.log_event("request", route=rule, method=request.method, status=status,
+                                          duration_ms=round(elapsed * 1000, 2))
+
+        routes.append(Route(path, endpoint, methods=list(methods), name=handler.__name__))
+        return handler
+
+    return decorator
+
+
+@route('/api/domains')
+async def get_domains(request):
+    body, etag = domains_response_body()
+    headers = {"ETag": f'"{etag}"', "Cache-Control": DOMAINS_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@route('/api/log_job', methods=["POST"])
+async def log_job(request):
+    data = await read_json(request)
+    limited = await rate_limited((RATE_LIMIT_LOG_JOB, "log_job", rate_limit_key(request, data)),
+                                 (RATE_LIMIT_PER_IP, "per_ip", client_ip(request)))
+    if limited:
+        return limited
+
+    try:
+        error = validate_job(data)
+        if error:
+            return JSONResponse({"status": "error", "message": error}, status_code=400)
+
+        # Users already at the limit are turned away without touching the database
+        over_limit = await asyncio.to_thread(cached_limit_check, data['user_id'])
+        if over_limit:
+            return JSONResponse(over_limit, status_code=403)
+
+        # The daily limit and duplicate rules are applied when the writer drains it
+        if INGEST_MODE == "journal":
+            depth = await asyncio.to_thread(get_journal().enqueue, [data])
+            return JSONResponse({"status": "queued", "queue_depth": depth}, status_code=202)
+
+        result = await log_job_async(data)
+
+        if result['status'] == 'limit_reached':
+            return JSONResponse(result, status_code=403)
+        return JSONResponse(result)
+
+    except Exception as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
+
+
+@route('/api/user_job_count')
+async def get_user_job_count(request):
+    limited = await rate_limited((RATE_LIMIT_READS, "user_job_count", rate_limit_key(request)))
+    if limited:
+        return limited
+
+    user_id = request.query_params.get('user_id')
+    date_str = request.query_params.get('date')  # Expecting UTC YYYY-MM-DD
+
+    if not user_id or not date_str:
+        return JSONResponse({"status": "error", "message": "Missing user_id or date"}, status_code=400)
+
+    try:
+        day = utc_day_range(date_str)[0].date()
+    except ValueError:
+        return JSONResponse({"status": "error", "message": "Invalid date, expected YYYY-MM-DD"}, status_code=400)
+
+    try:
+        # Served from the shared quota counters (SQLite, so in a thread); the
+        # database only on a miss
+        count = await asyncio.to_thread(get_cached_count, user_id, day)
+        if count is None:
+            count = await get_async_storage().count_user_jobs(user_id, day)
+            await asyncio.to_thread(set_count, user_id, day, count)
+
+        return JSONResponse({"status": "success", "count": count})
+    except Exception as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=500)
+
+
+@route('/admin/summary/{date_str}')
+async def get_summary_json(request):
+    if not admin_logged_in(request):
+        return JSONResponse({"status": "unauthorized"}, status_code=401)
+
+    date_str = request.path_params['date_str']
+    try:
+        day = date.fromisoformat(date_str)
+        total_jobs, users, breakdown = await get_async_storage().day_summary(day)
+
+        return JSONResponse({
+            "status": "success",
+            "date": date_str,
+            "total_jobs": total_jobs,
+            "active_users": users,
+            "domain_breakdown": breakdown
+        })
+
+    except Exception as e:
+        return JSONResponse({"status": "error", "message": str(e)})
+
+
+@route('/admin/summary')
+async def get_range_summary_json(request):
+    if not admin_logged_in(request):
+        return JSONResponse({"status": "unauthorized"}, status_code=401)
+
+    try:
+        start_day = date.fromisoformat(request.query_params.get("from", ""))
+        end_day = date.fromisoformat(request.query_params.get("to", ""))
+    except ValueError:
+        return JSONResponse({"status": "error", "message": "from and to must be YYYY-MM-DD dates"}, status_code=400)
+    if end_day < start_day:
+        return JSONResponse({"status": "error", "message": "'to' must not be before 'from'"}, status_code=400)
+    if (end_day - start_day).days + 1 > MAX_RANGE_DAYS:
+        return JSONResponse({"status": "error", "message": f"Ranges are limited to {MAX_RANGE_DAYS} days"},
+                            status_code=400)
+
+    try:
+        summary = await get_async_storage().range_summary(start_day, end_day)
+
+        return JSONResponse({
+            "status": "success",
+            "from": start_day.isoformat(),
+            "to": end_day.isoformat(),
+            **summary
+        })
+
+    except Exception as e:
+        return JSONResponse({"status": "error", "message": str(e)})
+
+
+@asynccontextmanager
+async def lifespan(_):
+    # The first request shouldn't pay for the database handshake
+    try:
+        await get_async_storage().open()
+    except Exception as e:
+        print(f"⚠️ Could not open async database connections: {e}")
+    yield
+    await get_async_storage().close()
+
+
+app = Starlette(
+    routes=[*routes, Mount("/", app=WSGIMiddleware(flask_app, workers=ASGI_WSGI_THREADS))],
+    # Stands in for flask_cors on every path, preflights included
+    middleware=[Middleware(CORSMiddleware, allow_origin_regex=".*", allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
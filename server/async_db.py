@@ -0,0 +1,140 @@
+# async_db.py - asyncpg connection pool for the async server (asgi.py)
+#
+# The async counterpart of db.py. Each worker process has one pool, opened by
+# the server when it starts (the connections belong to its event loop) and
+# closed when it stops; while a request waits on the database the worker serves
+# others, so a handful of connections carries many concurrent requests.
+# Statements keep the psycopg2 placeholders (%s / %(name)s) the rest of the
+# code is written with and are translated to asyncpg's $n once per statement;
+# each one is timed into the same metrics as db.py's TimedCursor.
+
+import asyncio
+import os
+import re
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import asyncpg
+
+from db import NEON_DB_URL, DB_POOL_MIN, DB_POOL_TIMEOUT
+from metrics import DB_POOL_WAIT_SECONDS, observe_query
+
+# Per worker; one connection runs one statement at a time, whatever the number
+# of requests waiting for it
+ASYNC_DB_POOL_MAX = int(os.getenv("ASYNC_DB_POOL_MAX", 10))
+# Prepared statements cached per connection; set 0 behind a PgBouncer that
+# doesn't support them (transaction pooling before 1.21)
+ASYNC_DB_STATEMENT_CACHE = int(os.getenv("ASYNC_DB_STATEMENT_CACHE", 100))
+ASYNC_DB_IDLE_LIFETIME = float(os.getenv("ASYNC_DB_IDLE_LIFETIME", 300))  # close connections idle this long
+
+# libpq connection options asyncpg doesn't know (it would send them to the
+# server as settings); Neon's connection strings carry channel_binding
+LIBPQ_ONLY_OPTIONS = ("channel_binding",)
+PLACEHOLDER_RE = re.compile(r"%\((\w+)\)s|%s|%%")
+
+_pool = None
+_pool_lock = None
+
+
+def asyncpg_dsn(url):
+    parts = urlsplit(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query) if key not in LIBPQ_ONLY_OPTIONS]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+async def open_pool():
+    """Open this process's pool (idempotent); returns it"""
+    global _pool, _pool_lock
+    if _pool is not None:
+        return _pool
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await asyncpg.create_pool(
+                asyncpg_dsn(NEON_DB_URL),
+                min_size=DB_POOL_MIN,
+                max_size=max(ASYNC_DB_POOL_MAX, DB_POOL_MIN, 1),
+                statement_cache_size=ASYNC_DB_STATEMENT_CACHE,
+                max_inactive_connection_lifetime=ASYNC_DB_IDLE_LIFETIME,
+            )
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        await pool.close()
+
+
+@asynccontextmanager
+async def db_connection():
+    """Borrow a pooled connection, waiting up to DB_POOL_TIMEOUT seconds"""
+    pool = _pool or await open_pool()
+    started = time.monotonic()
+    async with pool.acquire(timeout=DB_POOL_TIMEOUT) as conn:
+        DB_POOL_WAIT_SECONDS.observe(time.monotonic() - started)
+        yield conn
+
+
+@lru_cache(maxsize=256)
+def translate(sql):
+    """(SQL with $n placeholders, names of the %(name)s parameters or None)"""
+    names = []
+    positional = 0
+
+    def placeholder(match):
+        nonlocal positional
+        if match.group(0) == "%%":
+            return "%"
+        if match.group(1):
+            if match.group(1) not in names:
+                names.append(match.group(1))
+            return f"${names.index(match.group(1)) + 1}"
+        positional += 1
+        return f"${positional}"
+
+    return PLACEHOLDER_RE.sub(placeholder, sql), names or None
+
+
+async def fetch(conn, sql, params=()):
+    """Run a psycopg2-style statement; returns its rows (asyncpg Records)"""
+    query, names = translate(sql)
+    args = [params[name] for name in names] if names else params
+    started = time.perf_counter()
+    try:
+        rows = await conn.fetch(query, *args)
+    except Exception:
+        observe_query(sql, time.perf_counter() - started, failed=True)
+        raise
+    observe_query(sql, time.perf_counter() - started)
+    return rows
+
+
+async def run_queries(conn, queries):
+    """rollups.run_queries() for an asyncpg connection"""
+    rows = None
+    try:
+        while True:
+            sql, params = queries.send(rows)
+            rows = await fetch(conn, sql, params)
+    except StopIteration as done:
+        return done.value
+
+
+def get_async_pool_stats():
+    """Pool statistics for this worker, for monitoring"""
+    if _pool is None:
+        return {"pid": os.getpid(), "size": 0, "in_use": 0, "idle": 0, "max_size": ASYNC_DB_POOL_MAX}
+    size, idle = _pool.get_size(), _pool.get_idle_size()
+    return {
+        "pid": os.getpid(),
+        "min_size": _pool.get_min_size(),
+        "max_size": _pool.get_max_size(),
+        "size": size,
+        "in_use": size - idle,
+        "idle": idle,
+    }
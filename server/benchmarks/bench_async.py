@@ -0,0 +1,147 @@
+# bench_async.py - Throughput of the sync (gunicorn threads) and async (uvicorn
+# workers, asyncpg) serving modes under a growing number of concurrent clients
+#
+# Starts the server once per mode with the same number of workers and, at each
+# --concurrency level, sends --requests requests per scenario from that many
+# keep-alive connections: log_job for distinct users, user_job_count for users
+# the quota counters haven't seen (so every request reads the database),
+# /api/domains (no database at all) and a 30-day admin range summary. Reports
+# req/s and p50/p99 latency per mode side by side. Run from server/:
+#
+#     BENCH_DB_URL=postgresql://localhost/job_logger_bench python benchmarks/bench_async.py \
+#         [--workers 2] [--threads 8] [--concurrency 8,32,128] [--json out.json]
+#
+# or against the embedded SQLite backend (where the async mode runs the
+# storage calls in threads):
+#
+#     python benchmarks/bench_async.py --backend sqlite [--sqlite-path /tmp/bench.sqlite3]
+#
+# The client runs on the same host, so on small machines it competes with the
+# server for CPU; against a remote database (Neon) every request also waits out
+# a network round trip, which is where the async mode gains the most.
+# BENCH_DB_URL is written to - never point it at production.
+
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from itertools import count
+
+from bench_server import (BENCH_BACKEND, BENCH_DB_URL, BENCH_FIRST_DAY, BENCH_SQLITE_PATH, ADMIN_USERNAME,
+                          ADMIN_PASSWORD, SERVER_DIR, admin_cookie, free_port, job_payload, run_load)
+
+MODES = ("sync", "async")
+
+
+def start_server(mode, args, port, work_dir):
+    env = dict(os.environ)
+    env.update({
+        "SERVE_MODE": mode,
+        "SECRET_KEY": "bench",
+        "ADMIN_USERNAME": ADMIN_USERNAME,
+        "ADMIN_PASSWORD": ADMIN_PASSWORD,
+        "EXPORT_PREWARM": "0",
+        "PARTITION_MAINTENANCE": "0",
+        "RATE_LIMIT_ENABLED": "0",
+        "QUOTA_DB": os.path.join(work_dir, f"quota-{mode}.sqlite3"),
+        "JOURNAL_DIR": os.path.join(work_dir, "journal"),
+    })
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}",
+         "--workers", str(args.workers), "--threads", str(args.threads), "--log-level", "warning"],
+        cwd=SERVER_DIR, env=env,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/api/health")
+            if conn.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{mode} server did not come up within 60s")
+
+
+def scenarios(run_id, ids):
+    today = datetime.utcnow().date().isoformat()
+    last_day = BENCH_FIRST_DAY + timedelta(days=29)
+    return [
+        ("log_job", lambda: (
+            "POST", "/api/log_job", job_payload(f"bench-{run_id}-{next(ids)}", next(ids), run_id)), False),
+        ("user_job_count (uncached)", lambda: (
+            "GET", f"/api/user_job_count?user_id=bench-{run_id}-count-{next(ids)}&date={today}", None), False),
+        ("domains", lambda: ("GET", "/api/domains", None), False),
+        ("admin summary (30-day range)", lambda: (
+            "GET", f"/admin/summary?from={BENCH_FIRST_DAY}&to={last_day}", None), True),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the sync and async serving modes under concurrency")
+    parser.add_argument("--backend", default=BENCH_BACKEND, choices=["postgres", "sqlite"])
+    parser.add_argument("--sqlite-path", default=BENCH_SQLITE_PATH, help="database file for --backend sqlite")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per scenario and concurrency level")
+    parser.add_argument("--concurrency", default="8,32,128", help="concurrent clients, e.g. 8,32,128")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers, both modes")
+    parser.add_argument("--threads", type=int, default=8, help="threads per sync worker")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    # Inherited by the servers
+    os.environ["STORAGE_BACKEND"] = args.backend
+    if args.backend == "sqlite":
+        os.environ["SQLITE_PATH"] = os.path.abspath(args.sqlite_path)
+    elif BENCH_DB_URL:
+        os.environ["NEON_DB_URL"] = BENCH_DB_URL
+    else:
+        sys.exit("Set BENCH_DB_URL to a scratch Postgres database (it gets written to), or use --backend sqlite")
+    from storage import get_storage
+
+    get_storage().migrate()
+    levels = [int(level) for level in args.concurrency.split(",")]
+    run_id = f"{int(time.time())}"
+    ids = count()
+
+    results = {"backend": args.backend, "workers": args.workers, "threads": args.threads, "scenarios": {}}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for mode in MODES:
+            port = free_port()
+            server = start_server(mode, args, port, work_dir)
+            try:
+                cookie = {"Cookie": admin_cookie(port)}
+                for name, make_request, admin in scenarios(run_id, ids):
+                    for concurrency in levels:
+                        result = run_load(port, make_request, args.requests, concurrency, cookie if admin else None)
+                        results["scenarios"].setdefault(name, {}).setdefault(str(concurrency), {})[mode] = result
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+    print(f"{args.workers} workers ({args.threads} threads each in sync mode), {args.backend}\n")
+    print(f"{'scenario':<30} {'clients':>7} {'sync req/s':>11} {'p50 ms':>8} {'p99 ms':>8}"
+          f" {'async req/s':>12} {'p50 ms':>8} {'p99 ms':>8} {'speedup':>8}")
+    for name, by_level in results["scenarios"].items():
+        for concurrency, by_mode in by_level.items():
+            sync, async_ = by_mode["sync"], by_mode["async"]
+            speedup = async_["req_per_s"] / sync["req_per_s"] if sync["req_per_s"] else 0
+            print(f"{name:<30} {concurrency:>7} {sync['req_per_s']:>11} {sync['p50_ms']:>8} {sync['p99_ms']:>8}"
+                  f" {async_['req_per_s']:>12} {async_['p50_ms']:>8} {async_['p99_ms']:>8} {speedup:>7.2f}x")
+            for mode, result in by_mode.items():
+                if set(result["statuses"]) - {200}:
+                    print(f"{'':<30} {'':>7} {mode} statuses: {result['statuses']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
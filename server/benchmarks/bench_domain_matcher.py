@@ -0,0 +1,71 @@
+# bench_domain_matcher.py - Per-document latency of domain suggestion
+#
+# Compares the old per-keyword substring scan with the compiled KeywordMatcher
+# on synthetic job descriptions of increasing length. Run from server/:
+#
+#     python benchmarks/bench_domain_matcher.py
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from domains_config import DOMAINS, get_active_domains, get_keyword_matcher, suggest_domain_from_text
+
+FILLER = (
+    "the team is looking for a motivated person to join our growing company and help "
+    "maintain our products while working with stakeholders across regions on projects "
+    "that matter to customers you will collaborate communicate plan deliver and own outcomes"
+).split()
+
+
+def legacy_suggest(job_title, job_description=""):
+    """The previous implementation, kept here for comparison"""
+    text = f"{job_title} {job_description}".lower()
+    domain_scores = {}
+    for domain in get_active_domains():
+        score = 0
+        for keyword in domain['keywords']:
+            if keyword.lower() in text:
+                score += 1
+        domain_scores[domain['id']] = score
+    if max(domain_scores.values()) > 0:
+        return max(domain_scores, key=domain_scores.get)
+    return None
+
+
+def make_description(rng, n_words):
+    keywords = [k for d in DOMAINS for k in d['keywords']]
+    words = []
+    while len(words) < n_words:
+        words.append(rng.choice(keywords) if rng.random() < 0.03 else rng.choice(FILLER))
+    return " ".join(words)
+
+
+def bench(fn, docs, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for title, description in docs:
+            fn(title, description)
+        best = min(best, time.perf_counter() - start)
+    return best / len(docs)
+
+
+def main():
+    rng = random.Random(42)
+    get_keyword_matcher()  # compile outside the timed loop
+
+    print(f"{'words':>7} {'chars':>8} {'legacy µs/doc':>14} {'compiled µs/doc':>16} {'speedup':>8}")
+    for n_words in (200, 1000, 5000, 20000):
+        docs = [("Senior Software Engineer", make_description(rng, n_words)) for _ in range(50)]
+        chars = sum(len(d) for _, d in docs) // len(docs)
+        legacy = bench(legacy_suggest, docs)
+        compiled = bench(suggest_domain_from_text, docs)
+        print(f"{n_words:>7} {chars:>8} {legacy * 1e6:>14.1f} {compiled * 1e6:>16.1f} {legacy / compiled:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# bench_export_formats.py - Export time and size per format on a synthetic day
+#
+# Generates a synthetic day of jobs (default 100k rows spread over the domains
+# in DOMAINS, ~2 KB descriptions) and runs it through the same ZIP pipeline as
+# /admin/download for every export format. No database needed. Run from server/:
+#
+#     python benchmarks/bench_export_formats.py [--rows 100000]
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from domains_config import DOMAINS
+from admin.zip_utils import EXPORT_FORMATS, write_export_zip
+
+
+def synthetic_rows(n_rows, seed=7):
+    """(domain, company, title, location, description, url) rows sorted by domain"""
+    rng = random.Random(seed)
+    vocabulary = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 10)))
+                  for _ in range(5000)]
+    domains = sorted(domain["id"] for domain in DOMAINS)
+    per_domain = n_rows // len(domains)
+    for index, domain in enumerate(domains):
+        count = per_domain + (1 if index < n_rows % len(domains) else 0)
+        for i in range(count):
+            words = rng.choices(vocabulary, k=300)
+            yield (
+                domain,
+                f"Company {rng.randint(1, 5000)}",
+                f"{' '.join(rng.choices(vocabulary, k=3)).title()} Engineer",
+                rng.choice(["Remote", "New York, NY", "Bengaluru", "London", "Austin, TX"]),
+                " ".join(words),
+                f"https://jobs.example.com/{domain}/{i}",
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--formats", default=",".join(EXPORT_FORMATS))
+    args = parser.parse_args()
+
+    print(f"Synthetic day: {args.rows} rows across {len(DOMAINS)} domains")
+    print(f"{'format':>8} {'seconds':>9} {'rows/s':>10} {'zip MB':>8}")
+
+    # Baseline: generating the rows alone, included in every timing below
+    start = time.perf_counter()
+    for _ in synthetic_rows(args.rows):
+        pass
+    print(f"{'(rows)':>8} {time.perf_counter() - start:>9.2f} {'':>10} {'':>8}")
+    with tempfile.TemporaryDirectory() as work_dir:
+        for export_format in args.formats.split(","):
+            zip_path = os.path.join(work_dir, f"bench_{export_format}.zip")
+            start = time.perf_counter()
+            try:
+                written = write_export_zip(synthetic_rows(args.rows), zip_path, "2025-01-01", export_format)
+            except RuntimeError as e:
+                print(f"{export_format:>8} skipped: {e}")
+                continue
+            elapsed = time.perf_counter() - start
+            size_mb = os.path.getsize(zip_path) / 1e6
+            print(f"{export_format:>8} {elapsed:>9.2f} {written / elapsed:>10.0f} {size_mb:>8.1f}")
+            os.remove(zip_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# bench_range_export.py - Date-range export on the process pool vs day by day
+#
+# Seeds --days synthetic days of --rows jobs each (as bench_server.py does) and
+# times exporting all of them: one /admin/download ZIP per day in turn (the
+# pipeline clicking through the dashboard runs), then the range export
+# (admin/range_export.py) with 1 process and with each --workers count. Run
+# from server/:
+#
+#     BENCH_DB_URL=postgresql://localhost/job_logger_bench \
+#         python benchmarks/bench_range_export.py [--days 7] [--rows 20000] [--workers 2,4] [--format xlsx]
+#
+# or against the embedded SQLite backend:
+#
+#     python benchmarks/bench_range_export.py --backend sqlite [--sqlite-path /tmp/bench.sqlite3]
+#
+# Speedups are bounded by the host's cores (os.cpu_count()). BENCH_DB_URL is
+# written to - never point it at production.
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+from bench_server import BENCH_BACKEND, BENCH_DB_URL, BENCH_FIRST_DAY, BENCH_SQLITE_PATH, seed_day
+
+RANGE_FIRST_DAY = BENCH_FIRST_DAY + timedelta(days=200)  # clear of the days the other benchmarks seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time range exports against day-by-day ZIPs")
+    parser.add_argument("--backend", default=BENCH_BACKEND, choices=["postgres", "sqlite"])
+    parser.add_argument("--sqlite-path", default=BENCH_SQLITE_PATH, help="database file for --backend sqlite")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--rows", type=int, default=20_000, help="jobs per day")
+    parser.add_argument("--workers", default=f"{os.cpu_count() or 1}", help="process counts to time, e.g. 2,4")
+    parser.add_argument("--format", default="xlsx")
+    args = parser.parse_args()
+
+    # Inherited by the export processes
+    os.environ["STORAGE_BACKEND"] = args.backend
+    if args.backend == "sqlite":
+        os.environ["SQLITE_PATH"] = os.path.abspath(args.sqlite_path)
+    elif BENCH_DB_URL:
+        os.environ["NEON_DB_URL"] = BENCH_DB_URL
+    else:
+        sys.exit("Set BENCH_DB_URL to a scratch Postgres database (it gets written to), or use --backend sqlite")
+    from domains_config import DOMAINS
+    from storage import get_storage
+    from admin.range_export import build_range_zip
+    from admin.zip_utils import stream_jobs_for_date, write_export_zip
+
+    get_storage().migrate()
+    domains = sorted(domain["id"] for domain in DOMAINS)
+    days = [RANGE_FIRST_DAY + timedelta(days=i) for i in range(args.days)]
+    print(f"Seeding {args.days} days of {args.rows} rows")
+    for day in days:
+        seed_day(day, args.rows, domains)
+
+    print(f"\n{args.days} days x {args.rows} rows, {args.format}, {os.cpu_count()} CPUs, {args.backend}")
+    print(f"{'export':<26} {'seconds':>9} {'rows/s':>10} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as work_dir:
+        started = time.perf_counter()
+        total = 0
+        for day in days:
+            zip_path = os.path.join(work_dir, f"{day}.zip")
+            total += write_export_zip(stream_jobs_for_date(day.isoformat()), zip_path, day.isoformat(), args.format)
+            os.remove(zip_path)
+        baseline = time.perf_counter() - started
+        print(f"{'day by day':<26} {baseline:>9.2f} {total / baseline:>10.0f} {1:>7.2f}x")
+
+        for workers in [1, *(int(w) for w in args.workers.split(",") if int(w) != 1)]:
+            zip_path = os.path.join(work_dir, f"range_{workers}.zip")
+            started = time.perf_counter()
+            total = build_range_zip(days[0], days[-1], args.format, zip_path, workers=workers)
+            elapsed = time.perf_counter() - started
+            print(f"{f'range, {workers} workers':<26} {elapsed:>9.2f} {total / elapsed:>10.0f} "
+                  f"{baseline / elapsed:>7.2f}x")
+            os.remove(zip_path)
+
+
+if __name__ == "__main__":
+    main()
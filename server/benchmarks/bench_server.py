@@ -0,0 +1,356 @@
+# bench_server.py - End-to-end load test of the API against a local database
+#
+# Seeds synthetic jobs (realistic description sizes, spread over the domains in
+# DOMAINS) into a scratch database, starts the app under gunicorn and reports
+# req/s and p50/p99 latency for log_job (sequential, concurrent distinct users,
+# concurrent same user), user_job_count, the admin summaries and admin search
+# (first page and a page 90% of the way through the largest day), then times a
+# full ZIP export per seeded day size in a fresh process and reports its peak
+# RSS. Seeding is deterministic and skipped for days that already hold the
+# requested number of rows, so reruns compare like with like. Run from server/:
+#
+#     BENCH_DB_URL=postgresql://localhost/job_logger_bench \
+#         python benchmarks/bench_server.py [--sizes 1000,100000,1000000] [--json out.json]
+#
+# or, without a Postgres server, against the embedded SQLite backend:
+#
+#     python benchmarks/bench_server.py --backend sqlite [--sqlite-path /tmp/bench.sqlite3]
+#
+# BENCH_DB_URL is written to (and its bench days replaced) - never point it at
+# production.
+
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from itertools import count
+from urllib.parse import urlencode
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+BENCH_DB_URL = os.getenv("BENCH_DB_URL")
+BENCH_BACKEND = os.getenv("BENCH_BACKEND", "postgres")
+BENCH_SQLITE_PATH = os.getenv("BENCH_SQLITE_PATH", os.path.join(tempfile.gettempdir(), "job_logger_bench.sqlite3"))
+BENCH_FIRST_DAY = date(2024, 1, 1)  # seeded days start here, one per size
+ADMIN_USERNAME = "bench"
+ADMIN_PASSWORD = "bench"
+
+# ---- Seeding ----------------------------------------------------------------
+
+def text_source(rng, n_words=400_000):
+    """One long run of pseudo-words to slice descriptions out of"""
+    vocabulary = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 11)))
+                  for _ in range(8000)]
+    return " ".join(rng.choices(vocabulary, k=n_words))
+
+
+def description_length(rng):
+    # Scraped descriptions cluster around 3 KB with a long tail
+    return int(min(max(rng.lognormvariate(8.0, 0.6), 300), 30_000))
+
+
+def synthetic_jobs(day, n_rows, domains, seed):
+    rng = random.Random(seed)
+    text = text_source(rng)
+    n_users = max(n_rows // 20, 1)
+    day_start = datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc)
+    for i in range(n_rows):
+        domain = domains[i % len(domains)]
+        length = description_length(rng)
+        start = rng.randrange(0, len(text) - length)
+        url = f"https://jobs.example.com/{day.isoformat()}/{domain}/{i}"
+        yield (
+            f"bench-user-{rng.randrange(n_users)}",
+            f"Company {rng.randint(1, 5000)}",
+            f"{domain.replace('_', ' ').title()} Engineer {i % 97}",
+            rng.choice(["Remote", "New York, NY", "Bengaluru", "London", "Austin, TX"]),
+            text[start:start + length],
+            url,
+            domain,
+            (day_start + timedelta(seconds=i * 86_399 // max(n_rows, 1))).isoformat(),
+            hashlib.sha256(url.encode()).hexdigest(),
+        )
+
+
+def seed_day(day, n_rows, domains):
+    """Make `day` hold exactly n_rows synthetic jobs (reseeding if it doesn't)"""
+    from storage import get_storage
+
+    storage = get_storage()
+    if storage.export_watermark(day.isoformat())[0] == n_rows:
+        print(f"  {day}: {n_rows} rows already seeded")
+        return
+
+    started = time.perf_counter()
+    storage.load_day(day, synthetic_jobs(day, n_rows, domains, seed=n_rows))
+    print(f"  {day}: seeded {n_rows} rows in {time.perf_counter() - started:.1f}s")
+
+
+# ---- Load generation --------------------------------------------------------
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def run_load(port, make_request, total, concurrency, headers=None):
+    """Send `total` requests from `concurrency` keep-alive connections"""
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+    per_worker = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+
+    def worker(n):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        local_latencies, local_statuses = [], Counter()
+        for _ in range(n):
+            method, path, body = make_request()
+            request_headers = dict(headers or {})
+            if body is not None:
+                body = json.dumps(body)
+                request_headers["Content-Type"] = "application/json"
+            started = time.perf_counter()
+            conn.request(method, path, body=body, headers=request_headers)
+            response = conn.getresponse()
+            response.read()
+            local_latencies.append(time.perf_counter() - started)
+            local_statuses[response.status] += 1
+        conn.close()
+        with lock:
+            latencies.extend(local_latencies)
+            statuses.update(local_statuses)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(worker, per_worker))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "req_per_s": round(total / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "statuses": dict(sorted(statuses.items())),
+    }
+
+
+def job_payload(user_id, n, run_id):
+    return {
+        "user_id": user_id,
+        "company_name": f"Bench Co {n % 500}",
+        "job_title": f"Backend Engineer {n}",
+        "location": "Remote",
+        # Distinct per job, so the near-duplicate check doesn't flag the inserts
+        "job_description": " ".join(f"term{(n * 7919 + i * 104729) % 50_000}" for i in range(400)),
+        "job_url": f"https://bench.example.com/{run_id}/{n}",
+        "domain": "software_development",
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(args, port, work_dir):
+    env = dict(os.environ)
+    env.update({
+        "SECRET_KEY": "bench",
+        "ADMIN_USERNAME": ADMIN_USERNAME,
+        "ADMIN_PASSWORD": ADMIN_PASSWORD,
+        "EXPORT_PREWARM": "0",
+        "RATE_LIMIT_ENABLED": "0",
+        "QUOTA_DB": os.path.join(work_dir, "quota.sqlite3"),
+        "JOURNAL_DIR": os.path.join(work_dir, "journal"),
+        "INGEST_MODE": args.ingest_mode,
+    })
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app", "--bind", f"127.0.0.1:{port}",
+         "--workers", str(args.workers), "--threads", str(args.threads), "--log-level", "warning"],
+        cwd=SERVER_DIR, env=env,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/api/health")
+            if conn.getresponse().status == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Server did not come up within 60s")
+
+
+def admin_cookie(port):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    conn.request("POST", "/admin/login", body=urlencode({"username": ADMIN_USERNAME, "password": ADMIN_PASSWORD}),
+                 headers={"Content-Type": "application/x-www-form-urlencoded"})
+    response = conn.getresponse()
+    response.read()
+    return response.getheader("Set-Cookie").split(";", 1)[0]
+
+
+# ---- Export in a fresh process (so peak RSS is the export's own) ------------
+
+def peak_rss_mb():
+    # VmHWM belongs to the current address space; ru_maxrss would carry over the
+    # parent's high-water mark across fork + exec on Linux
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def export_child(day_str, export_format):
+    from admin.zip_utils import stream_jobs_for_date, write_export_zip
+
+    baseline_rss = peak_rss_mb()
+    with tempfile.TemporaryDirectory() as work_dir:
+        zip_path = os.path.join(work_dir, "bench.zip")
+        started = time.perf_counter()
+        rows = write_export_zip(stream_jobs_for_date(day_str), zip_path, day_str, export_format)
+        elapsed = time.perf_counter() - started
+        size = os.path.getsize(zip_path)
+    print(json.dumps({
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_s": round(rows / elapsed, 1) if elapsed else 0,
+        "zip_mb": round(size / 1e6, 2),
+        "baseline_rss_mb": round(baseline_rss, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }))
+
+
+def bench_export(day, export_format):
+    env = dict(os.environ)
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--export-child", day.isoformat(), export_format],
+        cwd=SERVER_DIR, env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+# ---- Driver -----------------------------------------------------------------
+
+def print_row(name, result):
+    print(f"{name:<34} {result['req_per_s']:>9} {result['p50_ms']:>9} {result['p99_ms']:>9}  {result['statuses']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the API against a local database")
+    parser.add_argument("--backend", default=BENCH_BACKEND, choices=["postgres", "sqlite"])
+    parser.add_argument("--sqlite-path", default=BENCH_SQLITE_PATH, help="database file for --backend sqlite")
+    parser.add_argument("--sizes", default="1000,100000", help="rows per seeded day, e.g. 1000,100000,1000000")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per HTTP scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker")
+    parser.add_argument("--ingest-mode", default="direct", choices=["direct", "journal"])
+    parser.add_argument("--export-formats", default="xlsx")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--export-child", nargs=2, metavar=("DAY", "FORMAT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.export_child:
+        export_child(*args.export_child)
+        return
+    # Inherited by the gunicorn server and the export children
+    os.environ["STORAGE_BACKEND"] = args.backend
+    if args.backend == "sqlite":
+        os.environ["SQLITE_PATH"] = os.path.abspath(args.sqlite_path)
+    elif BENCH_DB_URL:
+        os.environ["NEON_DB_URL"] = BENCH_DB_URL
+    else:
+        sys.exit("Set BENCH_DB_URL to a scratch Postgres database (it gets written to), or use --backend sqlite")
+    from storage import get_storage
+    from domains_config import DOMAINS
+
+    get_storage().migrate()
+    sizes = [int(size) for size in args.sizes.split(",")]
+    days = {size: BENCH_FIRST_DAY + timedelta(days=index) for index, size in enumerate(sizes)}
+    domains = sorted(domain["id"] for domain in DOMAINS)
+    print(f"Seeding {len(domains)} domains")
+    for size, day in days.items():
+        seed_day(day, size, domains)
+
+    results = {"backend": args.backend, "http": {}, "export": {}}
+    run_id = f"{int(time.time())}"
+    ids = count()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        port = free_port()
+        server = start_server(args, port, work_dir)
+        try:
+            cookie = {"Cookie": admin_cookie(port)}
+            largest_day = days[max(sizes)].isoformat()
+            # Every seeded title contains "engineer": the search matches the whole day
+            day_rows, day_max_id = get_storage().export_watermark(largest_day)
+            deep_cursor = day_max_id - int(day_rows * 0.9)
+            scenarios = [
+                ("log_job sequential", 1, lambda: (
+                    "POST", "/api/log_job", job_payload(f"bench-{run_id}-{next(ids)}", next(ids), run_id)), None),
+                ("log_job concurrent users", args.concurrency, lambda: (
+                    "POST", "/api/log_job", job_payload(f"bench-{run_id}-{next(ids)}", next(ids), run_id)), None),
+                ("log_job concurrent same user", args.concurrency, lambda: (
+                    "POST", "/api/log_job", job_payload(f"bench-{run_id}-same", next(ids), run_id)), None),
+                ("user_job_count", args.concurrency, lambda: (
+                    "GET", f"/api/user_job_count?user_id=bench-user-{next(ids) % 50}&date={largest_day}", None), None),
+                ("admin summary (day)", args.concurrency, lambda: (
+                    "GET", f"/admin/summary/{largest_day}", None), cookie),
+                ("admin summary (30-day range)", args.concurrency, lambda: (
+                    "GET", f"/admin/summary?from={BENCH_FIRST_DAY}&to={BENCH_FIRST_DAY + timedelta(days=29)}", None),
+                    cookie),
+                ("admin search (first page)", args.concurrency, lambda: (
+                    "GET", f"/admin/search?q=engineer&from={largest_day}&to={largest_day}", None), cookie),
+                ("admin search (deep page)", args.concurrency, lambda: (
+                    "GET", f"/admin/search?q=engineer&from={largest_day}&to={largest_day}&cursor={deep_cursor}", None),
+                    cookie),
+            ]
+            print(f"\n{'scenario':<34} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}  statuses")
+            for name, concurrency, make_request, headers in scenarios:
+                result = run_load(port, make_request, args.requests, concurrency, headers)
+                results["http"][name] = result
+                print_row(name, result)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    print(f"\n{'export':<20} {'rows':>9} {'seconds':>9} {'rows/s':>10} {'zip MB':>8} {'base RSS MB':>12} {'peak RSS MB':>12}")
+    for size, day in days.items():
+        for export_format in args.export_formats.split(","):
+            result = bench_export(day, export_format)
+            results["export"][f"{size}:{export_format}"] = result
+            print(f"{f'{size} rows {export_format}':<20} {result['rows']:>9} {result['seconds']:>9} "
+                  f"{result['rows_per_s']:>10} {result['zip_mb']:>8} {result['baseline_rss_mb']:>12} "
+                  f"{result['peak_rss_mb']:>12}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
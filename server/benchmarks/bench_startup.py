@@ -0,0 +1,187 @@
+# bench_startup.py - Cold start cost of the API
+#
+# Each measurement runs in fresh processes, so nothing is warm but the OS page
+# cache. Reports:
+#
+#   * `import app` wall time (median of --runs) without startup work, and with
+#     the migrations check and a worker's startup (threads, DB connections)
+#   * the slowest top-level imports, from python -X importtime
+#   * what the export-only libraries would add if imported up front
+#   * time from launching gunicorn to the first 200 from /api/health, and the
+#     slowest of the first requests (each worker's first), with the app
+#     preloaded (gunicorn.conf.py's default) and imported per worker
+#
+# Run from server/:
+#
+#     BENCH_DB_URL=postgresql://localhost/job_logger_bench python benchmarks/bench_startup.py [--workers 2]
+#
+# or against the embedded SQLite backend:
+#
+#     python benchmarks/bench_startup.py --backend sqlite [--sqlite-path /tmp/bench.sqlite3]
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BENCH_DB_URL = os.getenv("BENCH_DB_URL")
+BENCH_BACKEND = os.getenv("BENCH_BACKEND", "postgres")
+BENCH_SQLITE_PATH = os.getenv("BENCH_SQLITE_PATH", os.path.join(tempfile.gettempdir(), "job_logger_bench.sqlite3"))
+IMPORT_SNIPPET = "import time; started = time.perf_counter(); import {module}; print(time.perf_counter() - started)"
+SERVER_START_TIMEOUT = 60
+
+
+def bench_env(work_dir, **overrides):
+    env = dict(os.environ)
+    env.update({
+        "SECRET_KEY": "bench",
+        "EXPORT_PREWARM": "0",
+        "PARTITION_MAINTENANCE": "0",
+        "RATE_LIMIT_ENABLED": "0",
+        "QUOTA_DB": os.path.join(work_dir, "quota.sqlite3"),
+        "JOURNAL_DIR": os.path.join(work_dir, "journal"),
+    })
+    env.update(overrides)
+    return env
+
+
+def time_import(module, env, runs):
+    """Median seconds to import a module in a fresh interpreter"""
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET.format(module=module)], cwd=SERVER_DIR,
+                                env=env, capture_output=True, text=True, check=True).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+def slowest_imports(env, limit=8):
+    """(module, cumulative ms) of the slowest modules app imports directly"""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=SERVER_DIR, env=env,
+                            capture_output=True, text=True, check=True).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 1:
+            modules.append((name.strip(), int(cumulative) / 1000))
+    return sorted(modules, key=lambda module: -module[1])[:limit]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def get_health(port):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        conn.request("GET", "/api/health")
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def bench_server_start(env, workers):
+    """Seconds from launching gunicorn to the first healthy response, and the
+    slowest of the next few requests in ms (they land on the other workers)"""
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app", "--bind", f"127.0.0.1:{port}", "--workers", str(workers),
+         "--log-level", "warning"],
+        cwd=SERVER_DIR, env=env,
+    )
+    try:
+        while True:
+            if time.perf_counter() - started > SERVER_START_TIMEOUT:
+                raise RuntimeError(f"Server did not come up within {SERVER_START_TIMEOUT}s")
+            try:
+                if get_health(port) == 200:
+                    break
+            except OSError:
+                time.sleep(0.01)
+        ready = time.perf_counter() - started
+
+        first_requests = []
+        for _ in range(workers * 4):
+            request_started = time.perf_counter()
+            get_health(port)
+            first_requests.append((time.perf_counter() - request_started) * 1000)
+        return ready, max(first_requests)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time and time to first response")
+    parser.add_argument("--backend", default=BENCH_BACKEND, choices=["postgres", "sqlite"])
+    parser.add_argument("--sqlite-path", default=BENCH_SQLITE_PATH, help="database file for --backend sqlite")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per measurement")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    os.environ["STORAGE_BACKEND"] = args.backend
+    if args.backend == "sqlite":
+        os.environ["SQLITE_PATH"] = os.path.abspath(args.sqlite_path)
+    elif BENCH_DB_URL:
+        os.environ["NEON_DB_URL"] = BENCH_DB_URL
+    else:
+        sys.exit("Set BENCH_DB_URL to a scratch Postgres database (it gets migrated), or use --backend sqlite")
+
+    results = {"backend": args.backend, "import": {}, "server": {}}
+    with tempfile.TemporaryDirectory() as work_dir:
+        # Migrate up front so no measurement below includes it
+        subprocess.run([sys.executable, "-c", "from storage import get_storage; get_storage().migrate()"],
+                       cwd=SERVER_DIR, env=bench_env(work_dir), check=True)
+
+        bare = bench_env(work_dir, RUN_MIGRATIONS="0", WORKER_STARTUP="post_fork")
+        results["import"]["app"] = time_import("app", bare, args.runs)
+        results["import"]["app + startup"] = time_import("app", bench_env(work_dir), args.runs)
+        for module in ("openpyxl", "pyarrow.parquet"):
+            try:
+                results["import"][f"{module} (on first export)"] = time_import(module, bare, args.runs)
+            except subprocess.CalledProcessError:
+                pass  # Not installed
+
+        print(f"{'import':<36} {'median ms':>10}")
+        for name, seconds in results["import"].items():
+            print(f"{name:<36} {seconds * 1000:>10.1f}")
+
+        results["slowest_imports"] = slowest_imports(bare)
+        print(f"\n{'slowest imports under app':<36} {'ms':>10}")
+        for name, ms in results["slowest_imports"]:
+            print(f"{name:<36} {ms:>10.1f}")
+
+        print(f"\n{'gunicorn, ' + str(args.workers) + ' workers':<36} {'first 200 s':>12} {'first requests max ms':>22}")
+        for name, preload in (("preloaded", "1"), ("imported per worker", "0")):
+            samples = [bench_server_start(bench_env(work_dir, GUNICORN_PRELOAD=preload), args.workers)
+                       for _ in range(args.runs)]
+            ready = statistics.median(sample[0] for sample in samples)
+            first = statistics.median(sample[1] for sample in samples)
+            results["server"][name] = {"first_response_s": round(ready, 3), "first_requests_max_ms": round(first, 1)}
+            print(f"{name:<36} {ready:>12.3f} {first:>22.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
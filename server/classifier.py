@@ -0,0 +1,254 @@
+# classifier.py - Keyword classification of jobs logged without a domain
+#
+# The extension sends whatever domain the user picked, which is often nothing
+# or 'other'. Those jobs are queued once they're inserted and a background
+# thread in each worker scores them against the DOMAINS keywords (the same
+# matcher as /api/suggest_domain), a batch at a time, off the request path.
+# Domains the classifier fills in are written back with Storage.reclassify_jobs(),
+# which moves each job between its day's rollup counts in the same transaction
+# and marks it domain_auto; the day's cached ZIPs are then dropped, since a
+# domain change doesn't move the export watermark.
+#
+# The queue is in memory and best effort: jobs dropped when it's full, or still
+# queued when a worker exits, stay unclassified until the next bulk run. After
+# the keyword lists change, re-score history with:
+#
+#     python classifier.py reclassify [--from YYYY-MM-DD] [--to YYYY-MM-DD] [--scope auto]
+#
+# which streams each day's jobs in, scores them in batches across a process
+# pool and writes the changed domains back a batch per transaction. The scope
+# is 'unclassified' (missing / 'other' only), 'auto' (those plus every domain
+# the classifier chose before - the default) or 'all', which also overrides
+# domains users picked themselves.
+
+import argparse
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+from domains_config import get_registry, suggest_domain_from_text
+
+CLASSIFY_ENABLED = os.getenv("CLASSIFY_ENABLED", "1") == "1"
+CLASSIFY_QUEUE_SIZE = int(os.getenv("CLASSIFY_QUEUE_SIZE", 10_000))  # jobs waiting per worker; more are dropped
+CLASSIFY_BATCH_SIZE = 200
+RECLASSIFY_BATCH_SIZE = int(os.getenv("RECLASSIFY_BATCH_SIZE", 1000))  # jobs per process pool task and update
+RECLASSIFY_WORKERS = int(os.getenv("RECLASSIFY_WORKERS", os.cpu_count() or 1))
+RECLASSIFY_PROGRESS_INTERVAL = 10  # seconds between progress lines
+
+# Fields of the rows backends hand to classify_rows(), description resolved
+CLASSIFY_COLUMNS = ["id", "domain", "domain_auto", "job_title", "job_description"]
+CLASSIFY_DESCRIPTION_FIELD = CLASSIFY_COLUMNS.index("job_description")
+
+# Which jobs a reclassification run reads (SQL shared by both backends)
+UNCLASSIFIED_SQL = "COALESCE(NULLIF(domain, ''), 'other') = 'other'"  # Must match ROLLUP_DOMAIN_SQL
+CLASSIFY_SCOPES = {
+    "unclassified": UNCLASSIFIED_SQL,
+    "auto": f"({UNCLASSIFIED_SQL} OR domain_auto)",
+    "all": "TRUE",
+}
+
+
+def needs_domain(domain):
+    """Whether a job was logged without a real domain"""
+    return not domain or domain == "other"
+
+
+def as_text(value):
+    """Matcher input for a title / description; payloads can carry non-strings,
+    which are stored (and so classified) as their str()"""
+    return value if value is None or isinstance(value, str) else str(value)
+
+
+def classify_rows(rows):
+    """[(id, old domain, new domain)] for the CLASSIFY_COLUMNS rows whose
+    keyword classification differs from their domain. Jobs nothing matches
+    keep their domain, unless the classifier chose it - then it was keywords
+    that no longer match, and they go back to 'other'."""
+    changes = []
+    for job_id, domain, auto, job_title, job_description in rows:
+        suggested = suggest_domain_from_text(as_text(job_title), as_text(job_description))
+        if suggested is None:
+            if not auto:
+                continue
+            suggested = "other"
+        if suggested != domain:
+            changes.append((job_id, domain, suggested))
+    return changes
+
+
+def apply_domain_changes(changes, day=None):
+    """Write classify_rows() changes back (all on `day` if given) and drop the
+    cached summaries and ZIPs of the days they touched; returns how many jobs
+    changed"""
+    if not changes:
+        return 0
+    from storage import get_storage
+    from rollups import forget_closed_days
+    from admin.zip_utils import invalidate_exports
+
+    days = get_storage().reclassify_jobs(changes, day)
+    forget_closed_days(days)
+    for changed_day in days:
+        invalidate_exports(changed_day.isoformat())
+    return sum(days.values())
+
+
+# ---- background classification ---------------------------------------------
+
+class ClassificationQueue:
+    """Jobs waiting for a domain and the thread that classifies them"""
+
+    def __init__(self, maxsize=CLASSIFY_QUEUE_SIZE):
+        self._queue = queue.Queue(maxsize)
+        self.classified = 0
+        self.dropped = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._run, name="classifier", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, jobs):
+        """Queue (job id, job payload) pairs without ever blocking"""
+        for job_id, data in jobs:
+            try:
+                self._queue.put_nowait((job_id, data.get('domain'), False, data.get('job_title'),
+                                        data.get('job_description')))
+            except queue.Full:
+                self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < CLASSIFY_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.classified += apply_domain_changes(classify_rows(batch))
+            except Exception as e:
+                self.failed += len(batch)
+                print(f"⚠️ Background classification failed: {e}")
+
+    def stats(self):
+        return {
+            "pid": os.getpid(),
+            "queue_depth": self._queue.qsize(),
+            "classified": self.classified,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+_classification_queue = None
+_classification_pid = None
+_classification_lock = threading.Lock()
+
+
+def get_classification_queue():
+    """This process's classification queue, started on first use (and again after a fork)"""
+    global _classification_queue, _classification_pid
+    if _classification_queue is None or _classification_pid != os.getpid():
+        with _classification_lock:
+            if _classification_queue is None or _classification_pid != os.getpid():
+                _classification_queue = ClassificationQueue()
+                _classification_pid = os.getpid()
+    return _classification_queue
+
+
+def queue_for_classification(jobs):
+    """Queue freshly inserted (job id, payload) pairs whose domain is missing or 'other'"""
+    if not CLASSIFY_ENABLED:
+        return
+    jobs = [(job_id, data) for job_id, data in jobs if needs_domain(data.get('domain'))]
+    if jobs:
+        get_classification_queue().enqueue(jobs)
+
+
+def get_classification_stats():
+    """Queue depth and counters for this worker, for monitoring"""
+    if _classification_queue is None or _classification_pid != os.getpid():
+        return {"pid": os.getpid(), "queue_depth": 0, "classified": 0, "dropped": 0, "failed": 0}
+    return _classification_queue.stats()
+
+
+# ---- bulk reclassification --------------------------------------------------
+
+def reclassify(start_day=None, end_day=None, scope="auto", workers=RECLASSIFY_WORKERS,
+               batch_size=RECLASSIFY_BATCH_SIZE):
+    """Re-score the jobs in scope on [start_day, end_day] (from the first job
+    to today by default); returns (jobs scored, jobs reclassified)"""
+    from storage import get_storage
+
+    storage = get_storage()
+    start_day = start_day or storage.first_job_day()
+    end_day = end_day or datetime.utcnow().date()
+    if start_day is None:
+        return 0, 0
+
+    def batches():
+        day = start_day
+        while day <= end_day:
+            rows = storage.classification_rows(day, scope)
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                yield day, batch
+            day += timedelta(days=1)
+
+    scored = changed = 0
+    started = reported = time.monotonic()
+    pending = deque()  # (day, batch size, future) in submission order
+
+    def finish():
+        nonlocal scored, changed
+        day, size, future = pending.popleft()
+        changed += apply_domain_changes(future.result(), day)
+        scored += size
+        return day
+
+    # Spawned rather than forked: the workers only need the keyword matcher,
+    # not copies of this process's database connections
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=get_registry) as pool:
+        for day, batch in batches():
+            # A bounded window of batches in flight keeps memory flat however long the range
+            while len(pending) >= workers * 2:
+                finish()
+            pending.append((day, len(batch), pool.submit(classify_rows, batch)))
+
+            now = time.monotonic()
+            if now - reported >= RECLASSIFY_PROGRESS_INTERVAL:
+                reported = now
+                print(f"🔄 {day}: {scored} jobs scored, {changed} reclassified "
+                      f"({scored / (now - started):.0f} jobs/s)", flush=True)
+        while pending:
+            finish()
+
+    return scored, changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify jobs into domains by keyword")
+    parser.add_argument("command", choices=["reclassify"])
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, help="first UTC day (inclusive)")
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, help="last UTC day (inclusive)")
+    parser.add_argument("--scope", choices=sorted(CLASSIFY_SCOPES), default="auto",
+                        help="which jobs to re-score (default: unclassified and auto-classified)")
+    parser.add_argument("--workers", type=int, default=RECLASSIFY_WORKERS, help="scoring processes")
+    parser.add_argument("--batch-size", type=int, default=RECLASSIFY_BATCH_SIZE, help="jobs per batch")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    scored, changed = reclassify(args.start, args.end, args.scope, args.workers, args.batch_size)
+    print(f"✅ {scored} jobs scored, {changed} reclassified in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+# db.py - Shared Postgres connection pool
+#
+# Every gunicorn worker keeps its own small pool of open connections to Neon so
+# requests skip the TCP + TLS + auth handshake. Connections are health-checked
+# after sitting idle, recycled once they reach DB_POOL_MAX_LIFETIME and always
+# returned to the pool (rolled back) when the caller raises.
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.extras import RealDictCursor
+from dotenv import load_dotenv
+
+from metrics import METRICS_ENABLED, DB_POOL_WAIT_SECONDS, observe_query
+
+load_dotenv()
+NEON_DB_URL = os.getenv("NEON_DB_URL")
+
+# Pool sizing is per process (one pool per gunicorn worker), so the total number
+# of connections is roughly workers * DB_POOL_MAX.
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", 1))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", 4))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))           # seconds to wait for a free connection
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", 1800))  # recycle connections older than this
+DB_POOL_IDLE_CHECK = float(os.getenv("DB_POOL_IDLE_CHECK", 30))     # ping connections idle longer than this
+
+
+class TimedCursor(RealDictCursor):
+    """RealDictCursor that reports how long each statement took to metrics"""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            result = super().execute(query, vars)
+        except Exception:
+            observe_query(query, time.perf_counter() - started, failed=True)
+            raise
+        observe_query(query, time.perf_counter() - started)
+        return result
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            result = super().executemany(query, vars_list)
+        except Exception:
+            observe_query(query, time.perf_counter() - started, failed=True)
+            raise
+        observe_query(query, time.perf_counter() - started)
+        return result
+
+
+DEFAULT_CURSOR = TimedCursor if METRICS_ENABLED else RealDictCursor
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within DB_POOL_TIMEOUT"""
+
+
+class ConnectionPool:
+    """Thread-safe pool of psycopg2 connections with health checks and recycling"""
+
+    def __init__(self, dsn, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT,
+                 max_lifetime=DB_POOL_MAX_LIFETIME, idle_check=DB_POOL_IDLE_CHECK):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = max(maxconn, 1)
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.idle_check = idle_check
+
+        self._cond = threading.Condition()
+        self._idle = []        # [(conn, created_at, last_used)]
+        self._in_use = {}      # id(conn) -> created_at
+        self._busy = 0         # checked out or being opened
+        self._closed = False
+        self._stats = {
+            "connections_opened": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "timeouts": 0,
+            "health_check_failures": 0,
+            "recycled": 0,
+        }
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn, cursor_factory=DEFAULT_CURSOR)
+        with self._cond:
+            self._stats["connections_opened"] += 1
+        return conn
+
+    def _discard(self, conn):
+        with self._cond:  # Reentrant: putconn() discards while holding it
+            self._stats["connections_closed"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, created_at, last_used):
+        now = time.monotonic()
+        if conn.closed:
+            return False
+        if self.max_lifetime and now - created_at > self.max_lifetime:
+            with self._cond:
+                self._stats["recycled"] += 1
+            return False
+        if self.idle_check and now - last_used > self.idle_check:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except Exception:
+                with self._cond:
+                    self._stats["health_check_failures"] += 1
+                return False
+        return True
+
+    def fill(self):
+        """Open connections until at least `minconn` exist"""
+        while True:
+            with self._cond:
+                if self._closed or len(self._idle) + self._busy >= self.minconn:
+                    return
+                self._busy += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._busy -= 1
+                    self._cond.notify()
+                raise
+            now = time.monotonic()
+            with self._cond:
+                self._busy -= 1
+                self._idle.append((conn, now, now))
+                self._cond.notify()
+
+    def getconn(self):
+        """Check a connection out of the pool, waiting up to `timeout` seconds"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        while True:
+            # Claim a slot: either an idle connection or room to open a new one
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("Connection pool is closed")
+                    if self._idle:
+                        conn, created_at, last_used = self._idle.pop()
+                        break
+                    if self._busy < self.maxconn:
+                        conn, created_at, last_used = None, None, None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                    waited = True
+                    self._cond.wait(remaining)
+                self._busy += 1
+
+            try:
+                if conn is None:
+                    conn = self._connect()
+                    created_at = time.monotonic()
+                elif not self._is_healthy(conn, created_at, last_used):
+                    self._discard(conn)
+                    with self._cond:
+                        self._busy -= 1
+                    continue
+            except Exception:
+                with self._cond:
+                    self._busy -= 1
+                    self._cond.notify()
+                raise
+
+            wait_time = time.monotonic() - started
+            DB_POOL_WAIT_SECONDS.observe(wait_time)
+            with self._cond:
+                self._in_use[id(conn)] = created_at
+                self._stats["checkouts"] += 1
+                self._stats["wait_time_total"] += wait_time
+                if waited:
+                    self._stats["waits"] += 1
+            return conn
+
+    def putconn(self, conn, discard=False):
+        """Return a connection, rolling back any open transaction first"""
+        with self._cond:
+            created_at = self._in_use.pop(id(conn), None)
+
+        if created_at is None:
+            # Not ours (e.g. checked out before a fork) - just drop it
+            self._discard(conn)
+            return
+
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            self._busy -= 1
+            if discard or conn.closed or self._closed:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "pid": os.getpid(),
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+                "in_use": self._busy,
+                "idle": len(self._idle),
+                "size": self._busy + len(self._idle),
+            })
+        stats["wait_time_total"] = round(stats["wait_time_total"], 6)
+        return stats
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Get this process's pool, creating it lazily (and again after a fork)"""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                # Connections inherited from a parent process must never be
+                # reused by the child, so a forked worker starts a fresh pool.
+                _pool = ConnectionPool(NEON_DB_URL)
+                _pool_pid = pid
+    return _pool
+
+
+def close_pool():
+    """Close this process's pool (a preloading gunicorn master does before it
+    forks workers); the next get_pool() opens a new one"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = _pool_pid = None
+
+
+@contextmanager
+def db_connection(commit=False):
+    """Borrow a pooled connection; commits on success if asked, always returns it"""
+    pool = get_pool()
+    conn = pool.getconn()
+    discard = False
+    try:
+        yield conn
+        if commit:
+            conn.commit()
+    except psycopg2.InterfaceError:
+        discard = True
+        raise
+    except psycopg2.OperationalError:
+        # Connection-level failure (server closed, network drop) - don't reuse it
+        discard = True
+        raise
+    finally:
+        pool.putconn(conn, discard=discard)
+
+
+@contextmanager
+def db_cursor(commit=False):
+    """Borrow a pooled connection and yield a RealDictCursor on it"""
+    with db_connection(commit=commit) as conn:
+        cur = conn.cursor()
+        try:
+            yield cur
+        finally:
+            cur.close()
+
+
+def get_pool_stats():
+    """Pool statistics for this worker, for monitoring"""
+    if _pool is None or _pool_pid != os.getpid():
+        return {"pid": os.getpid(), "size": 0, "in_use": 0, "idle": 0, "max_size": DB_POOL_MAX}
+    return _pool.stats()
+
+
+def utc_day_range(day):
+    """Half-open [start, end) UTC datetimes for a date or 'YYYY-MM-DD' string.
+
+    Filtering with `timestamp >= start AND timestamp < end` lets Postgres use
+    the timestamp indexes, unlike DATE(timestamp AT TIME ZONE 'UTC') = day.
+    """
+    if not isinstance(day, date):
+        day = date.fromisoformat(day)
+    start = datetime.combine(day, dt_time.min, tzinfo=timezone.utc)
+    return start, start + timedelta(days=1)
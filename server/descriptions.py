@@ -0,0 +1,99 @@
+# descriptions.py - Content-addressed, compressed storage of job descriptions
+#
+# Many users log the same popular postings, so descriptions are stored once in
+# job_descriptions, keyed by the SHA-256 of their UTF-8 text and zlib
+# compressed, and jobs only carries the 32-byte description_hash. Descriptions
+# are read back by the day exports (Storage.stream_export_rows), month archival
+# (Storage.archive_month), search results (search.search_results) and the
+# background classifier (Storage.classification_rows) - any change to how
+# they're stored has to keep all four working. Each looks them up lazily, for
+# a chunk of rows (or a search page) at a time, so every other query stays off
+# the big bodies entirely. Descriptions no job refers to any more can be
+# removed with:
+#
+#     python descriptions.py prune
+
+import argparse
+import hashlib
+import os
+import zlib
+from collections import OrderedDict
+from itertools import islice
+
+from storage.base import EXPORT_COLUMNS, EXPORT_FETCH_SIZE
+
+DESCRIPTION_COMPRESS_LEVEL = int(os.getenv("DESCRIPTION_COMPRESS_LEVEL", 6))
+DESCRIPTION_CACHE_SIZE = int(os.getenv("DESCRIPTION_CACHE_SIZE", 1000))  # decompressed texts kept per export
+
+# Position of the description in (domain, *EXPORT_COLUMNS) export rows
+DESCRIPTION_FIELD = 1 + EXPORT_COLUMNS.index('job_description')
+
+
+def pack_description(text):
+    """(hash, compressed body, length in bytes) for a description, None if there is none"""
+    if text is None:
+        return None
+    raw = str(text).encode("utf-8")
+    return hashlib.sha256(raw).digest(), zlib.compress(raw, DESCRIPTION_COMPRESS_LEVEL), len(raw)
+
+
+def unpack_description(body):
+    return zlib.decompress(bytes(body)).decode("utf-8")
+
+
+def resolve_descriptions(rows, fetch_bodies, chunk_size=EXPORT_FETCH_SIZE, cache_size=DESCRIPTION_CACHE_SIZE,
+                         field=DESCRIPTION_FIELD):
+    """Fill in the description of export rows that end in a description_hash.
+
+    Rows are (domain, *EXPORT_COLUMNS, description_hash) - or any layout with
+    the description at `field`; the hash is dropped and, when set, replaces the
+    (inline, pre-migration) description. Bodies are looked up once per chunk of
+    rows with fetch_bodies(hashes) -> {hash: body}.
+    """
+    cache = OrderedDict()  # hash -> text
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+
+        texts = {}
+        missing = []
+        for row in chunk:
+            if row[-1] is None:
+                continue
+            key = bytes(row[-1])
+            if key in texts:
+                continue
+            if key in cache:
+                cache.move_to_end(key)
+                texts[key] = cache[key]
+            else:
+                texts[key] = None
+                missing.append(key)
+        if missing:
+            for key, body in fetch_bodies(missing).items():
+                text = texts[bytes(key)] = unpack_description(body)
+                cache[bytes(key)] = text
+            while len(cache) > cache_size:
+                cache.popitem(last=False)
+
+        for row in chunk:
+            if row[-1] is None:
+                yield tuple(row[:-1])
+            else:
+                yield (*row[:field], texts[bytes(row[-1])], *row[field + 1:-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the job description store")
+    parser.add_argument("command", choices=["prune"])
+    parser.parse_args()
+
+    from storage import get_storage
+    removed = get_storage().prune_descriptions()
+    print(f"✅ Removed {removed} unreferenced descriptions")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,13 @@
 # domains_config.py - Comprehensive Job Domain Configuration
 
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from types import MappingProxyType
+
 DOMAINS = [
     # TECHNICAL DOMAINS
     {
@@ -192,38 +200,218 @@ DOMAINS = [
     }
 ]
 
+# Keyword hits in the title say far more about the role than the same word
+# somewhere in a long description, so they count for more.
+TITLE_WEIGHT = 3
+DESCRIPTION_WEIGHT = 1
+
+class KeywordMatcher:
+    """All domain keywords compiled into one word-boundary-aware regex.
+
+    The keywords are folded into a character trie and emitted as a single
+    pattern, so each text is scanned once instead of once per keyword.
+    Matches must start and end on a word boundary ("ai" doesn't match
+    "maintain", "pm" doesn't match "npm") and a trailing plural "s"/"es" is
+    allowed ("developers" matches "developer").
+    """
+
+    def __init__(self, domains):
+        self.domain_ids = [domain['id'] for domain in domains]
+        self.keyword_domains = {}
+        for domain in domains:
+            for keyword in domain['keywords']:
+                domain_ids = self.keyword_domains.setdefault(keyword.lower(), [])
+                if domain['id'] not in domain_ids:
+                    domain_ids.append(domain['id'])
+
+        # The regex reports the longest keyword starting at each word, so also
+        # credit keywords that are whole-word prefixes of it ("web" in "web design").
+        self.implied = {
+            keyword: [other for other in self.keyword_domains
+                      if other == keyword or keyword.startswith(other + " ")]
+            for keyword in self.keyword_domains
+        }
+
+        # Zero-width lookahead so overlapping keywords ("data scientist" and
+        # "scientist") are each found at their own word start.
+        trie = _keyword_trie(self.keyword_domains)
+        self.pattern = re.compile(
+            r"(?<![a-z0-9])(?=(" + _trie_to_regex(trie) + r")(?:e?s)?(?![a-z0-9]))"
+        )
+
+    def keywords_in(self, text):
+        """Distinct keywords found in text"""
+        if not text:
+            return set()
+        found = set()
+        for keyword in set(self.pattern.findall(text.lower())):
+            found.update(self.implied[keyword])
+        return found
+
+    def score(self, job_title, job_description=""):
+        """Weighted score per domain id (only domains with at least one hit)"""
+        scores = {}
+        for weight, text in ((TITLE_WEIGHT, job_title), (DESCRIPTION_WEIGHT, job_description)):
+            for keyword in self.keywords_in(text):
+                for domain_id in self.keyword_domains[keyword]:
+                    scores[domain_id] = scores.get(domain_id, 0) + weight
+        return scores
+
+    def best(self, scores):
+        """Highest scoring domain id (first in DOMAINS order on ties), or None"""
+        if not scores:
+            return None
+        return max(self.domain_ids, key=lambda domain_id: scores.get(domain_id, 0))
+
+
+def _keyword_trie(keywords):
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = True
+    return trie
+
+def _trie_to_regex(node):
+    branches = [re.escape(char) + _trie_to_regex(child)
+                for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if "" in node:
+        # A keyword ends here but longer ones continue - try the longer first
+        body = "(?:" + body + ")?"
+    return body
+
+# ---------------------------------------------------------------------------
+# Domain registry
+#
+# DOMAINS (or the file named by DOMAINS_FILE) is loaded once into an immutable
+# registry with everything the routes need precomputed: lookup by id, the
+# active list, dropdown tuples and the keyword matcher. When DOMAINS_FILE is
+# set, its mtime is checked at most every DOMAINS_RELOAD_INTERVAL seconds and
+# the registry is rebuilt when it changes, so keyword edits need no restart.
+# ---------------------------------------------------------------------------
+
+DOMAINS_FILE = os.getenv("DOMAINS_FILE")
+DOMAINS_RELOAD_INTERVAL = float(os.getenv("DOMAINS_RELOAD_INTERVAL", 5))
+
+class DomainRegistry:
+    """Read-only snapshot of the domain configuration"""
+
+    def __init__(self, domains, source="builtin", mtime=None):
+        self.source = source
+        self.mtime = mtime
+        self.domains = tuple(
+            MappingProxyType({
+                "id": domain["id"],
+                "display_name": domain["display_name"],
+                "keywords": tuple(domain["keywords"]),
+                "active": bool(domain.get("active", True)),
+            })
+            for domain in domains
+        )
+        self.by_id = MappingProxyType({domain["id"]: domain for domain in self.domains})
+        self.active = tuple(domain for domain in self.domains if domain["active"])
+        self.dropdown = tuple((domain["id"], domain["display_name"]) for domain in self.active)
+        self.matcher = KeywordMatcher(self.active)
+
+        # Changes whenever the content does; used for caching/ETags downstream
+        self.version = hashlib.sha1(
+            json.dumps([dict(domain) for domain in self.domains], sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+def load_domains_file(path):
+    """Read a list of domains from a JSON or YAML file"""
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yml", ".yaml")):
+            import yaml  # optional, only needed for YAML domain files
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("domains")
+    if not isinstance(data, list):
+        raise ValueError(f"{path} must contain a list of domains")
+
+    seen = set()
+    for domain in data:
+        missing = [key for key in ("id", "display_name", "keywords") if key not in domain]
+        if missing:
+            raise ValueError(f"Domain {domain.get('id', '?')} is missing {', '.join(missing)}")
+        if domain["id"] in seen:
+            raise ValueError(f"Duplicate domain id {domain['id']}")
+        seen.add(domain["id"])
+    return data
+
+_registry = None
+_registry_checked_at = 0.0
+_registry_lock = threading.Lock()
+
+def _load_registry():
+    if DOMAINS_FILE:
+        mtime = os.path.getmtime(DOMAINS_FILE)
+        return DomainRegistry(load_domains_file(DOMAINS_FILE), source=DOMAINS_FILE, mtime=mtime)
+    return DomainRegistry(DOMAINS)
+
+def get_registry():
+    """Current domain registry, reloading DOMAINS_FILE if it changed"""
+    global _registry, _registry_checked_at
+    registry = _registry
+    if registry is not None and not DOMAINS_FILE:
+        return registry
+
+    now = time.monotonic()
+    if registry is not None and now - _registry_checked_at < DOMAINS_RELOAD_INTERVAL:
+        return registry
+
+    with _registry_lock:
+        if _registry is None:
+            _registry = _load_registry()
+        elif DOMAINS_FILE and now - _registry_checked_at >= DOMAINS_RELOAD_INTERVAL:
+            try:
+                if os.path.getmtime(DOMAINS_FILE) != _registry.mtime:
+                    _registry = _load_registry()
+                    print(f"🔄 Reloaded {len(_registry.domains)} domains from {DOMAINS_FILE}")
+            except Exception as e:
+                # Keep serving the last good configuration
+                print(f"⚠️ Could not reload {DOMAINS_FILE}: {e}")
+        _registry_checked_at = now
+        return _registry
+
 def get_active_domains():
     """Get all active domains"""
-    return [domain for domain in DOMAINS if domain['active']]
+    return get_registry().active
 
 def get_domain_by_id(domain_id):
     """Get specific domain by ID"""
-    for domain in DOMAINS:
-        if domain['id'] == domain_id:
-            return domain
-    return None
+    return get_registry().by_id.get(domain_id)
 
 def get_domains_for_dropdown():
     """Get domains formatted for dropdown display"""
-    active_domains = get_active_domains()
-    return [(domain['id'], domain['display_name']) for domain in active_domains]
+    return get_registry().dropdown
+
+def get_keyword_matcher():
+    """Compiled matcher for the active domains"""
+    return get_registry().matcher
 
 def suggest_domain_from_text(job_title, job_description=""):
     """Suggest domain based on job content"""
-    text = f"{job_title} {job_description}".lower()
-    
-    domain_scores = {}
-    for domain in get_active_domains():
-        score = 0
-        for keyword in domain['keywords']:
-            if keyword.lower() in text:
-                score += 1
-        domain_scores[domain['id']] = score
-    
-    # Return domain with highest score, or None if no matches
-    if max(domain_scores.values()) > 0:
-        return max(domain_scores, key=domain_scores.get)
-    return None
+    matcher = get_keyword_matcher()
+    return matcher.best(matcher.score(job_title or "", job_description or ""))
+
+def classify_jobs(jobs):
+    """Suggest a domain for each {'job_title', 'job_description'} dict"""
+    matcher = get_keyword_matcher()
+    results = []
+    for job in jobs:
+        scores = matcher.score(job.get('job_title') or "", job.get('job_description') or "")
+        results.append({
+            "domain": matcher.best(scores),
+            "scores": dict(sorted(scores.items(), key=lambda item: -item[1])[:3])
+        })
+    return results
 
 # For debugging - print all domains
 if __name__ == "__main__":
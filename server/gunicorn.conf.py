@@ -0,0 +1,45 @@
+# gunicorn.conf.py - Gunicorn settings, read automatically when started from server/
+#
+# The app is preloaded: the master imports it once (Flask, the domain registry
+# and its keyword matcher) and runs the migrations, and every worker forks from
+# that warm copy instead of importing everything again - a cold start on the
+# free tier pays for the imports once, and memory is shared copy-on-write.
+# Nothing that can't cross a fork is left open in the master: app.py defers
+# background threads and connections (WORKER_STARTUP=post_fork), when_ready
+# closes the connections the migrations used and post_fork runs
+# app.start_worker() in each worker before it accepts requests. Set
+# GUNICORN_PRELOAD=0 to import the app in every worker instead.
+#
+# SERVE_MODE=async serves asgi:app on uvicorn workers instead of app:app on
+# sync ones (see asgi.py); the preloading works the same either way. The app
+# comes from here, so start gunicorn without naming one.
+#
+# Bind address and worker count keep gunicorn's defaults, which follow $PORT
+# and $WEB_CONCURRENCY.
+
+import os
+
+SERVE_MODE = os.getenv("SERVE_MODE", "sync")
+
+if SERVE_MODE == "async":
+    wsgi_app = "asgi:app"
+    worker_class = "uvicorn_worker.UvicornWorker"
+else:
+    wsgi_app = "app:app"
+
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+if preload_app:
+    os.environ.setdefault("WORKER_STARTUP", "post_fork")
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        from storage import get_storage
+        get_storage().close()
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        from app import start_worker
+        start_worker()
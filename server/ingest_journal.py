@@ -0,0 +1,362 @@
+# ingest_journal.py - Write-behind ingestion through a durable local journal
+#
+# With INGEST_MODE=journal, /api/log_job appends the validated job to an
+# append-only JSONL segment on local disk, fsyncs it and answers "queued"
+# straight away. A background thread per worker drains the queue into the database
+# in batches (one transaction per batch through log_jobs, so the daily
+# limit and duplicate rules still apply) and records how far it got in a
+# checkpoint file next to the segment.
+#
+# Each worker owns its segment through an flock held for its lifetime. When a
+# worker dies, its lock goes with it and any worker that finds the segment
+# unlocked replays it from the checkpoint. A crash between a commit and the
+# checkpoint write replays a few jobs twice, which the fingerprint duplicate
+# rule turns into "duplicate" results instead of second rows.
+#
+# A batch the database rejects because of what's in it (rather than because
+# it's unreachable) is retried a job at a time; jobs that still fail are moved
+# to JOURNAL_DIR/dead-letter.jsonl with the error, so one bad entry can't hold
+# up the jobs queued behind it.
+#
+# JOURNAL_DIR must be on a disk that survives restarts for the replay to help.
+
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+from job_store import log_jobs, LOGGED_STATUSES
+from storage import get_storage
+
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "journal"))
+JOURNAL_BATCH_SIZE = int(os.getenv("JOURNAL_BATCH_SIZE", 200))            # jobs per group commit
+JOURNAL_FLUSH_INTERVAL = float(os.getenv("JOURNAL_FLUSH_INTERVAL", 0.25))  # max wait to fill a batch
+JOURNAL_FSYNC = os.getenv("JOURNAL_FSYNC", "1") == "1"                     # fsync before acknowledging
+JOURNAL_SEGMENT_BYTES = int(os.getenv("JOURNAL_SEGMENT_BYTES", 16 * 1024 * 1024))
+JOURNAL_REPLAY_INTERVAL = float(os.getenv("JOURNAL_REPLAY_INTERVAL", 60))  # look for orphaned segments
+JOURNAL_SHUTDOWN_TIMEOUT = float(os.getenv("JOURNAL_SHUTDOWN_TIMEOUT", 5))
+RETRY_BACKOFF_MAX = 30.0
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".jsonl"
+CHECKPOINT_SUFFIX = ".offset"
+DEAD_LETTER_FILE = "dead-letter.jsonl"
+
+
+def read_checkpoint(segment_path):
+    try:
+        with open(segment_path + CHECKPOINT_SUFFIX) as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def write_checkpoint(segment_path, offset):
+    # Not fsynced: losing a checkpoint only means re-applying jobs that the
+    # duplicate rule then rejects
+    tmp_path = segment_path + CHECKPOINT_SUFFIX + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(str(offset))
+    os.replace(tmp_path, segment_path + CHECKPOINT_SUFFIX)
+
+
+def remove_segment(segment_path):
+    for path in (segment_path, segment_path + CHECKPOINT_SUFFIX):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class IngestJournal:
+    """Per-process journal segment plus the thread that drains it into Postgres"""
+
+    def __init__(self, directory=JOURNAL_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()             # appends, the pending queue, rotation
+        self._sync_lock = threading.Lock()        # one fsync at a time covers every waiting append
+        self._wakeup = threading.Condition(self._lock)
+        self._pending = deque()                   # (end offset, enqueued_at, job) not yet in Postgres
+        self._stopping = False
+
+        self._fd = None
+        self._segment = None
+        self._generation = 0
+        self._written = 0
+        self._synced = 0
+        self._open_segment()
+
+        self._stats = {
+            "enqueued": 0,
+            "batches": 0,
+            "written": 0,
+            "duplicate": 0,
+            "limit_reached": 0,
+            "invalid": 0,
+            "dead_lettered": 0,
+            "write_failures": 0,
+            "replayed": 0,
+            "corrupt_lines": 0,
+            "fsyncs": 0,
+            "last_batch_size": 0,
+            "last_flush_at": None,
+            "last_error": None,
+        }
+
+        self._thread = threading.Thread(target=self._run, name="ingest-journal", daemon=True)
+        self._thread.start()
+
+    def _open_segment(self):
+        path = os.path.join(self.directory, f"{SEGMENT_PREFIX}{os.getpid()}-{time.time_ns()}{SEGMENT_SUFFIX}")
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)  # held until this process exits or rotates
+        self._fd, self._segment = fd, path
+        self._generation += 1
+        self._written = self._synced = 0
+
+    # ---- request side -------------------------------------------------------
+
+    def enqueue(self, jobs):
+        """Durably append validated jobs; returns the queue depth afterwards"""
+        payload = b"".join(
+            json.dumps(job, separators=(",", ":"), ensure_ascii=False).encode("utf-8") + b"\n"
+            for job in jobs
+        )
+        now = time.monotonic()
+        with self._lock:
+            if self._stopping:
+                raise RuntimeError("Ingest journal is shutting down")
+            os.write(self._fd, payload)
+            offset = self._written
+            for job, line in zip(jobs, payload.splitlines(keepends=True)):
+                offset += len(line)
+                self._pending.append((offset, now, job))
+            self._written = offset
+            generation = self._generation
+            depth = len(self._pending)
+            self._stats["enqueued"] += len(jobs)
+            self._wakeup.notify()
+
+        if JOURNAL_FSYNC:
+            self._sync(generation, offset)
+        return depth
+
+    def _sync(self, generation, offset):
+        # Group fsync: whoever gets here first syncs everything written so far,
+        # the requests queued behind it find their bytes already on disk
+        with self._sync_lock:
+            with self._lock:
+                if generation != self._generation or self._synced >= offset:
+                    return  # rotated (so already in Postgres) or covered by another fsync
+                target, fd = self._written, self._fd
+            os.fsync(fd)
+            with self._lock:
+                self._synced = max(self._synced, target)
+                self._stats["fsyncs"] += 1
+
+    # ---- writer side --------------------------------------------------------
+
+    def _write_batch(self, jobs):
+        try:
+            results = log_jobs(jobs)
+        except Exception as e:
+            if get_storage().is_transient_error(e):
+                raise  # Entries stay queued and the batch is retried
+            # Something in the batch is bad: write the rest without it
+            results = [self._write_one(job) for job in jobs]
+        with self._lock:
+            for result in results:
+                status = "written" if result["status"] in LOGGED_STATUSES else result["status"]
+                self._stats[status] = self._stats.get(status, 0) + 1
+            self._stats["batches"] += 1
+            self._stats["last_batch_size"] = len(jobs)
+            self._stats["last_flush_at"] = time.time()
+
+    def _write_one(self, job):
+        try:
+            return log_jobs([job])[0]
+        except Exception as e:
+            if get_storage().is_transient_error(e):
+                raise
+            self._dead_letter(job, e)
+            return {"status": "dead_lettered"}
+
+    def _dead_letter(self, job, error):
+        entry = {"failed_at": time.time(), "error": str(error), "job": job}
+        with open(os.path.join(self.directory, DEAD_LETTER_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._stats["last_error"] = str(error)
+        print(f"❌ Journaled job dead-lettered to {DEAD_LETTER_FILE}: {error}")
+
+    def _next_batch(self):
+        """Wait for work, then give concurrent requests a moment to join the batch"""
+        with self._lock:
+            if not self._pending and not self._stopping:
+                self._wakeup.wait(JOURNAL_REPLAY_INTERVAL)
+            if not self._pending:
+                return []
+            deadline = self._pending[0][1] + JOURNAL_FLUSH_INTERVAL
+            while len(self._pending) < JOURNAL_BATCH_SIZE and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._wakeup.wait(remaining)
+            return list(islice(self._pending, JOURNAL_BATCH_SIZE))
+
+    def _drain_once(self):
+        batch = self._next_batch()
+        if not batch:
+            return False
+        self._write_batch([job for _, _, job in batch])
+
+        with self._sync_lock, self._lock:
+            for _ in batch:
+                self._pending.popleft()
+            write_checkpoint(self._segment, batch[-1][0])
+            if not self._pending and self._written >= JOURNAL_SEGMENT_BYTES:
+                self._rotate()
+        return True
+
+    def _rotate(self):
+        # Caller holds both locks and everything in the segment is in Postgres
+        old_fd, old_segment = self._fd, self._segment
+        self._open_segment()
+        remove_segment(old_segment)
+        os.close(old_fd)
+
+    def _run(self):
+        backoff = 0.5
+        next_replay = 0.0
+        while True:
+            try:
+                if time.monotonic() >= next_replay:
+                    self.replay_orphans()
+                    next_replay = time.monotonic() + JOURNAL_REPLAY_INTERVAL
+                if not self._drain_once() and self._stopping:
+                    return
+                backoff = 0.5
+            except Exception as e:
+                # Entries stay queued (and journaled) until Postgres takes them
+                self._stats["write_failures"] += 1
+                self._stats["last_error"] = str(e)
+                print(f"⚠️ Journal flush failed, retrying in {backoff:.1f}s: {e}")
+                if self._stopping:
+                    return
+                time.sleep(backoff)
+                backoff = min(backoff * 2, RETRY_BACKOFF_MAX)
+
+    # ---- crash recovery -----------------------------------------------------
+
+    def replay_orphans(self):
+        """Apply segments left behind by dead processes, then delete them"""
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if not (name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)) or path == self._segment:
+                continue
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # its writer is alive (or another worker is replaying it)
+                if os.fstat(fd).st_nlink == 0:
+                    continue  # replayed and removed while we were opening it
+                self._replay_segment(path, fd)
+            finally:
+                os.close(fd)
+
+    def _replay_segment(self, path, fd):
+        offset = read_checkpoint(path)
+        os.lseek(fd, offset, os.SEEK_SET)
+        with os.fdopen(os.dup(fd), "rb") as f:
+            data = f.read()
+
+        batch, end = [], offset
+        # A trailing line without a newline was cut off mid-write and never acknowledged
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break
+            end += len(line)
+            try:
+                batch.append(json.loads(line))
+            except ValueError:
+                self._stats["corrupt_lines"] += 1
+            if len(batch) >= JOURNAL_BATCH_SIZE:
+                self._write_batch(batch)
+                self._stats["replayed"] += len(batch)
+                write_checkpoint(path, end)
+                batch = []
+        if batch:
+            self._write_batch(batch)
+            self._stats["replayed"] += len(batch)
+
+        remove_segment(path)
+        print(f"✅ Replayed journal segment {os.path.basename(path)}")
+
+    # ---- lifecycle / monitoring ---------------------------------------------
+
+    def close(self, timeout=JOURNAL_SHUTDOWN_TIMEOUT):
+        """Stop accepting jobs and flush what's queued; leftovers are replayed later"""
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify_all()
+        self._thread.join(timeout)
+        with self._sync_lock, self._lock:
+            if not self._pending and not self._thread.is_alive():
+                remove_segment(self._segment)
+            os.close(self._fd)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            stats = dict(self._stats)
+            depth = len(self._pending)
+            oldest = self._pending[0][1] if self._pending else None
+            stats.update({
+                "pid": os.getpid(),
+                "segment": os.path.basename(self._segment),
+                "segment_bytes": self._written,
+                "queue_depth": depth,
+                "lag_seconds": round(now - oldest, 3) if oldest is not None else 0.0,
+                "writer_alive": self._thread.is_alive(),
+            })
+        stats["segments_on_disk"] = sum(1 for name in os.listdir(self.directory)
+                                        if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX))
+        return stats
+
+
+_journal = None
+_journal_pid = None
+_journal_lock = threading.Lock()
+
+
+def get_journal():
+    """Get this process's journal, creating it lazily (and again after a fork)"""
+    global _journal, _journal_pid
+    pid = os.getpid()
+    if _journal is None or _journal_pid != pid:
+        with _journal_lock:
+            if _journal is None or _journal_pid != pid:
+                # The writer thread doesn't survive a fork, so each worker gets its own
+                _journal = IngestJournal()
+                _journal_pid = pid
+                atexit.register(_journal.close)
+    return _journal
+
+
+def get_journal_stats():
+    """Queue depth / lag for this worker, for monitoring"""
+    if _journal is None or _journal_pid != os.getpid():
+        return {"pid": os.getpid(), "queue_depth": 0, "lag_seconds": 0.0}
+    return _journal.stats()
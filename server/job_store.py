@@ -0,0 +1,227 @@
+# job_store.py - Job validation and the write path shared by the logging routes
+#
+# The routes call log_job() / log_jobs() here (asgi.py's log_job_async()); the
+# configured storage backend (see storage/) does the actual reads and writes.
+# The limit and duplicate rules, the near-duplicate check (near_duplicates.py)
+# on the jobs they let through, the result format, the quota counter updates and queueing jobs without a
+# domain for classification (classifier.py) live in this module so every
+# backend behaves the same.
+
+import asyncio
+import re
+from datetime import datetime
+from classifier import queue_for_classification
+from job_urls import job_fingerprint
+from near_duplicates import job_signature, find_near_duplicate, remember_job, to_db
+from quota import get_cached_count, set_count, increment, forget
+from storage import get_storage, get_async_storage
+
+REQUIRED_FIELDS = ['user_id', 'company_name', 'job_title', 'location', 'job_description', 'job_url', 'domain', 'timestamp']
+DAILY_LIMIT = 50
+MAX_BATCH_SIZE = 50
+DUPLICATE_WINDOW_DAYS = 7
+LOGGED_STATUSES = ('success', 'possible_duplicate')  # results of jobs that were inserted
+# ISO 8601 in the extended form every backend parses the same way (naive = UTC)
+TIMESTAMP_RE = re.compile(r"\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?(Z|[+-]\d{2}(:?\d{2})?)?")
+
+
+def validate_job(data):
+    """Return an error message for an unusable job payload, or None if it's fine"""
+    if not isinstance(data, dict):
+        return "Job must be a JSON object"
+    if not all(field in data for field in REQUIRED_FIELDS):
+        return "Missing required fields"
+    for field in ('user_id', 'company_name', 'job_title', 'job_url'):
+        if not isinstance(data[field], str):
+            return f"Field '{field}' must be a string"
+    if not valid_timestamp(data['timestamp']):
+        return "Invalid timestamp"
+    return None
+
+
+def valid_timestamp(value):
+    """Whether value is an ISO 8601 timestamp the storage backends accept"""
+    if not isinstance(value, str) or not TIMESTAMP_RE.fullmatch(value.strip()):
+        return False
+    try:
+        datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return False  # e.g. month 13
+    return True
+
+
+def dedup_key(data):
+    """Fingerprint of (title, company, canonical URL) used for the 7-day duplicate rule"""
+    return job_fingerprint(data['job_title'], data['company_name'], data['job_url'])
+
+
+def limit_reached_result():
+    return {
+        "status": "limit_reached",
+        "message": f"You have reached the daily limit of {DAILY_LIMIT} job logs."
+    }
+
+
+def possible_duplicate_result(job_id, duplicate_job_id, score):
+    return {
+        "status": "possible_duplicate",
+        "job_id": job_id,
+        "duplicate_job_id": duplicate_job_id,
+        "similarity": round(score, 2),
+        "message": "Job logged, but a very similar job was logged recently"
+    }
+
+
+def cached_limit_check(user_id):
+    """limit_reached result if this host's quota counter already shows the user at
+    the daily limit, else None (the write path still checks for real)"""
+    count = get_cached_count(user_id, datetime.utcnow().date())
+    if count is not None and count >= DAILY_LIMIT:
+        return limit_reached_result()
+    return None
+
+
+def inserted_user_ids(jobs, results):
+    """Users that got new rows from a log_jobs call"""
+    return {jobs[result['index']]['user_id'] for result in results if result['status'] in LOGGED_STATUSES}
+
+
+def prepare_job(data):
+    """(today, fingerprint, signature) of a validated job about to be logged"""
+    return datetime.utcnow().date(), dedup_key(data), job_signature(data)
+
+
+def record_job(data, today, fingerprint, signature, row):
+    """Check a Storage.log_job() row for near duplicates and publish it to the
+    near-duplicate index, the classifier and the quota counters; returns the
+    result dict"""
+    match = None
+    if row['job_id'] is not None:
+        match = find_near_duplicate(data, signature, fingerprint, exclude={row['job_id']})
+        remember_job(row['job_id'], data, signature, fingerprint)
+        queue_for_classification([(row['job_id'], data)])
+
+    # The write has committed, so its count is safe to publish to the quota counters
+    inserted_today = row['job_id'] is not None and row['job_day'] == today
+    set_count(data['user_id'], today, row['current_count'] + (1 if inserted_today else 0))
+    if row['job_id'] is not None and not inserted_today:
+        increment(data['user_id'], row['job_day'])
+
+    if row['current_count'] >= DAILY_LIMIT:
+        return limit_reached_result()
+    if row['duplicate_id'] is not None:
+        return {
+            "status": "duplicate",
+            "duplicate_job_id": row['duplicate_id'],
+            "message": "Duplicate job entry detected"
+        }
+    if match:
+        return possible_duplicate_result(row['job_id'], *match)
+    return {"status": "success", "job_id": row['job_id']}
+
+
+def log_job(data):
+    """Log one validated job atomically; returns a result dict"""
+    today, fingerprint, signature = prepare_job(data)
+    row = get_storage().log_job(data, fingerprint, today, to_db(signature))
+    return record_job(data, today, fingerprint, signature, row)
+
+
+async def log_job_async(data):
+    """log_job() for the async server: the write goes through the async storage,
+    and the signature and the post-insert work - the near-duplicate check, which
+    can refresh its index from the database, and the SQLite quota counters -
+    run in threads so they never block the event loop"""
+    today, fingerprint, signature = await asyncio.to_thread(prepare_job, data)
+    row = await get_async_storage().log_job(data, fingerprint, today, to_db(signature))
+    return await asyncio.to_thread(record_job, data, today, fingerprint, signature, row)
+
+
+def log_jobs(jobs):
+    """Validate, dedup and insert a batch of jobs in one transaction.
+
+    Returns one result dict per input job, in order, with a status of
+    success / duplicate / possible_duplicate / limit_reached / invalid
+    (possible_duplicate jobs were logged, like success ones).
+    """
+    signatures = [job_signature(data) if not validate_job(data) else None for data in jobs]
+    results = get_storage().log_jobs(jobs, [to_db(signature) for signature in signatures])
+
+    # The limit and duplicate rules have run; the inserted jobs are checked for
+    # near duplicates in order, each against the recent jobs and the ones
+    # before it in the batch (not the later ones the index may already hold)
+    inserted = {result['job_id'] for result in results if result['status'] == 'success'}
+    for index, result in enumerate(results):
+        if result['status'] != 'success':
+            continue
+        job_id, data, fingerprint = result['job_id'], jobs[index], dedup_key(jobs[index])
+        match = find_near_duplicate(data, signatures[index], fingerprint, exclude=inserted)
+        remember_job(job_id, data, signatures[index], fingerprint)
+        inserted.discard(job_id)
+        if match:
+            results[index] = {"index": index, **possible_duplicate_result(job_id, *match)}
+
+    queue_for_classification([(result['job_id'], jobs[result['index']]) for result in results
+                              if result['status'] in LOGGED_STATUSES])
+    forget(inserted_user_ids(jobs, results))
+    return results
+
+
+# ---- Batch rules, shared by the storage backends ----------------------------
+
+def validate_batch(jobs):
+    """(results with the invalid entries filled in, [(index, job)] of valid ones)"""
+    results = [None] * len(jobs)
+    valid = []
+    for index, data in enumerate(jobs):
+        error = validate_job(data)
+        if error:
+            results[index] = {"index": index, "status": "invalid", "message": error}
+        else:
+            valid.append((index, data))
+    return results, valid
+
+
+def plan_batch(results, valid, fingerprints, counts, existing):
+    """Apply the rules in request order (limit first, then duplicates, like log_job).
+
+    counts maps user_id -> jobs logged today and existing maps fingerprint -> id
+    of a job inside the duplicate window. Fills in results for rejected jobs and
+    returns [(index, job, fingerprint)] to insert.
+    """
+    to_insert = []
+    batch_first = {}  # fingerprint -> index of the first accepted job with that key
+    for index, data in valid:
+        user_id = data['user_id']
+        key = fingerprints[index]
+        if counts.get(user_id, 0) >= DAILY_LIMIT:
+            results[index] = {"index": index, **limit_reached_result()}
+        elif key in existing:
+            results[index] = {
+                "index": index,
+                "status": "duplicate",
+                "duplicate_job_id": existing[key],
+                "message": "Duplicate job entry detected"
+            }
+        elif key in batch_first:
+            results[index] = {
+                "index": index,
+                "status": "duplicate",
+                "duplicate_of_index": batch_first[key],
+                "message": "Duplicate job entry detected"
+            }
+        else:
+            batch_first[key] = index
+            counts[user_id] = counts.get(user_id, 0) + 1
+            to_insert.append((index, data, key))
+    return to_insert
+
+
+def finish_batch(results, to_insert, job_ids):
+    """Record the ids the inserted jobs got and point in-batch duplicates at them"""
+    for (index, _, _), job_id in zip(to_insert, job_ids):
+        results[index] = {"index": index, "status": "success", "job_id": job_id}
+    for result in results:
+        if result.get("duplicate_of_index") is not None:
+            result["duplicate_job_id"] = results[result.pop("duplicate_of_index")]["job_id"]
+    return results
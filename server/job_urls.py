@@ -0,0 +1,122 @@
+# job_urls.py - Canonical job URLs and duplicate-detection fingerprints
+#
+# The same posting reaches us with different tracking parameters, locale
+# prefixes or "/apply" suffixes depending on where the user clicked from.
+# canonicalize_job_url() reduces a URL to the part that identifies the job on
+# each ATS we extract from, and job_fingerprint() hashes it together with the
+# normalized title and company for the 7-day duplicate rule.
+
+import hashlib
+import re
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Query parameters that never identify a job
+TRACKING_PARAMS = {
+    "gh_src", "source", "src", "ref", "referrer", "refid", "trk", "trkid",
+    "lever-source", "lever-origin", "lever-via", "in_iframe", "mobile", "width",
+    "height", "bga", "needsredirect", "jun1offset", "jan1offset", "iis", "iisn",
+    "gclid", "fbclid", "msclkid", "mc_cid", "mc_eid", "_hsenc", "_hsmi",
+    "src_type", "jobsource", "sourcetype", "trackingid",
+}
+TRACKING_PREFIXES = ("utm_", "utm-", "hs_", "pk_", "mtm_")
+
+WORKDAY_LOCALE = re.compile(r"^[a-z]{2}-[a-z]{2}$", re.IGNORECASE)
+SMARTRECRUITERS_ID = re.compile(r"^(\d+)(?:-.*)?$")
+
+
+def _strip_apply(parts):
+    """Drop trailing /apply... segments (Workday, Lever)"""
+    if "apply" in parts:
+        parts = parts[:parts.index("apply")]
+    return parts
+
+
+def _canonical_path(host, parts, query):
+    """Site-specific (host, path segments, query) for known ATS hosts, or None"""
+    if host.endswith(".myworkdayjobs.com") or host.endswith(".myworkdaysite.com"):
+        if parts and WORKDAY_LOCALE.match(parts[0]):
+            parts = parts[1:]
+        return host, _strip_apply(parts), {}
+
+    if host.endswith("greenhouse.io"):
+        # boards.greenhouse.io, job-boards.greenhouse.io, boards.eu.greenhouse.io, ...
+        if parts[:2] == ["embed", "job_app"] and query.get("for") and query.get("token"):
+            return "boards.greenhouse.io", [query["for"], "jobs", query["token"]], {}
+        if len(parts) >= 3 and parts[1] == "jobs":
+            return "boards.greenhouse.io", parts[:3], {}
+        return "boards.greenhouse.io", parts, {}
+
+    if "gh_jid" in query:
+        # Greenhouse embedded on a company careers page - the job id is all that matters
+        return host, parts, {"gh_jid": query["gh_jid"]}
+
+    if host.endswith("lever.co"):
+        return host, _strip_apply(parts)[:2], {}
+
+    if host.endswith(".icims.com"):
+        if len(parts) >= 2 and parts[0] == "jobs" and parts[1].isdigit():
+            return host, ["jobs", parts[1], "job"], {}
+        return host, parts, {}
+
+    if host.endswith("smartrecruiters.com"):
+        if len(parts) >= 2:
+            match = SMARTRECRUITERS_ID.match(parts[1])
+            if match:
+                return "jobs.smartrecruiters.com", [parts[0].lower(), match.group(1)], {}
+        return host, parts, {}
+
+    if host.endswith("naukri.com"):
+        return "naukri.com", parts, {}
+
+    if host.startswith("builtin") and host.endswith(".com"):
+        # builtin.com/job/<slug>/<id> (also regional builtinnyc.com etc.)
+        if len(parts) >= 3 and parts[0] == "job" and parts[-1].isdigit():
+            return host, ["job", parts[-1]], {}
+        return host, parts, {}
+
+    return None
+
+
+def canonicalize_job_url(url):
+    """Normalize a job URL so equivalent links to the same posting compare equal"""
+    if not url:
+        return ""
+    url = url.strip()
+    if "://" not in url:
+        url = "https://" + url
+
+    split = urlsplit(url)
+    host = (split.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+
+    parts = [p for p in split.path.split("/") if p]
+    query_pairs = [
+        (key, value) for key, value in parse_qsl(split.query, keep_blank_values=False)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    ]
+    query = dict(query_pairs)
+
+    known = _canonical_path(host, parts, query)
+    if known:
+        host, parts, query = known
+        query_pairs = sorted(query.items())
+    else:
+        query_pairs = sorted(query_pairs)
+
+    path = "/" + "/".join(parts) if parts else ""
+    return urlunsplit(("https", host, path, urlencode(query_pairs), ""))
+
+
+def _normalize_text(value):
+    return " ".join((value or "").lower().split())
+
+
+def job_fingerprint(job_title, company_name, job_url):
+    """Stable hash of (title, company, canonical URL) used as the dedup key"""
+    key = "\x1f".join((
+        _normalize_text(job_title),
+        _normalize_text(company_name),
+        canonicalize_job_url(job_url),
+    ))
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
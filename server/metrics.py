@@ -0,0 +1,340 @@
+# metrics.py - Latency histograms and counters, served as Prometheus text on /metrics
+#
+# Covers per-route latency, every SQL statement run through the pool (timed by
+# TimedCursor in db.py), pool wait time and export phases. Observing is a lock,
+# a bisect and three additions, so it stays off the hot path's radar.
+#
+# Each gunicorn worker has its own registry. With METRICS_DIR set, workers also
+# dump a snapshot there every METRICS_FLUSH_INTERVAL seconds and /metrics adds
+# up the snapshots of the others, so any worker can answer a scrape for the
+# whole host. METRICS_LOG=1 additionally prints one JSON line per request (and
+# per statement slower than METRICS_SLOW_QUERY_MS).
+
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 10))
+METRICS_STALE_SECONDS = 3600  # forget snapshots of workers gone this long
+METRICS_LOG = os.getenv("METRICS_LOG", "0") == "1"
+METRICS_SLOW_QUERY_MS = float(os.getenv("METRICS_SLOW_QUERY_MS", 500))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")  # optional bearer token for /metrics
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+REGISTRY = []
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with a fixed set of label names"""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [per-bucket counts (last is +Inf), sum, count]
+        REGISTRY.append(self)
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {json.dumps(labels): [list(s[0]), s[1], s[2]] for labels, s in self._series.items()}
+
+    @staticmethod
+    def merge(into, series):
+        if into is None:
+            return [list(series[0]), series[1], series[2]]
+        into[0] = [a + b for a, b in zip(into[0], series[0])]
+        into[1] += series[1]
+        into[2] += series[2]
+        return into
+
+    def render(self, series_by_labels):
+        lines = []
+        for key, (buckets, total, count) in sorted(series_by_labels.items()):
+            labels = list(zip(self.labelnames, json.loads(key)))
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), buckets):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f"{self.name}_bucket{_labels(labels + [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {total!r}")
+            lines.append(f"{self.name}_count{_labels(labels)} {count}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter with a fixed set of label names"""
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return {json.dumps(labels): value for labels, value in self._values.items()}
+
+    @staticmethod
+    def merge(into, value):
+        return value if into is None else into + value
+
+    def render(self, series_by_labels):
+        return [
+            f"{self.name}{_labels(list(zip(self.labelnames, json.loads(key))))} {value!r}"
+            for key, value in sorted(series_by_labels.items())
+        ]
+
+
+class Gauge:
+    """Current value read from a callback when snapshotted, labelled by pid"""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, callback):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = ("pid",)
+        self.callback = callback
+        REGISTRY.append(self)
+
+    def snapshot(self):
+        try:
+            value = self.callback()
+        except Exception:
+            return {}
+        return {} if value is None else {json.dumps([str(os.getpid())]): value}
+
+    merge = staticmethod(Counter.merge)
+    render = Counter.render
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+# ---- The metrics themselves -------------------------------------------------
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "job_logger_http_request_duration_seconds", "Request latency by route", ("route", "method"))
+HTTP_REQUESTS = Counter(
+    "job_logger_http_requests_total", "Requests by route and status", ("route", "method", "status"))
+DB_QUERY_SECONDS = Histogram(
+    "job_logger_db_query_duration_seconds", "SQL statement latency by query", ("query",))
+DB_QUERY_ERRORS = Counter(
+    "job_logger_db_query_errors_total", "SQL statements that raised", ("query",))
+DB_POOL_WAIT_SECONDS = Histogram(
+    "job_logger_db_pool_wait_seconds", "Time to check a connection out of the pool",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10))
+EXPORT_PHASE_SECONDS = Histogram(
+    "job_logger_export_phase_seconds", "Export time per phase (fetch / serialize / zip)", ("phase", "format"))
+EXPORT_ROWS = Counter(
+    "job_logger_export_rows_total", "Rows written to export ZIPs", ("format",))
+EXPORT_FAILURES = Counter(
+    "job_logger_export_failures_total", "Exports that raised", ("format",))
+
+
+# ---- Per-request accounting and structured logs -----------------------------
+
+_request = threading.local()
+_query_labels = {}
+QUERY_LABEL_CACHE_SIZE = 1024
+TABLE_RE = re.compile(r"\b(?:from|into|update|table)\s+(?:if\s+(?:not\s+)?exists\s+)?([a-z_][a-z0-9_]*)", re.IGNORECASE)
+
+
+def query_label(sql):
+    """Name for a statement: its leading `-- name` comment, else verb + first table"""
+    label = _query_labels.get(sql)
+    if label is None:
+        text = sql.decode() if isinstance(sql, bytes) else str(sql)
+        text = text.lstrip()
+        if text.startswith("--"):
+            label = text[2:].split("\n", 1)[0].strip()
+        else:
+            verb = text.split(None, 1)[0].lower() if text else "unknown"
+            table = TABLE_RE.search(text)
+            label = f"{verb} {table.group(1)}" if table else verb
+        if len(_query_labels) < QUERY_LABEL_CACHE_SIZE:
+            _query_labels[sql] = label
+    return label
+
+
+def observe_query(sql, seconds, failed=False):
+    label = query_label(sql)
+    DB_QUERY_SECONDS.observe(seconds, label)
+    if failed:
+        DB_QUERY_ERRORS.inc(1, label)
+    if getattr(_request, "active", False):
+        _request.db_seconds += seconds
+        _request.db_queries += 1
+    if METRICS_LOG and seconds * 1000 >= METRICS_SLOW_QUERY_MS:
+        log_event("slow_query", query=label, duration_ms=round(seconds * 1000, 2))
+
+
+def log_event(event, **fields):
+    print(json.dumps({"ts": round(time.time(), 3), "event": event, "pid": os.getpid(), **fields},
+                     default=str), flush=True)
+
+
+class phase_timer:
+    """Context manager adding the time spent in its block to an export phase"""
+
+    def __init__(self, phase, export_format):
+        self.labels = (phase, export_format)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        EXPORT_PHASE_SECONDS.observe(time.perf_counter() - self.started, *self.labels)
+
+
+# ---- Snapshots shared between workers ---------------------------------------
+
+def snapshot():
+    return {metric.name: metric.snapshot() for metric in REGISTRY}
+
+
+def _snapshot_path(pid):
+    return os.path.join(METRICS_DIR, f"metrics-{pid}.json")
+
+
+def write_snapshot():
+    path = _snapshot_path(os.getpid())
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(snapshot(), f)
+    os.replace(tmp_path, path)
+
+
+def _other_snapshots():
+    if not METRICS_DIR or not os.path.isdir(METRICS_DIR):
+        return []
+    own = os.path.basename(_snapshot_path(os.getpid()))
+    snapshots = []
+    now = time.time()
+    for name in os.listdir(METRICS_DIR):
+        if not name.startswith("metrics-") or not name.endswith(".json") or name == own:
+            continue
+        path = os.path.join(METRICS_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > METRICS_STALE_SECONDS:
+                os.remove(path)
+                continue
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def render_metrics():
+    """Prometheus text exposition of this worker plus the other workers' snapshots"""
+    snapshots = [snapshot()] + _other_snapshots()
+    lines = []
+    for metric in REGISTRY:
+        merged = {}
+        for snap in snapshots:
+            for key, series in snap.get(metric.name, {}).items():
+                merged[key] = metric.merge(merged.get(key), series)
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render(merged))
+    return "\n".join(lines) + "\n"
+
+
+_flusher_pid = None
+
+
+def start_metrics_flusher():
+    """Periodically write this worker's snapshot to METRICS_DIR (once per process)"""
+    global _flusher_pid
+    if not METRICS_DIR or _flusher_pid == os.getpid():
+        return
+    _flusher_pid = os.getpid()
+    os.makedirs(METRICS_DIR, exist_ok=True)
+
+    def loop():
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            try:
+                write_snapshot()
+            except Exception as e:
+                print(f"⚠️ Could not write metrics snapshot: {e}")
+
+    threading.Thread(target=loop, name="metrics-flush", daemon=True).start()
+
+
+# ---- Flask wiring -----------------------------------------------------------
+
+def init_app(app):
+    """Time every request and serve /metrics"""
+    from flask import Response, request
+
+    if not METRICS_ENABLED:
+        return
+
+    @app.before_request
+    def _start_request_timer():
+        _request.active = True
+        _request.started = time.perf_counter()
+        _request.db_seconds = 0.0
+        _request.db_queries = 0
+        _request.status = 500  # unless after_request sees a response
+
+    @app.after_request
+    def _record_status(response):
+        _request.status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _observe_request(exc):
+        if not getattr(_request, "active", False):
+            return
+        _request.active = False
+        elapsed = time.perf_counter() - _request.started
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        HTTP_REQUEST_SECONDS.observe(elapsed, route, request.method)
+        HTTP_REQUESTS.inc(1, route, request.method, str(_request.status))
+        if METRICS_LOG:
+            log_event(
+                "request", route=route, method=request.method, status=_request.status,
+                duration_ms=round(elapsed * 1000, 2), db_ms=round(_request.db_seconds * 1000, 2),
+                db_queries=_request.db_queries,
+            )
+
+    @app.route('/metrics')
+    def metrics():
+        if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+            return Response("unauthorized\n", status=401, mimetype="text/plain")
+        return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,280 @@
+# near_duplicates.py - MinHash near-duplicate detection for logged jobs
+#
+# The exact rule in job_store only catches the same (title, company, canonical
+# URL). A role reposted under a tweaked title or another URL still has almost
+# the same text, so every job also gets a MinHash signature of its description
+# shingles. The share of equal signature slots estimates the Jaccard similarity
+# of two descriptions; blended with the overlap of the normalized title words,
+# which weighs TITLE_WEIGHT of the score, a job at the same company and location
+# scoring NEAR_DUPLICATE_THRESHOLD or above is a possible duplicate. The title
+# carries most of the weight because postings from one company share their
+# boilerplate: two different roles there can have very similar descriptions.
+# A possible duplicate is still logged; the result only points at the match.
+#
+# Each worker keeps the signatures of the last DUPLICATE_WINDOW_DAYS in memory,
+# in an LSH index of SIGNATURE_BANDS bands of BAND_ROWS slots each: jobs that
+# agree on a whole band share a bucket, so a lookup checks a handful of
+# candidates however many jobs are indexed. The index is loaded from the jobs
+# table in the background when the worker starts, updated on insert and topped
+# up with the other workers' inserts (by id) every NEAR_DUPLICATE_REFRESH
+# seconds. It's best effort - the exact rule stays the hard guarantee.
+
+import hashlib
+import os
+import re
+import struct
+import threading
+import time
+
+NEAR_DUPLICATE_ENABLED = os.getenv("NEAR_DUPLICATE_ENABLED", "1") == "1"
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", 0.75))  # blended title/description score
+TITLE_WEIGHT = 0.6  # with the threshold above, no title words in common never matches
+NEAR_DUPLICATE_REFRESH = float(os.getenv("NEAR_DUPLICATE_REFRESH", 5))        # seconds between top-ups
+NEAR_DUPLICATE_MIN_SHINGLES = 20  # descriptions shorter than this say too little to compare
+NEAR_DUPLICATE_MAX_WORDS = 5000
+PRUNE_INTERVAL = 300
+
+SHINGLE_SIZE = 3
+SIGNATURE_SLOTS = 64                 # one-permutation MinHash: the top 6 bits of a hash pick the slot
+SIGNATURE_BANDS = 16
+BAND_ROWS = SIGNATURE_SLOTS // SIGNATURE_BANDS
+SIGNATURE_FORMAT = struct.Struct(f">{SIGNATURE_SLOTS}I")
+_SLOT_SHIFT = 64 - (SIGNATURE_SLOTS.bit_length() - 1)
+_DENSIFY_STEP = 0x9E3779B1           # offset per slot when an empty slot borrows a neighbour's value
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+TITLE_ABBREVIATIONS = {"sr": "senior", "snr": "senior", "jr": "junior", "eng": "engineer", "engr": "engineer",
+                       "dev": "developer", "mgr": "manager", "mgmt": "management", "assoc": "associate"}
+
+
+def _words(text):
+    return WORD_RE.findall(str(text or "").lower())
+
+
+def job_shingles(data):
+    """Description word shingles of a job payload, or None if its description
+    is too short to compare"""
+    words = _words(data.get('job_description'))[:NEAR_DUPLICATE_MAX_WORDS]
+    if len(words) - SHINGLE_SIZE + 1 < NEAR_DUPLICATE_MIN_SHINGLES:
+        return None
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash(shingles):
+    """SIGNATURE_SLOTS 32-bit minimums from one 64-bit hash per shingle; empty
+    slots take the next filled slot's value, offset by the distance (rotation
+    densification) so they still compare fairly"""
+    slots = [None] * SIGNATURE_SLOTS
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        slot = value >> _SLOT_SHIFT
+        low = value & 0xFFFFFFFF
+        if slots[slot] is None or low < slots[slot]:
+            slots[slot] = low
+    signature = list(slots)
+    for slot in range(SIGNATURE_SLOTS):
+        if slots[slot] is None:
+            distance = 1
+            while slots[(slot + distance) % SIGNATURE_SLOTS] is None:
+                distance += 1
+            signature[slot] = (slots[(slot + distance) % SIGNATURE_SLOTS] + distance * _DENSIFY_STEP) & 0xFFFFFFFF
+    return tuple(signature)
+
+
+def job_signature(data):
+    """MinHash signature of a job payload, or None if it can't be compared"""
+    shingles = job_shingles(data)
+    return minhash(shingles) if shingles else None
+
+
+def title_words(job_title):
+    """Normalized words of a job title (common abbreviations spelled out)"""
+    return frozenset(TITLE_ABBREVIATIONS.get(word, word) for word in _words(job_title))
+
+
+def job_group(company_name, location):
+    """Only jobs at the same company and location are compared"""
+    return f"{' '.join(_words(company_name))}\x1f{' '.join(_words(location))}"
+
+
+def similarity(signature, other):
+    return sum(a == b for a, b in zip(signature, other)) / SIGNATURE_SLOTS
+
+
+def match_score(signature, words, other, other_words):
+    """Title word overlap and description similarity of two jobs, blended"""
+    title_overlap = len(words & other_words) / len(words | other_words) if words or other_words else 0.0
+    return TITLE_WEIGHT * title_overlap + (1 - TITLE_WEIGHT) * similarity(signature, other)
+
+
+def to_db(signature):
+    """Signature as stored in jobs.minhash"""
+    return SIGNATURE_FORMAT.pack(*signature) if signature is not None else None
+
+
+def from_db(value):
+    return SIGNATURE_FORMAT.unpack(bytes(value))
+
+
+class SimilarityIndex:
+    """Banded LSH index over the signatures of recently logged jobs"""
+
+    def __init__(self, window_seconds, threshold=NEAR_DUPLICATE_THRESHOLD):
+        self.window_seconds = window_seconds
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._entries = {}  # job id -> (signature, group, title words, fingerprint, logged at)
+        self._buckets = {}  # hash of (group, band, band slots) -> job id, or [job ids] once shared
+        self._last_id = 0
+        self._refreshed_at = 0.0
+        self._pruned_at = time.monotonic()
+        self._loading = False
+        self.ready = False
+
+    @staticmethod
+    def _keys(signature, group):
+        return [hash((group, band, signature[band * BAND_ROWS:(band + 1) * BAND_ROWS]))
+                for band in range(SIGNATURE_BANDS)]
+
+    def add(self, job_id, signature, group, words, fingerprint, logged_at):
+        with self._lock:
+            if job_id in self._entries:
+                return
+            self._entries[job_id] = (signature, group, words, fingerprint, logged_at)
+            for key in self._keys(signature, group):
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    self._buckets[key] = job_id  # most buckets hold one job; skip the list
+                elif isinstance(bucket, list):
+                    bucket.append(job_id)
+                else:
+                    self._buckets[key] = [bucket, job_id]
+
+    def _remove(self, job_id):
+        signature, group = self._entries.pop(job_id)[:2]
+        for key in self._keys(signature, group):
+            bucket = self._buckets[key]
+            if isinstance(bucket, list):
+                bucket.remove(job_id)
+                if len(bucket) == 1:
+                    self._buckets[key] = bucket[0]
+            else:
+                del self._buckets[key]
+
+    def find(self, signature, group, words, fingerprint, exclude=()):
+        """(job id, score) of the most similar recent job at or above the
+        threshold, leaving out the ids in exclude, or None - also when an exact
+        duplicate is among the candidates, which the exact rule reports instead"""
+        oldest = time.time() - self.window_seconds
+        best = None
+        with self._lock:
+            candidates = set()
+            for key in self._keys(signature, group):
+                bucket = self._buckets.get(key)
+                if isinstance(bucket, list):
+                    candidates.update(bucket)
+                elif bucket is not None:
+                    candidates.add(bucket)
+            for job_id in candidates.difference(exclude):
+                other, other_group, other_words, other_fingerprint, logged_at = self._entries[job_id]
+                if logged_at < oldest or other_group != group:
+                    continue
+                if other_fingerprint == fingerprint:
+                    return None
+                score = match_score(signature, words, other, other_words)
+                if score >= self.threshold and (best is None or (score, -job_id) > (best[1], -best[0])):
+                    best = (job_id, score)
+        return best
+
+    def load(self, rows):
+        """Add (id, minhash as stored, fingerprint, title, company, location, logged at epoch) rows"""
+        for job_id, stored, fingerprint, job_title, company_name, location, logged_at in rows:
+            self.add(job_id, from_db(stored), job_group(company_name, location), title_words(job_title),
+                     fingerprint, logged_at)
+            self._last_id = max(self._last_id, job_id)
+
+    def refresh(self, storage, force=False):
+        """Pick up rows other workers inserted; at most every NEAR_DUPLICATE_REFRESH
+        seconds and by one thread at a time (the others carry on without waiting)"""
+        now = time.monotonic()
+        if not force and now - self._refreshed_at < NEAR_DUPLICATE_REFRESH:
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            self._refreshed_at = now
+            self.load(storage.recent_signatures(time.time() - self.window_seconds, self._last_id))
+            if now - self._pruned_at >= PRUNE_INTERVAL:
+                self._pruned_at = now
+                oldest = time.time() - self.window_seconds
+                with self._lock:
+                    for job_id in [job_id for job_id, entry in self._entries.items() if entry[4] < oldest]:
+                        self._remove(job_id)
+        finally:
+            self._refresh_lock.release()
+
+    def start_loading(self, storage):
+        """Load the window in a background thread (again if an earlier try failed)"""
+        with self._lock:
+            if self.ready or self._loading:
+                return
+            self._loading = True
+
+        def load():
+            try:
+                self.refresh(storage, force=True)
+                self.ready = True
+            except Exception as e:
+                print(f"⚠️ Could not load the near-duplicate index: {e}")
+            finally:
+                self._loading = False
+
+        threading.Thread(target=load, name="near-duplicate-load", daemon=True).start()
+
+    def stats(self):
+        with self._lock:
+            return {"ready": self.ready, "jobs": len(self._entries), "buckets": len(self._buckets),
+                    "last_id": self._last_id}
+
+
+_index = None
+_index_pid = None
+_index_lock = threading.Lock()
+
+
+def get_near_duplicate_index():
+    """This worker's index (None if disabled), loading in the background on first use"""
+    global _index, _index_pid
+    if not NEAR_DUPLICATE_ENABLED:
+        return None
+    if _index is None or _index_pid != os.getpid():
+        with _index_lock:
+            if _index is None or _index_pid != os.getpid():
+                from job_store import DUPLICATE_WINDOW_DAYS
+                _index, _index_pid = SimilarityIndex(DUPLICATE_WINDOW_DAYS * 86400), os.getpid()
+    if not _index.ready:
+        from storage import get_storage
+        _index.start_loading(get_storage())
+    return _index
+
+
+def find_near_duplicate(data, signature, fingerprint, exclude=()):
+    """(job id, score) of a recent near duplicate of a job, other than the jobs
+    in exclude (the job itself, once inserted), or None (also while the index
+    is still loading)"""
+    index = get_near_duplicate_index()
+    if index is None or signature is None or not index.ready:
+        return None
+    from storage import get_storage
+    index.refresh(get_storage())
+    return index.find(signature, job_group(data.get('company_name'), data.get('location')),
+                      title_words(data.get('job_title')), fingerprint, exclude)
+
+
+def remember_job(job_id, data, signature, fingerprint):
+    """Add a job this worker just inserted to its index"""
+    index = get_near_duplicate_index()
+    if index is not None and signature is not None:
+        index.add(job_id, signature, job_group(data.get('company_name'), data.get('location')),
+                  title_words(data.get('job_title')), fingerprint, time.time())
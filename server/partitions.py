@@ -0,0 +1,234 @@
+# partitions.py - Month partitions of the jobs table and archival of old months
+#
+# On Postgres, jobs is range-partitioned by the UTC month of its timestamp
+# (schema.py migration 8). Every hot query - the daily quota, the 7-day
+# duplicate window, summary rebuilds and day exports - filters on a timestamp
+# range, so it only touches the one or two partitions it needs however much
+# history piles up. Partitions for this month and the next
+# PARTITION_MONTHS_AHEAD are created at startup and by the maintenance thread;
+# rows outside every partition (odd client timestamps) land in jobs_default and
+# move to their month's partition once there is one.
+#
+# With ARCHIVE_AFTER_DAYS set, months that ended at least that many days ago
+# are archived: each day is written to a gzipped JSON lines file in ARCHIVE_DIR
+# (every job's LOAD_COLUMNS plus its id and export domain, in export order) and
+# the month's rows are dropped - on Postgres the whole partition at once, so
+# there is nothing left to vacuum. The daily rollups are kept, so summaries
+# still cover archived days, and the admin download route builds ZIPs for them
+# from the archive. ARCHIVE_DIR must be persistent (and shared, with several
+# hosts). The SQLite backend has no partitions but archives the same way.
+#
+# On Postgres a month is detached from jobs before its days are written out,
+# and only dropped once they all are. Meanwhile - or for good, if the run
+# failed, until the next pass finishes it - its rows are in neither jobs nor an
+# archive: exports of its days raise ArchivePending rather than come back
+# partial, and prune_descriptions() keeps the descriptions its rows use. Run a
+# maintenance pass by hand with:
+#
+#     python partitions.py maintain
+
+import argparse
+import gzip
+import heapq
+import json
+import os
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from storage.base import EXPORT_COLUMNS, LOAD_COLUMNS
+
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", 2))
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 0))  # 0 keeps everything live
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive"))
+ARCHIVE_COMPRESS_LEVEL = 6
+PARTITION_MAINTENANCE_INTERVAL = float(os.getenv("PARTITION_MAINTENANCE_INTERVAL", 6 * 3600))  # seconds
+PARTITION_MAINTENANCE_DELAY = float(os.getenv("PARTITION_MAINTENANCE_DELAY", 300))           # after startup
+
+# Fields of an archived job; backends hand archive_month() rows in this order,
+# sorted by domain then id, with the description text resolved
+ARCHIVE_COLUMNS = ["id", "export_domain", *LOAD_COLUMNS]
+ARCHIVE_DESCRIPTION_FIELD = ARCHIVE_COLUMNS.index("job_description")
+ARCHIVE_NAME_RE = re.compile(r"^jobs_(\d{4}-\d{2}-\d{2})_(\d+)-(\d+)\.jsonl\.gz$")
+
+
+class ArchivePending(Exception):
+    """A day's month is detached for archiving but not archived yet"""
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+# ---- archive files ----------------------------------------------------------
+
+def archive_path(date_str, count, max_id):
+    # Named by (row count, max id) like the export cache, so a rewritten
+    # archive never reuses a cached ZIP of the old one
+    return os.path.join(ARCHIVE_DIR, f"jobs_{date_str}_{count}-{max_id}.jsonl.gz")
+
+
+def find_archive(date_str):
+    """(path, (row count, max id)) of a day's archive, None if it has none"""
+    try:
+        names = os.listdir(ARCHIVE_DIR)
+    except FileNotFoundError:
+        return None
+    for name in names:
+        match = ARCHIVE_NAME_RE.match(name)
+        if match and match.group(1) == date_str:
+            return os.path.join(ARCHIVE_DIR, name), (int(match.group(2)), int(match.group(3)))
+    return None
+
+
+def _read_records(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _write_records(path, records, ids=None):
+    """Write records as gzipped JSON lines and fsync them (the jobs are deleted
+    once archived); returns (count, max id)"""
+    count = max_id = 0
+    with open(path, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=ARCHIVE_COMPRESS_LEVEL) as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+                f.write(b"\n")
+                count += 1
+                max_id = max(max_id, record["id"])
+                if ids is not None:
+                    ids.add(record["id"])
+        raw.flush()
+        os.fsync(raw.fileno())
+    return count, max_id
+
+
+def _record(row):
+    record = dict(zip(ARCHIVE_COLUMNS, row))
+    if isinstance(record["timestamp"], datetime):
+        timestamp = record["timestamp"]
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        record["timestamp"] = timestamp.astimezone(timezone.utc).isoformat()
+    return record
+
+
+def write_archive(date_str, rows):
+    """Archive a day's rows (ARCHIVE_COLUMNS tuples sorted by domain then id)
+    and return how many there were. Merges with an existing archive of the day
+    - late arrivals, or a run that failed after writing - keeping one copy per id."""
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    existing = find_archive(date_str)
+    tmp_path = os.path.join(ARCHIVE_DIR, f"jobs_{date_str}.{os.getpid()}.{threading.get_ident()}.tmp")
+    new_path = f"{tmp_path}.new"
+    try:
+        ids = set()
+        written, _ = _write_records(new_path, (_record(row) for row in rows), ids)
+        if not written:
+            return 0
+        if existing:
+            older = (record for record in _read_records(existing[0]) if record["id"] not in ids)
+            merged = heapq.merge(_read_records(new_path), older, key=lambda record: (record["export_domain"], record["id"]))
+            count, max_id = _write_records(tmp_path, merged)
+        else:
+            os.replace(new_path, tmp_path)
+            count, max_id = written, max(ids)
+
+        path = archive_path(date_str, count, max_id)
+        os.replace(tmp_path, path)
+        dir_fd = os.open(ARCHIVE_DIR, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        if existing and existing[0] != path:
+            os.remove(existing[0])
+        return written
+    finally:
+        for leftover in (new_path, tmp_path):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+
+def stream_archived_export_rows(date_str, domain=None):
+    """(domain, *EXPORT_COLUMNS) rows of a day's archive (one export domain's if
+    given), sorted by domain"""
+    archive = find_archive(date_str)
+    if archive is None:
+        return
+    for record in _read_records(archive[0]):
+        if domain is None or record["export_domain"] == domain:
+            yield (record["export_domain"], *(record[column] for column in EXPORT_COLUMNS))
+
+
+# ---- maintenance ------------------------------------------------------------
+
+def maintain_partitions(archive_after_days=ARCHIVE_AFTER_DAYS):
+    """Create upcoming partitions and archive months past the retention window;
+    returns (partitions created, jobs archived)"""
+    from storage import get_storage
+
+    storage = get_storage()
+    created = storage.ensure_partitions(PARTITION_MONTHS_AHEAD)
+    for name in created:
+        print(f"✅ Created partition {name}")
+
+    archived = 0
+    if archive_after_days > 0:
+        cutoff = datetime.utcnow().date() - timedelta(days=archive_after_days)
+        for month in storage.archivable_months(cutoff):
+            count = storage.archive_month(month, write_archive)
+            print(f"📦 Archived {count} jobs from {month:%Y-%m}")
+            archived += count
+        if archived:
+            storage.prune_descriptions()
+    return created, archived
+
+
+def _maintenance_loop():
+    time.sleep(PARTITION_MAINTENANCE_DELAY)
+    while True:
+        try:
+            maintain_partitions()
+        except Exception as e:
+            print(f"⚠️ Partition maintenance failed: {e}")
+        time.sleep(PARTITION_MAINTENANCE_INTERVAL)
+
+
+_maintenance_thread = None
+_maintenance_pid = None
+
+
+def start_partition_maintenance():
+    """Run maintain_partitions() every PARTITION_MAINTENANCE_INTERVAL in this
+    process. Every step is idempotent and the backends serialize them, so each
+    worker can run its own."""
+    global _maintenance_thread, _maintenance_pid
+    if _maintenance_thread is not None and _maintenance_pid == os.getpid():
+        return False
+    _maintenance_thread = threading.Thread(target=_maintenance_loop, name="partition-maintenance", daemon=True)
+    _maintenance_pid = os.getpid()
+    _maintenance_thread.start()
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain job partitions and archives")
+    parser.add_argument("command", choices=["maintain"])
+    parser.add_argument("--archive-after-days", type=int, default=ARCHIVE_AFTER_DAYS,
+                        help="archive months that ended this many days ago (0 = don't archive)")
+    args = parser.parse_args()
+
+    created, archived = maintain_partitions(args.archive_after_days)
+    print(f"✅ {len(created)} partitions created, {archived} jobs archived")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# quota.py - Per-user daily job counters shared by the workers on this host
+#
+# Counters live in a small SQLite file keyed by (user_id, UTC day), so every
+# gunicorn worker sees the same numbers without asking Postgres. A missing or
+# expired counter is seeded from the jobs table on first use; the write paths
+# then keep it current (log_job stores the count its own transaction saw, batch
+# writers drop the counters they touched after committing).
+#
+# It's a cache: Postgres stays the source of truth for the limit, which
+# LOG_JOB_SQL still enforces under the per-user advisory lock. The counters
+# answer /api/user_job_count and turn away users who are already at the limit
+# before they cost a database round trip. QUOTA_TTL bounds how stale a counter
+# can get when several hosts write for the same user.
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+QUOTA_DB = os.getenv("QUOTA_DB", os.path.join(tempfile.gettempdir(), "job_logger_quota.sqlite3"))
+QUOTA_TTL = float(os.getenv("QUOTA_TTL", 300))  # seconds before a counter is re-read from Postgres
+QUOTA_PRUNE_INTERVAL = 600
+
+_local = threading.local()
+_last_prune = 0.0
+
+
+def _conn():
+    """This thread's SQLite connection (reopened after a fork)"""
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        conn = sqlite3.connect(QUOTA_DB, timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=OFF;")  # losing a counter just means reseeding it
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS quota_counters (
+                user_id TEXT NOT NULL,
+                day TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (user_id, day)
+            ) WITHOUT ROWID;
+        """)
+        _local.conn, _local.pid = conn, os.getpid()
+    return conn
+
+
+def _prune(conn, now):
+    global _last_prune
+    if now - _last_prune > QUOTA_PRUNE_INTERVAL:
+        _last_prune = now
+        conn.execute("DELETE FROM quota_counters WHERE updated_at < ?;", (now - QUOTA_TTL,))
+
+
+def get_cached_count(user_id, day):
+    """The counter for (user_id, day) if it's fresh, else None (never touches Postgres)"""
+    try:
+        row = _conn().execute(
+            "SELECT count FROM quota_counters WHERE user_id = ? AND day = ? AND updated_at >= ?;",
+            (user_id, str(day), time.time() - QUOTA_TTL)
+        ).fetchone()
+    except sqlite3.Error as e:
+        print(f"⚠️ Quota store unavailable: {e}")
+        return None
+    return row[0] if row else None
+
+
+def set_count(user_id, day, count):
+    """Store an authoritative count (e.g. the one a write transaction just saw)"""
+    now = time.time()
+    try:
+        conn = _conn()
+        # Never go backwards while fresh: a slower request may report an older count
+        conn.execute("""
+            INSERT INTO quota_counters (user_id, day, count, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (user_id, day) DO UPDATE SET
+                count = CASE WHEN updated_at < ? THEN excluded.count ELSE MAX(count, excluded.count) END,
+                updated_at = excluded.updated_at;
+        """, (user_id, str(day), count, now, now - QUOTA_TTL))
+        _prune(conn, now)
+    except sqlite3.Error as e:
+        print(f"⚠️ Quota store unavailable: {e}")
+
+
+def increment(user_id, day, n=1):
+    """Add to an existing counter; a missing one is left to be seeded"""
+    try:
+        _conn().execute(
+            "UPDATE quota_counters SET count = count + ? WHERE user_id = ? AND day = ?;",
+            (n, user_id, str(day))
+        )
+    except sqlite3.Error as e:
+        print(f"⚠️ Quota store unavailable: {e}")
+
+
+def forget(user_ids):
+    """Drop every counter for these users so the next read reseeds them"""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    try:
+        _conn().execute(
+            f"DELETE FROM quota_counters WHERE user_id IN ({','.join('?' * len(user_ids))});",
+            user_ids
+        )
+    except sqlite3.Error as e:
+        print(f"⚠️ Quota store unavailable: {e}")
+
+
+def get_count(user_id, day, seed):
+    """Counter for (user_id, day), calling seed() for the real count on a miss"""
+    count = get_cached_count(user_id, day)
+    if count is None:
+        count = seed()
+        set_count(user_id, day, count)
+    return count
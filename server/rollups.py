@@ -0,0 +1,260 @@
+# rollups.py - Per-day summary tables maintained alongside the jobs table
+#
+# daily_domain_counts holds the number of jobs per UTC day and domain, and
+# daily_active_users one row per (UTC day, user) that logged anything. Both are
+# updated in the same transaction as the insert into jobs, so /admin/summary
+# reads a handful of rows instead of scanning the day. Rebuild them from jobs
+# with:
+#
+#     python rollups.py backfill [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+
+import argparse
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+from db import utc_day_range
+
+# Must match how exports bucket jobs without a domain
+ROLLUP_DOMAIN_SQL = "COALESCE(NULLIF({domain}, ''), 'other')"
+ROLLUP_DAY_SQL = "({timestamp} AT TIME ZONE 'UTC')::date"
+
+
+def record_jobs(cur, job_ids):
+    """Add freshly inserted jobs to the rollups (call in the inserting transaction)"""
+    if not job_ids:
+        return
+    cur.execute(f"""
+        -- rollup_domains
+        INSERT INTO daily_domain_counts (day, domain, count)
+        SELECT {ROLLUP_DAY_SQL.format(timestamp='timestamp')} AS day,
+               {ROLLUP_DOMAIN_SQL.format(domain='domain')} AS domain,
+               COUNT(*)
+        FROM jobs
+        WHERE id = ANY(%s)
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+        ON CONFLICT (day, domain) DO UPDATE SET count = daily_domain_counts.count + EXCLUDED.count;
+    """, (list(job_ids),))
+    cur.execute(f"""
+        -- rollup_users
+        INSERT INTO daily_active_users (day, user_id)
+        SELECT DISTINCT {ROLLUP_DAY_SQL.format(timestamp='timestamp')}, user_id
+        FROM jobs
+        WHERE id = ANY(%s)
+        ORDER BY 1, 2
+        ON CONFLICT DO NOTHING;
+    """, (list(job_ids),))
+
+
+def backfill_rollups(cur, start_day=None, end_day=None):
+    """Recompute the rollups from jobs for [start_day, end_day] (all days if None)"""
+    if start_day is None:
+        # Archived days (partitions.py) have no jobs left to count; keep their rollups
+        cur.execute(f"SELECT {ROLLUP_DAY_SQL.format(timestamp='MIN(timestamp)')} AS day FROM jobs;")
+        start_day = cur.fetchone()['day']
+        if start_day is None:
+            return
+    conditions, params = [], []
+    day_conditions, day_params = [], []
+    if start_day:
+        conditions.append("timestamp >= %s")
+        params.append(utc_day_range(start_day)[0])
+        day_conditions.append("day >= %s")
+        day_params.append(start_day)
+    if end_day:
+        conditions.append("timestamp < %s")
+        params.append(utc_day_range(end_day)[1])
+        day_conditions.append("day <= %s")
+        day_params.append(end_day)
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    day_where = ("WHERE " + " AND ".join(day_conditions)) if day_conditions else ""
+
+    # Block concurrent rollup writers until this commits; their jobs rows are
+    # then either already visible below or counted by them afterwards
+    cur.execute("LOCK TABLE daily_domain_counts, daily_active_users IN SHARE ROW EXCLUSIVE MODE;")
+    cur.execute(f"DELETE FROM daily_domain_counts {day_where};", day_params)
+    cur.execute(f"DELETE FROM daily_active_users {day_where};", day_params)
+    cur.execute(f"""
+        INSERT INTO daily_domain_counts (day, domain, count)
+        SELECT {ROLLUP_DAY_SQL.format(timestamp='timestamp')}, {ROLLUP_DOMAIN_SQL.format(domain='domain')}, COUNT(*)
+        FROM jobs {where}
+        GROUP BY 1, 2;
+    """, params)
+    cur.execute(f"""
+        INSERT INTO daily_active_users (day, user_id)
+        SELECT DISTINCT {ROLLUP_DAY_SQL.format(timestamp='timestamp')}, user_id
+        FROM jobs {where};
+    """, params)
+
+
+# The summaries are written as generators that yield (sql, params) and are sent
+# back the rows as dicts, so the storage backends (with a cursor, through
+# run_queries) and the async server (asgi.py, through async_db.run_queries)
+# share one copy of the queries and the closed-day cache.
+
+def run_queries(cur, queries):
+    """Run a *_summary_queries() generator on a psycopg2-style cursor and return its result"""
+    rows = None
+    try:
+        while True:
+            sql, params = queries.send(rows)
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+    except StopIteration as done:
+        return done.value
+
+
+def day_summary_queries(day):
+    rows = yield """
+        -- day_summary_domains
+        SELECT domain, count FROM daily_domain_counts WHERE day = %s;
+    """, (day,)
+    breakdown = {row['domain']: row['count'] for row in rows}
+    rows = yield """
+        -- day_summary_users
+        SELECT COUNT(*) AS count FROM daily_active_users WHERE day = %s;
+    """, (day,)
+    users = rows[0]['count']
+    return sum(breakdown.values()), users, breakdown
+
+
+def get_day_summary(cur, day):
+    """(total_jobs, active_users, {domain: count}) for one UTC day"""
+    return run_queries(cur, day_summary_queries(day))
+
+
+# Completed UTC days barely change (only late client timestamps or a
+# reclassification touch them), so their summaries are kept in memory for a
+# while; today's is always read fresh.
+CLOSED_DAY_CACHE_TTL = float(os.getenv("CLOSED_DAY_CACHE_TTL", 3600))
+CLOSED_DAY_CACHE_SIZE = 2000
+MAX_RANGE_DAYS = 366
+
+_closed_days = OrderedDict()  # day -> (cached_at, summary dict)
+_closed_days_lock = threading.Lock()
+
+
+def _cached_closed_day(day, now):
+    with _closed_days_lock:
+        entry = _closed_days.get(day)
+        if entry and now - entry[0] < CLOSED_DAY_CACHE_TTL:
+            _closed_days.move_to_end(day)
+            return entry[1]
+    return None
+
+
+def _cache_closed_day(day, summary, now):
+    with _closed_days_lock:
+        _closed_days[day] = (now, summary)
+        _closed_days.move_to_end(day)
+        while len(_closed_days) > CLOSED_DAY_CACHE_SIZE:
+            _closed_days.popitem(last=False)
+
+
+def forget_closed_days(days):
+    """Drop cached summaries of days whose rollups were just changed (in this process)"""
+    with _closed_days_lock:
+        for day in days:
+            _closed_days.pop(day, None)
+
+
+def range_summary_queries(start_day, end_day):
+    today = datetime.utcnow().date()
+    now = time.monotonic()
+    days = [start_day + timedelta(days=i) for i in range((end_day - start_day).days + 1)]
+
+    summaries = {}
+    missing = []
+    for day in days:
+        cached = _cached_closed_day(day, now) if day < today else None
+        if cached is not None:
+            summaries[day] = cached
+        else:
+            missing.append(day)
+
+    if missing:
+        first, last = missing[0], missing[-1]
+        missing_days = set(missing)
+        for day in missing:
+            summaries[day] = {"date": day.isoformat(), "total_jobs": 0, "active_users": 0, "domain_breakdown": {}}
+
+        rows = yield """
+            -- range_summary_domains
+            SELECT day, domain, count FROM daily_domain_counts
+            WHERE day >= %s AND day <= %s;
+        """, (first, last)
+        for row in rows:
+            if row['day'] in missing_days:
+                summary = summaries[row['day']]
+                summary["domain_breakdown"][row['domain']] = row['count']
+                summary["total_jobs"] += row['count']
+
+        rows = yield """
+            -- range_summary_users
+            SELECT day, COUNT(*) AS users FROM daily_active_users
+            WHERE day >= %s AND day <= %s
+            GROUP BY day;
+        """, (first, last)
+        for row in rows:
+            if row['day'] in missing_days:
+                summaries[row['day']]["active_users"] = row['users']
+
+        for day in missing:
+            if day < today:
+                _cache_closed_day(day, summaries[day], now)
+
+    # Distinct users across the window can't be summed from the per-day counts
+    rows = yield """
+        -- range_summary_window_users
+        SELECT COUNT(DISTINCT user_id) AS users FROM daily_active_users
+        WHERE day >= %s AND day <= %s;
+    """, (start_day, end_day)
+    window_users = rows[0]['users']
+
+    breakdown = {}
+    for day in days:
+        for domain, count in summaries[day]["domain_breakdown"].items():
+            breakdown[domain] = breakdown.get(domain, 0) + count
+
+    return {
+        "days": [summaries[day] for day in days],
+        "totals": {
+            "total_jobs": sum(summaries[day]["total_jobs"] for day in days),
+            "active_users": window_users,
+            "domain_breakdown": breakdown,
+        },
+    }
+
+
+def get_range_summary(cur, start_day, end_day):
+    """Per-day totals, active users and domain breakdowns for [start_day, end_day]
+    plus totals over the whole window, from two range scans of the rollups."""
+    return run_queries(cur, range_summary_queries(start_day, end_day))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the daily summary rollups")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, help="first UTC day (inclusive)")
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, help="last UTC day (inclusive)")
+    args = parser.parse_args()
+
+    from storage import get_storage
+    storage = get_storage()
+
+    # Backfill one day per transaction so a long history doesn't hold locks for ages
+    if args.start and args.end:
+        day = args.start
+        while day <= args.end:
+            storage.backfill_rollups(day, day)
+            print(f"✅ Rebuilt rollups for {day}")
+            day += timedelta(days=1)
+    else:
+        storage.backfill_rollups(args.start, args.end)
+        print("✅ Rebuilt rollups")
+
+if __name__ == "__main__":
+    main()
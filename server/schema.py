@@ -0,0 +1,408 @@
+# schema.py - Versioned schema and index migrations for the jobs database
+#
+# Each migration runs once, in order, inside its own transaction and is
+# recorded in schema_migrations. run_migrations() is called at app startup
+# (set RUN_MIGRATIONS=0 to skip) and can also be run by hand:
+#
+#     python schema.py
+
+from datetime import datetime, time, timezone
+
+from psycopg2.extras import execute_values
+from db import db_connection
+from job_urls import job_fingerprint
+from descriptions import pack_description, unpack_description
+from job_store import DUPLICATE_WINDOW_DAYS
+from near_duplicates import job_signature, to_db
+from partitions import month_start, next_month
+from search import search_document, TSVECTOR_SQL
+from rollups import backfill_rollups
+
+# Session-level advisory lock so only one gunicorn worker migrates at a time
+SCHEMA_LOCK = (0, 1)
+# Transaction-level advisory lock around partition changes
+PARTITION_LOCK = (0, 2)
+# Partition DDL locks jobs (or its default partition) briefly; rather than
+# queue every request behind a long-running export, give up and retry later
+PARTITION_LOCK_TIMEOUT = "5s"
+
+def backfill_fingerprints(cur, batch_size=1000):
+    """Compute job_fingerprint() for rows logged before the column existed"""
+    last_id = 0
+    while True:
+        cur.execute("""
+            SELECT id, job_title, company_name, job_url FROM jobs
+            WHERE fingerprint IS NULL AND id > %s
+            ORDER BY id
+            LIMIT %s;
+        """, (last_id, batch_size))
+        rows = cur.fetchall()
+        if not rows:
+            return
+        execute_values(cur, """
+            UPDATE jobs SET fingerprint = v.fingerprint
+            FROM (VALUES %s) AS v(id, fingerprint)
+            WHERE jobs.id = v.id;
+        """, [
+            (row['id'], job_fingerprint(row['job_title'], row['company_name'], row['job_url']))
+            for row in rows
+        ], page_size=batch_size)
+        last_id = rows[-1]['id']
+
+
+def migrate_fingerprints(cur):
+    cur.execute("ALTER TABLE jobs ADD COLUMN IF NOT EXISTS fingerprint TEXT;")
+    backfill_fingerprints(cur)
+    cur.execute("""
+        -- Duplicate check is a point lookup on the fingerprint within the 7-day window
+        CREATE INDEX IF NOT EXISTS idx_jobs_fingerprint_timestamp ON jobs (fingerprint, timestamp);
+        DROP INDEX IF EXISTS idx_jobs_dedup;
+    """)
+
+
+def migrate_rollups(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS daily_domain_counts (
+            day DATE NOT NULL,
+            domain TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, domain)
+        );
+        CREATE TABLE IF NOT EXISTS daily_active_users (
+            day DATE NOT NULL,
+            user_id TEXT NOT NULL,
+            PRIMARY KEY (day, user_id)
+        );
+    """)
+    backfill_rollups(cur)
+
+
+def backfill_descriptions(cur, batch_size=1000):
+    """Move descriptions stored inline in jobs into job_descriptions"""
+    last_id = 0
+    while True:
+        cur.execute("""
+            SELECT id, job_description FROM jobs
+            WHERE description_hash IS NULL AND job_description IS NOT NULL AND id > %s
+            ORDER BY id
+            LIMIT %s;
+        """, (last_id, batch_size))
+        rows = cur.fetchall()
+        if not rows:
+            return
+        packed = {row['id']: pack_description(row['job_description']) for row in rows}
+        bodies = {description[0]: description for description in packed.values()}
+        execute_values(cur, """
+            INSERT INTO job_descriptions (hash, body, length) VALUES %s
+            ON CONFLICT (hash) DO NOTHING;
+        """, [bodies[key] for key in sorted(bodies)], page_size=batch_size)
+        execute_values(cur, """
+            UPDATE jobs SET description_hash = v.hash, job_description = NULL
+            FROM (VALUES %s) AS v(id, hash)
+            WHERE jobs.id = v.id;
+        """, [(job_id, description[0]) for job_id, description in packed.items()], page_size=batch_size)
+        last_id = rows[-1]['id']
+
+
+def migrate_descriptions(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS job_descriptions (
+            hash BYTEA PRIMARY KEY,
+            body BYTEA NOT NULL,
+            length INTEGER NOT NULL
+        );
+        -- Bodies are zlib-compressed already, so TOAST shouldn't try again
+        ALTER TABLE job_descriptions ALTER COLUMN body SET STORAGE EXTERNAL;
+        ALTER TABLE jobs ADD COLUMN IF NOT EXISTS description_hash BYTEA;
+    """)
+    # The old inline texts become dead tuples; VACUUM (FULL) jobs reclaims them
+    backfill_descriptions(cur)
+
+
+def backfill_minhashes(cur, window_days=DUPLICATE_WINDOW_DAYS, batch_size=1000):
+    """Near-duplicate signatures for the jobs still inside the duplicate window"""
+    last_id = 0
+    while True:
+        cur.execute("""
+            SELECT jobs.id, jobs.job_title, jobs.job_description, job_descriptions.body
+            FROM jobs
+            LEFT JOIN job_descriptions ON job_descriptions.hash = jobs.description_hash
+            WHERE jobs.minhash IS NULL AND jobs.timestamp >= NOW() - make_interval(days => %s) AND jobs.id > %s
+            ORDER BY jobs.id
+            LIMIT %s;
+        """, (window_days, last_id, batch_size))
+        rows = cur.fetchall()
+        if not rows:
+            return
+        signatures = []
+        for row in rows:
+            description = unpack_description(row['body']) if row['body'] is not None else row['job_description']
+            signature = job_signature({'job_title': row['job_title'], 'job_description': description})
+            if signature is not None:
+                signatures.append((row['id'], to_db(signature)))
+        if signatures:
+            execute_values(cur, """
+                UPDATE jobs SET minhash = v.minhash
+                FROM (VALUES %s) AS v(id, minhash)
+                WHERE jobs.id = v.id;
+            """, signatures, page_size=batch_size)
+        last_id = rows[-1]['id']
+
+
+def migrate_minhashes(cur):
+    cur.execute("ALTER TABLE jobs ADD COLUMN IF NOT EXISTS minhash BYTEA;")
+    backfill_minhashes(cur)
+
+
+def backfill_search_vectors(cur, batch_size=1000):
+    """Search vectors for rows logged before the column existed"""
+    last_id = 0
+    while True:
+        cur.execute("""
+            SELECT jobs.id, jobs.job_title, jobs.company_name, jobs.location, jobs.job_description, job_descriptions.body
+            FROM jobs
+            LEFT JOIN job_descriptions ON job_descriptions.hash = jobs.description_hash
+            WHERE jobs.search_vector IS NULL AND jobs.id > %s
+            ORDER BY jobs.id
+            LIMIT %s;
+        """, (last_id, batch_size))
+        rows = cur.fetchall()
+        if not rows:
+            return
+        execute_values(cur, f"""
+            UPDATE jobs SET search_vector = {TSVECTOR_SQL.format(document='v.document')}
+            FROM (VALUES %s) AS v(id, document)
+            WHERE jobs.id = v.id;
+        """, [
+            (row['id'], search_document({
+                **row, 'job_description': unpack_description(row['body']) if row['body'] is not None else row['job_description']
+            }))
+            for row in rows
+        ], page_size=batch_size)
+        last_id = rows[-1]['id']
+
+
+def migrate_search(cur):
+    cur.execute("ALTER TABLE jobs ADD COLUMN IF NOT EXISTS search_vector tsvector;")
+    backfill_search_vectors(cur)
+    cur.execute("""
+        -- /admin/search: full-text match on title, company, location and description
+        CREATE INDEX IF NOT EXISTS idx_jobs_search ON jobs USING GIN (search_vector);
+    """)
+
+
+def month_bounds(month):
+    """[start, end) UTC datetimes of the month a date falls in"""
+    month = month_start(month)
+    return (datetime.combine(month, time.min, tzinfo=timezone.utc),
+            datetime.combine(next_month(month), time.min, tzinfo=timezone.utc))
+
+
+def partition_name(month):
+    return f"jobs_p{month:%Y%m}"
+
+
+def month_of_partition(name):
+    """The month a jobs_pYYYYMM table holds, None for any other name"""
+    try:
+        return datetime.strptime(name[len("jobs_p"):], "%Y%m").date() if name.startswith("jobs_p") else None
+    except ValueError:
+        return None
+
+
+def list_month_partitions(cur):
+    """{month: attached?} for every jobs_pYYYYMM table - detached ones are
+    months being archived (see partitions.py)"""
+    cur.execute("""
+        -- list_partitions
+        SELECT c.relname AS name, EXISTS (
+            SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid AND i.inhparent = 'jobs'::regclass
+        ) AS attached
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relkind = 'r' AND c.relname LIKE 'jobs\\_p%' AND n.nspname = current_schema();
+    """)
+    partitions = {}
+    for row in cur.fetchall():
+        month = month_of_partition(row['name'])
+        if month:
+            partitions[month] = row['attached']
+    return partitions
+
+
+def create_month_partition(cur, month):
+    """Attach a partition for `month`, moving any of its rows out of the default
+    partition first. Returns False if it already exists."""
+    name = partition_name(month_start(month))
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL AS present", (name,))
+    if cur.fetchone()['present']:
+        return False
+    start, end = month_bounds(month)
+    # Nothing may reach the default partition's copy of this month meanwhile
+    cur.execute("LOCK TABLE jobs_default IN ACCESS EXCLUSIVE MODE;")
+    cur.execute(f"""
+        CREATE TABLE {name} (LIKE jobs INCLUDING DEFAULTS INCLUDING CONSTRAINTS);
+        WITH moved AS (
+            DELETE FROM jobs_default WHERE timestamp >= %(start)s AND timestamp < %(end)s RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved;
+        ALTER TABLE jobs ATTACH PARTITION {name} FOR VALUES FROM (%(start)s) TO (%(end)s);
+    """, {"start": start, "end": end})
+    return True
+
+
+def ensure_partitions(cur, months_ahead, month=None):
+    """Partitions for `month` (this UTC month by default) and the months_ahead
+    after it; returns the names of the ones created"""
+    cur.execute("SELECT pg_advisory_xact_lock(%s, %s)", PARTITION_LOCK)
+    cur.execute("SELECT set_config('lock_timeout', %s, true)", (PARTITION_LOCK_TIMEOUT,))
+    month = month_start(month or datetime.utcnow().date())
+    created = []
+    for _ in range(months_ahead + 1):
+        if create_month_partition(cur, month):
+            created.append(partition_name(month))
+        month = next_month(month)
+    return created
+
+
+def migrate_partitions(cur):
+    """Rebuild jobs as a table range-partitioned by UTC month of timestamp,
+    with a default partition for rows outside every month partition"""
+    cur.execute("""
+        ALTER TABLE jobs RENAME TO jobs_unpartitioned;
+        ALTER TABLE jobs_unpartitioned RENAME CONSTRAINT jobs_pkey TO jobs_unpartitioned_pkey;
+        ALTER SEQUENCE jobs_id_seq OWNED BY NONE;
+        CREATE TABLE jobs (
+            id INTEGER NOT NULL DEFAULT nextval('jobs_id_seq'),
+            user_id TEXT NOT NULL,
+            company_name TEXT,
+            job_title TEXT,
+            location TEXT,
+            job_description TEXT,
+            job_url TEXT,
+            domain TEXT,
+            timestamp TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            fingerprint TEXT,
+            description_hash BYTEA,
+            minhash BYTEA,
+            search_vector tsvector,
+            -- Unique keys of a partitioned table must include the partition key;
+            -- ids stay unique by coming from the sequence
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp);
+        ALTER SEQUENCE jobs_id_seq OWNED BY jobs.id;
+        CREATE TABLE jobs_default PARTITION OF jobs DEFAULT;
+    """)
+    cur.execute("""
+        SELECT DISTINCT date_trunc('month', timestamp AT TIME ZONE 'UTC')::date AS month FROM jobs_unpartitioned;
+    """)
+    for row in cur.fetchall():
+        create_month_partition(cur, row['month'])
+    columns = ("id, user_id, company_name, job_title, location, job_description, job_url, domain, timestamp, "
+               "fingerprint, description_hash, minhash, search_vector")
+    cur.execute(f"""
+        INSERT INTO jobs ({columns}) SELECT {columns} FROM jobs_unpartitioned;
+        DROP TABLE jobs_unpartitioned;
+        -- Created on the parent, so every partition (present and future) gets them
+        CREATE INDEX idx_jobs_user_timestamp ON jobs (user_id, timestamp);
+        CREATE INDEX idx_jobs_timestamp_domain ON jobs (timestamp, domain);
+        CREATE INDEX idx_jobs_fingerprint_timestamp ON jobs (fingerprint, timestamp);
+        CREATE INDEX idx_jobs_search ON jobs USING GIN (search_vector);
+        ANALYZE jobs;
+    """)
+
+
+MIGRATIONS = [
+    (1, "create jobs table", """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id SERIAL PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            company_name TEXT,
+            job_title TEXT,
+            location TEXT,
+            job_description TEXT,
+            job_url TEXT,
+            domain TEXT,
+            timestamp TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+    """),
+    (2, "indexes for daily quota, summaries, exports and dedup", """
+        -- log_job quota and /api/user_job_count: one user's rows for one UTC day
+        CREATE INDEX IF NOT EXISTS idx_jobs_user_timestamp ON jobs (user_id, timestamp);
+        -- /admin/summary and ZIP exports: every row of one UTC day, by domain
+        CREATE INDEX IF NOT EXISTS idx_jobs_timestamp_domain ON jobs (timestamp, domain);
+        -- 7-day duplicate check; hashed because URLs can exceed the btree row limit
+        CREATE INDEX IF NOT EXISTS idx_jobs_dedup ON jobs (md5(job_url), timestamp);
+    """),
+    (3, "fingerprint column for hash-keyed duplicate detection", migrate_fingerprints),
+    (4, "daily rollup tables for summaries", migrate_rollups),
+    (5, "content-addressed compressed job descriptions", migrate_descriptions),
+    (6, "MinHash signatures for near-duplicate detection", migrate_minhashes),
+    (7, "full-text search vectors", migrate_search),
+    (8, "partition jobs by month", migrate_partitions),
+    (9, "flag domains filled in by the classifier", """
+        -- Constant default: no table rewrite, partitions inherit the column
+        ALTER TABLE jobs ADD COLUMN IF NOT EXISTS domain_auto BOOLEAN NOT NULL DEFAULT FALSE;
+    """),
+]
+
+
+def get_schema_version(cur):
+    cur.execute("SELECT COALESCE(MAX(version), 0) AS version FROM schema_migrations")
+    return cur.fetchone()['version']
+
+
+def run_migrations(verbose=False):
+    """Apply any migrations newer than the recorded schema version"""
+    applied = []
+    with db_connection() as conn:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_lock(%s, %s)", SCHEMA_LOCK)
+        finally:
+            conn.autocommit = False
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS schema_migrations (
+                        version INTEGER PRIMARY KEY,
+                        description TEXT NOT NULL,
+                        applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                    );
+                """)
+                conn.commit()
+
+                current = get_schema_version(cur)
+                for version, description, step in MIGRATIONS:
+                    if version <= current:
+                        continue
+                    if callable(step):
+                        step(cur)
+                    else:
+                        cur.execute(step)
+                    cur.execute(
+                        "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                        (version, description)
+                    )
+                    conn.commit()
+                    applied.append(version)
+                    if verbose:
+                        print(f"✅ Applied migration {version}: {description}")
+        finally:
+            conn.rollback()
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_advisory_unlock(%s, %s)", SCHEMA_LOCK)
+            finally:
+                conn.autocommit = False
+
+    return applied
+
+
+if __name__ == "__main__":
+    applied = run_migrations(verbose=True)
+    if not applied:
+        print("📋 Schema is up to date")
@@ -0,0 +1,136 @@
+# search.py - Full-text search over logged jobs for the admin API
+#
+# Every job gets a search document - its title, company, location and
+# description - indexed when it's inserted (a tsvector column with a GIN index
+# on Postgres, a contentless FTS5 table on SQLite; descriptions are stored
+# compressed, so neither can index them from the jobs table). Results come
+# newest logged first and are paged by id: the cursor is the last id of a
+# page and the next page asks for ids below it, so deep pages cost the same
+# as the first instead of skipping over OFFSET rows.
+#
+# Queries use web search syntax on both backends: words must all match,
+# "quoted phrases" match in order, `or` between terms allows either and a
+# leading - excludes a term.
+
+import os
+import re
+from datetime import date, timezone
+
+from descriptions import unpack_description
+
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", 50))
+SEARCH_MAX_PAGE_SIZE = 200
+SEARCH_MAX_DOCUMENT_CHARS = 100_000  # description text indexed per job; tsvectors are capped at 1MB
+SEARCH_PREVIEW_CHARS = 300
+SEARCH_LANGUAGE = "english"  # Postgres text search configuration (SQLite stems with porter)
+TSVECTOR_SQL = f"to_tsvector('{SEARCH_LANGUAGE}', {{document}})"
+
+QUERY_TOKEN_RE = re.compile(r'(-?)"([^"]*)"?|(\S+)')
+WORD_RE = re.compile(r"\w+")
+
+
+def search_document(data):
+    """Text indexed for a job: title, company, location and description"""
+    parts = [data.get('job_title'), data.get('company_name'), data.get('location'),
+             str(data['job_description'])[:SEARCH_MAX_DOCUMENT_CHARS] if data.get('job_description') is not None else None]
+    return " ".join(str(part) for part in parts if part is not None)
+
+
+def fts5_query(text):
+    """Translate a web search style query into an FTS5 MATCH expression, None
+    if it has nothing to match on"""
+    groups, current = [], ([], [])
+    for match in QUERY_TOKEN_RE.finditer(text or ""):
+        quoted_negated, phrase, bare = match.groups()
+        if bare is not None and bare.lower() == "or":
+            groups.append(current)
+            current = ([], [])
+            continue
+        negated = bool(quoted_negated) if phrase is not None else bare.startswith("-")
+        words = WORD_RE.findall(phrase if phrase is not None else bare)
+        if words:
+            current[1 if negated else 0].append('"' + " ".join(words) + '"')
+    groups.append(current)
+
+    # FTS5's NOT needs a left operand, so a group of exclusions alone is dropped
+    expressions = [" ".join(positive) + "".join(f" NOT {term}" for term in negative)
+                   for positive, negative in groups if positive]
+    if not expressions:
+        return None
+    return " OR ".join(f"({expression})" for expression in expressions)
+
+
+def parse_search_args(args):
+    """Search filters from the request's query string; ValueError on bad input"""
+    try:
+        start_day = date.fromisoformat(args["from"]) if args.get("from") else None
+        end_day = date.fromisoformat(args["to"]) if args.get("to") else None
+    except ValueError:
+        raise ValueError("from and to must be YYYY-MM-DD dates")
+    if start_day and end_day and end_day < start_day:
+        raise ValueError("'to' must not be before 'from'")
+    try:
+        limit = int(args.get("limit", SEARCH_PAGE_SIZE))
+        before_id = int(args["cursor"]) if args.get("cursor") else None
+    except ValueError:
+        raise ValueError("limit and cursor must be integers")
+    if not 1 <= limit <= SEARCH_MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {SEARCH_MAX_PAGE_SIZE}")
+
+    return {
+        "query": (args.get("q") or "").strip() or None,
+        "domain": args.get("domain") or None,
+        "user_id": args.get("user_id") or None,
+        "start_day": start_day,
+        "end_day": end_day,
+        "before_id": before_id,
+        "limit": limit,
+    }
+
+
+def search_result(row, description):
+    """API form of a matching job row (a dict of its columns, timestamp as a
+    datetime) and its description text"""
+    timestamp = row['timestamp']
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    preview = description
+    if description is not None and len(description) > SEARCH_PREVIEW_CHARS:
+        preview = description[:SEARCH_PREVIEW_CHARS] + "…"
+    return {
+        "id": row['id'],
+        "user_id": row['user_id'],
+        "company_name": row['company_name'],
+        "job_title": row['job_title'],
+        "location": row['location'],
+        "job_url": row['job_url'],
+        "domain": row['domain'] or "other",
+        "timestamp": timestamp.astimezone(timezone.utc).isoformat(),
+        "description_preview": preview,
+    }
+
+
+def search_results(rows, fetch_bodies):
+    """search_result() for each row, looking the page's descriptions up at once
+    with fetch_bodies(hashes) -> {hash: compressed body}"""
+    hashes = sorted({bytes(row['description_hash']) for row in rows if row['description_hash'] is not None})
+    bodies = {bytes(key): body for key, body in fetch_bodies(hashes).items()} if hashes else {}
+    results = []
+    for row in rows:
+        description = row['job_description']
+        if row['description_hash'] is not None and bytes(row['description_hash']) in bodies:
+            description = unpack_description(bodies[bytes(row['description_hash'])])
+        results.append(search_result(row, description))
+    return results
+
+
+def search_page(results, limit):
+    """Response body for up to limit + 1 results (the extra one only tells
+    whether there is another page)"""
+    page = results[:limit]
+    return {
+        "status": "success",
+        "results": page,
+        "count": len(page),
+        "next_cursor": str(page[-1]["id"]) if len(results) > limit else None,
+    }
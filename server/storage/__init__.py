@@ -0,0 +1,54 @@
+# storage - Pluggable persistence for jobs, rollups and exports
+#
+# STORAGE_BACKEND=postgres (the default) uses NEON_DB_URL through db.py's pool.
+# STORAGE_BACKEND=sqlite keeps everything in one local WAL-mode file at
+# SQLITE_PATH - no network round trips, for single-node installs, tests and
+# benchmarks. Both implement the Storage interface in storage/base.py.
+#
+# The async server (asgi.py) awaits the few operations in storage/aio.py
+# instead: natively over asyncpg on Postgres, in threads on SQLite.
+
+import os
+import threading
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "postgres").lower()
+STORAGE_BACKENDS = ("postgres", "sqlite")
+
+_storage = None
+_storage_lock = threading.Lock()
+_async_storage = None
+_async_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """The configured backend (created on first use; safe to share across forks)"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if STORAGE_BACKEND == "postgres":
+                    from .postgres import PostgresStorage
+                    _storage = PostgresStorage()
+                elif STORAGE_BACKEND == "sqlite":
+                    from .sqlite import SQLiteStorage
+                    _storage = SQLiteStorage()
+                else:
+                    raise ValueError(
+                        f"Unknown STORAGE_BACKEND '{STORAGE_BACKEND}' (use one of: {', '.join(STORAGE_BACKENDS)})"
+                    )
+    return _storage
+
+
+def get_async_storage():
+    """The configured backend's AsyncStorage (for the async server)"""
+    global _async_storage
+    if _async_storage is None:
+        with _async_storage_lock:
+            if _async_storage is None:
+                if STORAGE_BACKEND == "postgres":
+                    from .async_postgres import AsyncPostgresStorage
+                    _async_storage = AsyncPostgresStorage()
+                else:
+                    from .aio import ThreadedStorage
+                    _async_storage = ThreadedStorage(get_storage())
+    return _async_storage
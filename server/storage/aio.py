@@ -0,0 +1,55 @@
+# storage/aio.py - The operations the async server (asgi.py) awaits
+#
+# Only what its native routes need: logging a job, a user's daily count and
+# the admin summaries, with the same arguments and results as the Storage
+# methods of the same names. Postgres has a native asyncpg implementation
+# (storage/async_postgres.py); any other backend runs its Storage methods in
+# worker threads, which for the embedded SQLite file costs next to nothing.
+
+import asyncio
+
+
+class AsyncStorage:
+    name = None
+
+    async def open(self):
+        """Open this process's connections (the server does on startup)"""
+
+    async def close(self):
+        """Close them again (on shutdown)"""
+
+    async def log_job(self, data, fingerprint, today, minhash=None):
+        """Storage.log_job()"""
+        raise NotImplementedError
+
+    async def count_user_jobs(self, user_id, day):
+        """Storage.count_user_jobs()"""
+        raise NotImplementedError
+
+    async def day_summary(self, day):
+        """Storage.day_summary()"""
+        raise NotImplementedError
+
+    async def range_summary(self, start_day, end_day):
+        """Storage.range_summary()"""
+        raise NotImplementedError
+
+
+class ThreadedStorage(AsyncStorage):
+    """A Storage whose calls run in asyncio's default thread pool"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.name = storage.name
+
+    async def log_job(self, data, fingerprint, today, minhash=None):
+        return await asyncio.to_thread(self.storage.log_job, data, fingerprint, today, minhash)
+
+    async def count_user_jobs(self, user_id, day):
+        return await asyncio.to_thread(self.storage.count_user_jobs, user_id, day)
+
+    async def day_summary(self, day):
+        return await asyncio.to_thread(self.storage.day_summary, day)
+
+    async def range_summary(self, start_day, end_day):
+        return await asyncio.to_thread(self.storage.range_summary, start_day, end_day)
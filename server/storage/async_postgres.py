@@ -0,0 +1,70 @@
+# storage/async_postgres.py - Postgres backend for the async server, over asyncpg
+#
+# Runs the same SQL as storage/postgres.py through async_db.py's pool. One
+# difference: asyncpg can't send several statements with parameters in one
+# query, so log_job takes its advisory locks in one statement (user, dedup key,
+# then the shared descriptions lock, evaluated left to right) and runs the
+# insert in a second one, inside an explicit transaction - the insert still
+# gets a snapshot taken after the locks.
+
+from async_db import db_connection, fetch, open_pool, close_pool, run_queries
+from db import utc_day_range
+from rollups import day_summary_queries, range_summary_queries
+from .aio import AsyncStorage
+from .postgres import DESCRIPTIONS_LOCK, LOG_JOB_INSERT_SQL, USER_JOB_COUNT_SQL, log_job_params
+
+LOG_JOB_LOCKS_SQL = f"""
+-- log_job_locks
+SELECT pg_advisory_xact_lock(%(lock_ns_user)s, hashtext(%(user_id)s)),
+       pg_advisory_xact_lock(%(lock_ns_dedup)s, hashtext(%(fingerprint)s)),
+       pg_advisory_xact_lock_shared({DESCRIPTIONS_LOCK[0]}, {DESCRIPTIONS_LOCK[1]});
+"""
+LOG_JOB_ASYNC_SQL = "\n-- log_job_insert" + LOG_JOB_INSERT_SQL
+
+# Payload fields that go into text columns unchecked by validate_job(). asyncpg
+# only binds str to text parameters, where psycopg2 let Postgres cast numbers.
+TEXT_FIELDS = ("location", "domain")
+
+
+def as_text(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return value  # asyncpg rejects it, as Postgres would have
+
+
+class AsyncPostgresStorage(AsyncStorage):
+    name = "postgres"
+
+    async def open(self):
+        await open_pool()
+
+    async def close(self):
+        await close_pool()
+
+    async def log_job(self, data, fingerprint, today, minhash=None):
+        params = log_job_params(data, fingerprint, today, minhash)
+        for field in TEXT_FIELDS:
+            params[field] = as_text(params[field])
+        async with db_connection() as conn:
+            async with conn.transaction():
+                await fetch(conn, LOG_JOB_LOCKS_SQL, params)
+                rows = await fetch(conn, LOG_JOB_ASYNC_SQL, params)
+        return dict(rows[0])
+
+    async def count_user_jobs(self, user_id, day):
+        day_start, day_end = utc_day_range(day)
+        async with db_connection() as conn:
+            rows = await fetch(conn, USER_JOB_COUNT_SQL, (user_id, day_start, day_end))
+        return rows[0]['count']
+
+    async def day_summary(self, day):
+        async with db_connection() as conn:
+            return await run_queries(conn, day_summary_queries(day))
+
+    async def range_summary(self, start_day, end_day):
+        async with db_connection() as conn:
+            return await run_queries(conn, range_summary_queries(start_day, end_day))
@@ -0,0 +1,127 @@
+# storage/base.py - The operations every storage backend provides
+#
+# Days are datetime.date objects in UTC. Rows from log_job() and the summaries
+# are plain dicts; export rows are (domain, *EXPORT_COLUMNS) tuples sorted by
+# domain.
+
+import os
+
+
+class Storage:
+    name = None
+
+    def migrate(self):
+        """Create / upgrade the schema (idempotent, safe to run from every worker)"""
+        raise NotImplementedError
+
+    def log_job(self, data, fingerprint, today, minhash=None):
+        """Atomically check the daily limit and duplicate window and insert the
+        job if both pass. Returns {current_count, duplicate_id, job_id, job_day}
+        where current_count is the user's count for `today` before the insert."""
+        raise NotImplementedError
+
+    def log_jobs(self, jobs, minhashes=None):
+        """Batch version of log_job in one transaction; one result dict per job"""
+        raise NotImplementedError
+
+    def is_transient_error(self, error):
+        """Whether a failed write is worth retrying as it is (the database was
+        unreachable or busy) rather than failing because of what was written"""
+        return isinstance(error, OSError)
+
+    def recent_signatures(self, since, after_id=0):
+        """(id, minhash, fingerprint, job_title, company_name, location, logged at
+        epoch) of jobs with a signature logged since `since` (epoch seconds), by id"""
+        raise NotImplementedError
+
+    def count_user_jobs(self, user_id, day):
+        """Number of jobs a user logged on a UTC day"""
+        raise NotImplementedError
+
+    def day_summary(self, day):
+        """(total_jobs, active_users, {domain: count}) for one UTC day"""
+        raise NotImplementedError
+
+    def range_summary(self, start_day, end_day):
+        """rollups.get_range_summary() result for [start_day, end_day]"""
+        raise NotImplementedError
+
+    def search_jobs(self, query=None, domain=None, user_id=None, start_day=None, end_day=None, before_id=None,
+                    limit=50):
+        """Up to `limit` search.search_result() dicts of jobs matching a web
+        search style query and the filters, newest id first, ids below
+        before_id only (the keyset cursor)"""
+        raise NotImplementedError
+
+    def first_job_day(self):
+        """UTC day of the oldest job still stored, None if there are none"""
+        raise NotImplementedError
+
+    def classification_rows(self, day, scope="unclassified"):
+        """Yield classifier.CLASSIFY_COLUMNS rows of a UTC day's jobs in one of
+        classifier.CLASSIFY_SCOPES, by id, description resolved, streamed"""
+        raise NotImplementedError
+
+    def reclassify_jobs(self, changes, day=None):
+        """Apply (id, old domain, new domain) changes to jobs still holding the
+        old domain, mark them domain_auto and move them between their days'
+        rollup counts, in one transaction. `day`, if given, is the UTC day every
+        job is on. Returns {day: jobs changed}."""
+        raise NotImplementedError
+
+    def export_watermark(self, date_str):
+        """(row count, max id) of a UTC date - changes whenever the day's data does"""
+        raise NotImplementedError
+
+    def stream_export_rows(self, date_str, domain=None):
+        """Yield (domain, *EXPORT_COLUMNS) for a UTC date (only one export domain's
+        if given), sorted by domain then id, without holding the whole day in memory"""
+        raise NotImplementedError
+
+    def prune_descriptions(self):
+        """Delete stored descriptions no job refers to; returns how many went"""
+        raise NotImplementedError
+
+    def ensure_partitions(self, months_ahead):
+        """Create the partitions for this UTC month and the next months_ahead,
+        if the backend partitions jobs; returns the names of the new ones"""
+        return []
+
+    def archivable_months(self, before):
+        """First days of the months that end on or before `before` and still
+        hold jobs (partitions.py archives them)"""
+        raise NotImplementedError
+
+    def archive_month(self, month, write_day):
+        """Hand each day of a month to write_day(date_str, rows) as
+        partitions.ARCHIVE_COLUMNS rows sorted by domain then id, then delete
+        the month's jobs (not its rollups). Returns the number of jobs archived."""
+        raise NotImplementedError
+
+    def backfill_rollups(self, start_day=None, end_day=None):
+        """Recompute the daily rollups from jobs (all days if None)"""
+        raise NotImplementedError
+
+    def load_day(self, day, rows):
+        """Replace every job on a UTC day with `rows` (tuples in LOAD_COLUMNS order)
+        and rebuild that day's rollups - for bulk imports and benchmarks"""
+        raise NotImplementedError
+
+    def warm(self):
+        """Open this process's connections ahead of its first request"""
+
+    def close(self):
+        """Close this process's connections (before forking workers from it)"""
+
+    def stats(self):
+        """Backend details for /api/health"""
+        return {"backend": self.name}
+
+
+# Columns written to each domain's export file, in order
+EXPORT_COLUMNS = ['company_name', 'job_title', 'location', 'job_description', 'job_url']
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", 2000))  # rows fetched per round trip while exporting
+
+# Column order of the rows load_day() takes
+LOAD_COLUMNS = ["user_id", "company_name", "job_title", "location", "job_description",
+                "job_url", "domain", "timestamp", "fingerprint"]
@@ -0,0 +1,583 @@
+# storage/postgres.py - Postgres (Neon) backend over db.py's connection pool
+
+import csv
+import io
+from datetime import datetime, timedelta
+from itertools import islice
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from classifier import CLASSIFY_SCOPES, CLASSIFY_DESCRIPTION_FIELD
+from db import db_connection, db_cursor, get_pool, get_pool_stats, close_pool, utc_day_range, PoolTimeout
+from descriptions import pack_description, resolve_descriptions
+from job_store import DAILY_LIMIT, DUPLICATE_WINDOW_DAYS, REQUIRED_FIELDS, validate_batch, plan_batch, finish_batch, dedup_key
+from partitions import PARTITION_MONTHS_AHEAD, ARCHIVE_DESCRIPTION_FIELD, ArchivePending, next_month
+from rollups import record_jobs, backfill_rollups, get_day_summary, get_range_summary, ROLLUP_DOMAIN_SQL, ROLLUP_DAY_SQL
+from search import search_document, search_results, TSVECTOR_SQL, SEARCH_LANGUAGE, SEARCH_PAGE_SIZE
+from .base import Storage, EXPORT_COLUMNS, EXPORT_FETCH_SIZE, LOAD_COLUMNS
+
+# Advisory lock namespaces. Writers take the user lock(s) first and the dedup
+# key lock(s) second, each in hash order, so concurrent writers can't deadlock.
+LOCK_NS_USER = 1
+LOCK_NS_DEDUP = 2
+# Session-level advisory lock held while archiving a month, from detaching its
+# partition to dropping it: one archiver at a time, and no description prune
+ARCHIVE_LOCK = (0, 3)
+# Held shared by every transaction that stores descriptions and exclusively by
+# prune_descriptions(): reusing a stored description (ON CONFLICT DO NOTHING)
+# locks no row, so nothing else stops a prune from deleting it under a new job
+DESCRIPTIONS_LOCK = (0, 4)
+
+# Quota check, duplicate check, insert (with its search vector), description
+# and rollup update in a single round trip. Sent as one multi-statement query on an autocommit connection, so it
+# runs as one implicit transaction: the advisory locks serialize writers for
+# the same user / job until it commits, and the last statement gets a fresh
+# snapshot that sees whatever the previous lock holder committed. The async
+# server (storage/async_postgres.py) sends the locks and the insert separately,
+# which is why the client's timestamp is explicitly cast from text.
+LOG_JOB_LOCKS_SQL = f"""
+SELECT pg_advisory_xact_lock(%(lock_ns_user)s, hashtext(%(user_id)s));
+SELECT pg_advisory_xact_lock(%(lock_ns_dedup)s, hashtext(%(fingerprint)s));
+SELECT pg_advisory_xact_lock_shared({DESCRIPTIONS_LOCK[0]}, {DESCRIPTIONS_LOCK[1]});
+"""
+LOG_JOB_INSERT_SQL = f"""
+WITH day_count AS (
+    SELECT COUNT(*) AS n FROM jobs
+    WHERE user_id = %(user_id)s AND timestamp >= %(day_start)s AND timestamp < %(day_end)s
+), dup AS (
+    SELECT id FROM jobs
+    WHERE fingerprint = %(fingerprint)s AND timestamp >= NOW() - make_interval(days => %(dup_days)s)
+    LIMIT 1
+), ins AS (
+    INSERT INTO jobs (user_id, company_name, job_title, location, description_hash, job_url, domain, timestamp,
+                      fingerprint, minhash, search_vector)
+    SELECT %(user_id)s, %(company_name)s, %(job_title)s, %(location)s, %(description_hash)s,
+           %(job_url)s, %(domain)s, %(timestamp)s::text::timestamptz, %(fingerprint)s, %(minhash)s,
+           {TSVECTOR_SQL.format(document='%(search_document)s')}
+    WHERE (SELECT n FROM day_count) < %(daily_limit)s
+      AND NOT EXISTS (SELECT 1 FROM dup)
+    RETURNING id, timestamp, domain, user_id
+), description AS (
+    INSERT INTO job_descriptions (hash, body, length)
+    SELECT %(description_hash)s, %(description_body)s, %(description_length)s
+    WHERE %(description_hash)s IS NOT NULL AND EXISTS (SELECT 1 FROM ins)
+    ON CONFLICT (hash) DO NOTHING
+), rollup_domain AS (
+    INSERT INTO daily_domain_counts (day, domain, count)
+    SELECT (timestamp AT TIME ZONE 'UTC')::date, COALESCE(NULLIF(domain, ''), 'other'), 1 FROM ins
+    ON CONFLICT (day, domain) DO UPDATE SET count = daily_domain_counts.count + 1
+), rollup_user AS (
+    INSERT INTO daily_active_users (day, user_id)
+    SELECT (timestamp AT TIME ZONE 'UTC')::date, user_id FROM ins
+    ON CONFLICT DO NOTHING
+)
+SELECT (SELECT n FROM day_count) AS current_count,
+       (SELECT id FROM dup) AS duplicate_id,
+       (SELECT id FROM ins) AS job_id,
+       (SELECT (timestamp AT TIME ZONE 'UTC')::date FROM ins) AS job_day;
+"""
+LOG_JOB_SQL = "\n-- log_job" + LOG_JOB_LOCKS_SQL + LOG_JOB_INSERT_SQL
+
+USER_JOB_COUNT_SQL = """
+    -- user_job_count
+    SELECT COUNT(*) FROM jobs
+    WHERE user_id = %s AND timestamp >= %s AND timestamp < %s;
+"""
+
+# Conditional domain update plus the matching rollup moves in one statement.
+# Each (day, domain) gets its net change once, in key order, so concurrent
+# inserts into the same rollup rows can't deadlock with it.
+RECLASSIFY_JOBS_SQL = f"""
+-- reclassify_jobs
+WITH changes (id, old_domain, new_domain) AS (
+    VALUES %s
+), updated AS (
+    UPDATE jobs SET domain = changes.new_domain, domain_auto = TRUE
+    FROM changes
+    WHERE jobs.id = changes.id AND jobs.domain IS NOT DISTINCT FROM changes.old_domain {{day_condition}}
+    RETURNING {ROLLUP_DAY_SQL.format(timestamp='jobs.timestamp')} AS day, changes.old_domain, changes.new_domain
+), moves AS (
+    SELECT day, {ROLLUP_DOMAIN_SQL.format(domain='old_domain')} AS domain, -1 AS delta FROM updated
+    UNION ALL
+    SELECT day, {ROLLUP_DOMAIN_SQL.format(domain='new_domain')}, 1 FROM updated
+), rollup_domain AS (
+    INSERT INTO daily_domain_counts (day, domain, count)
+    SELECT day, domain, SUM(delta) FROM moves
+    GROUP BY 1, 2
+    HAVING SUM(delta) <> 0
+    ORDER BY 1, 2
+    ON CONFLICT (day, domain) DO UPDATE SET count = daily_domain_counts.count + EXCLUDED.count
+)
+SELECT day, COUNT(*) AS count FROM updated GROUP BY day;
+"""
+
+
+def log_job_params(data, fingerprint, today, minhash=None):
+    """Parameters of LOG_JOB_SQL for one job"""
+    day_start, day_end = utc_day_range(today)
+    params = {
+        "lock_ns_user": LOCK_NS_USER,
+        "lock_ns_dedup": LOCK_NS_DEDUP,
+        "fingerprint": fingerprint,
+        "day_start": day_start,
+        "day_end": day_end,
+        "daily_limit": DAILY_LIMIT,
+        "dup_days": DUPLICATE_WINDOW_DAYS,
+        "minhash": minhash,
+    }
+    params.update({field: data[field] for field in REQUIRED_FIELDS})
+    params["search_document"] = search_document(data)
+    description = pack_description(data['job_description'])
+    params["description_hash"], params["description_body"], params["description_length"] = description or (None, None, None)
+    return params
+
+
+def lock_for_writes(cur, user_ids, fingerprints):
+    """Take the same advisory locks as LOG_JOB_SQL for a whole batch"""
+    cur.execute("""
+        -- batch_lock_users
+        SELECT pg_advisory_xact_lock(%s, h)
+        FROM (SELECT DISTINCT hashtext(u) AS h FROM unnest(%s::text[]) AS u) AS users
+        ORDER BY h;
+    """, (LOCK_NS_USER, list(user_ids)))
+    cur.execute("""
+        -- batch_lock_dedup
+        SELECT pg_advisory_xact_lock(%s, h)
+        FROM (SELECT DISTINCT hashtext(k) AS h FROM unnest(%s::text[]) AS k) AS dedup_keys
+        ORDER BY h;
+    """, (LOCK_NS_DEDUP, list(fingerprints)))
+
+
+def store_descriptions(cur, descriptions):
+    """Insert packed descriptions that aren't stored yet (in hash order, so
+    concurrent writers of the same texts can't deadlock)"""
+    unique = {description[0]: description for description in descriptions if description}
+    if unique:
+        cur.execute("SELECT pg_advisory_xact_lock_shared(%s, %s)", DESCRIPTIONS_LOCK)
+        execute_values(cur, """
+            -- store_descriptions
+            INSERT INTO job_descriptions (hash, body, length) VALUES %s
+            ON CONFLICT (hash) DO NOTHING;
+        """, [unique[key] for key in sorted(unique)], page_size=len(unique))
+
+
+def fetch_descriptions(cur, hashes):
+    """{hash: compressed body} for the given description hashes"""
+    cur.execute("""
+        -- fetch_descriptions
+        SELECT hash, body FROM job_descriptions WHERE hash = ANY(%s);
+    """, ([psycopg2.Binary(key) for key in hashes],))
+    return {bytes(row['hash']): row['body'] for row in cur.fetchall()}
+
+
+def log_jobs_batch(cur, jobs, today, minhashes=None):
+    """job_store.log_jobs inside the caller's transaction"""
+    results, valid = validate_batch(jobs)
+    if not valid:
+        return results
+
+    fingerprints = {index: dedup_key(data) for index, data in valid}
+    user_ids = sorted({data['user_id'] for _, data in valid})
+    keys = sorted(set(fingerprints.values()))
+    lock_for_writes(cur, user_ids, keys)
+
+    # 1️⃣ Today's counts for every user in the batch, in one query
+    day_start, day_end = utc_day_range(today)
+    cur.execute("""
+        -- batch_day_counts
+        SELECT user_id, COUNT(*) AS count FROM jobs
+        WHERE user_id = ANY(%s) AND timestamp >= %s AND timestamp < %s
+        GROUP BY user_id;
+    """, (user_ids, day_start, day_end))
+    counts = {row['user_id']: row['count'] for row in cur.fetchall()}
+
+    # 2️⃣ Existing duplicates within the window, in one query
+    cur.execute("""
+        -- batch_dedup
+        SELECT DISTINCT ON (fingerprint) fingerprint, id
+        FROM jobs
+        WHERE fingerprint = ANY(%s) AND timestamp >= NOW() - make_interval(days => %s)
+        ORDER BY fingerprint, id;
+    """, (keys, DUPLICATE_WINDOW_DAYS))
+    existing = {row['fingerprint']: row['id'] for row in cur.fetchall()}
+
+    # 3️⃣ Limit and duplicate rules, then one multi-row insert for everything accepted
+    to_insert = plan_batch(results, valid, fingerprints, counts, existing)
+    job_ids = []
+    if to_insert:
+        descriptions = [pack_description(data['job_description']) for _, data, _ in to_insert]
+        store_descriptions(cur, descriptions)
+        rows = execute_values(cur, """
+            -- batch_insert
+            INSERT INTO jobs (user_id, company_name, job_title, location, description_hash, job_url, domain, timestamp,
+                              fingerprint, minhash, search_vector)
+            VALUES %s
+            RETURNING id;
+        """, [
+            (data['user_id'], data['company_name'], data['job_title'], data['location'],
+             description[0] if description else None, data['job_url'], data['domain'], data['timestamp'], key,
+             minhashes[index] if minhashes else None, search_document(data))
+            for (index, data, key), description in zip(to_insert, descriptions)
+        ], template=f"(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, {TSVECTOR_SQL.format(document='%s')})",
+           page_size=len(to_insert), fetch=True)
+        job_ids = [row['id'] for row in rows]
+        record_jobs(cur, job_ids)
+
+    return finish_batch(results, to_insert, job_ids)
+
+
+def check_not_archiving(cur, date_str):
+    """Raise ArchivePending if the day's month partition is detached for
+    archiving. Run after the caller's query on jobs in the same transaction:
+    the lock that query holds keeps the partition from being detached later."""
+    from schema import partition_name
+    cur.execute("""
+        -- month_detached
+        SELECT to_regclass(%(name)s) IS NOT NULL AND NOT EXISTS (
+            SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(%(name)s) AND inhparent = 'jobs'::regclass
+        ) AS detached;
+    """, {"name": partition_name(utc_day_range(date_str)[0])})
+    if cur.fetchone()['detached']:
+        raise ArchivePending(f"{date_str} is being archived; try again once its archive is written")
+
+
+class PostgresStorage(Storage):
+    name = "postgres"
+
+    def migrate(self):
+        from schema import run_migrations
+        run_migrations()
+        self.ensure_partitions(PARTITION_MONTHS_AHEAD)
+
+    def log_job(self, data, fingerprint, today, minhash=None):
+        params = log_job_params(data, fingerprint, today, minhash)
+        with db_connection() as conn:
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(LOG_JOB_SQL, params)
+                    return dict(cur.fetchone())
+            finally:
+                conn.autocommit = False
+
+    def log_jobs(self, jobs, minhashes=None):
+        with db_cursor(commit=True) as cur:
+            return log_jobs_batch(cur, jobs, datetime.utcnow().date(), minhashes)
+
+    def is_transient_error(self, error):
+        # Connection drops, timeouts, serialization failures; not bad data (DataError, IntegrityError)
+        return isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError, PoolTimeout, OSError))
+
+    def recent_signatures(self, since, after_id=0):
+        with db_cursor() as cur:
+            cur.execute("""
+                -- recent_signatures
+                SELECT id, minhash, fingerprint, job_title, company_name, location,
+                       EXTRACT(EPOCH FROM timestamp)::float8 AS logged_at
+                FROM jobs
+                WHERE id > %s AND timestamp >= to_timestamp(%s) AND minhash IS NOT NULL
+                ORDER BY id;
+            """, (after_id, since))
+            return [(row['id'], row['minhash'], row['fingerprint'], row['job_title'], row['company_name'],
+                     row['location'], row['logged_at']) for row in cur.fetchall()]
+
+    def count_user_jobs(self, user_id, day):
+        day_start, day_end = utc_day_range(day)
+        with db_cursor() as cur:
+            cur.execute(USER_JOB_COUNT_SQL, (user_id, day_start, day_end))
+            return cur.fetchone()['count']
+
+    def day_summary(self, day):
+        with db_cursor() as cur:
+            return get_day_summary(cur, day)
+
+    def range_summary(self, start_day, end_day):
+        with db_cursor() as cur:
+            return get_range_summary(cur, start_day, end_day)
+
+    def first_job_day(self):
+        with db_cursor() as cur:
+            cur.execute(f"""
+                -- first_job_day
+                SELECT {ROLLUP_DAY_SQL.format(timestamp='MIN(timestamp)')} AS day FROM jobs;
+            """)
+            return cur.fetchone()['day']
+
+    def classification_rows(self, day, scope="unclassified", fetch_size=EXPORT_FETCH_SIZE):
+        day_start, day_end = utc_day_range(day)
+        with db_connection() as conn:
+            with conn.cursor(name=f"classify_{day:%Y%m%d}", cursor_factory=psycopg2.extensions.cursor) as cur, \
+                    conn.cursor() as lookup:
+                cur.itersize = fetch_size
+                cur.execute(f"""
+                SELECT id, domain, domain_auto, job_title, job_description, description_hash
+                FROM jobs
+                WHERE timestamp >= %s AND timestamp < %s AND {CLASSIFY_SCOPES[scope]}
+                ORDER BY id;
+                """, (day_start, day_end))
+                yield from resolve_descriptions(cur, lambda hashes: fetch_descriptions(lookup, hashes), fetch_size,
+                                                field=CLASSIFY_DESCRIPTION_FIELD)
+
+    def reclassify_jobs(self, changes, day=None):
+        with db_cursor(commit=True) as cur:
+            # Bounds on the partition key let the update skip every other month
+            day_condition = ""
+            if day is not None:
+                day_condition = cur.mogrify("AND jobs.timestamp >= %s AND jobs.timestamp < %s",
+                                            utc_day_range(day)).decode()
+            rows = execute_values(cur, RECLASSIFY_JOBS_SQL.format(day_condition=day_condition), changes,
+                                  template="(%s::integer, %s::text, %s::text)", page_size=len(changes), fetch=True)
+            days = {row['day']: row['count'] for row in rows}
+            if days:
+                cur.execute("""
+                    -- reclassify_prune_rollups
+                    DELETE FROM daily_domain_counts WHERE day = ANY(%s) AND count <= 0;
+                """, (list(days),))
+            return days
+
+    def export_watermark(self, date_str):
+        day_start, day_end = utc_day_range(date_str)
+        with db_cursor() as cur:
+            cur.execute("""
+            -- export_watermark
+            SELECT COUNT(*) AS count, COALESCE(MAX(id), 0) AS max_id
+            FROM jobs
+            WHERE timestamp >= %s AND timestamp < %s;
+            """, (day_start, day_end))
+            row = cur.fetchone()
+            check_not_archiving(cur, date_str)
+        return row['count'], row['max_id']
+
+    def stream_export_rows(self, date_str, domain=None, fetch_size=EXPORT_FETCH_SIZE):
+        # Named (server-side) cursor: only fetch_size rows are in memory at a time.
+        # Descriptions are looked up per chunk on the same connection.
+        day_start, day_end = utc_day_range(date_str)
+        domain_condition, params = "", ()
+        if domain == "other":
+            domain_condition = f"AND {ROLLUP_DOMAIN_SQL.format(domain='domain')} = 'other'"
+        elif domain:
+            domain_condition, params = "AND domain = %s", (domain,)  # checked inside idx_jobs_timestamp_domain
+        with db_connection() as conn:
+            with conn.cursor(name=f"export_{date_str.replace('-', '_')}",
+                             cursor_factory=psycopg2.extensions.cursor) as cur, conn.cursor() as lookup:
+                cur.itersize = fetch_size
+                cur.execute(f"""
+                SELECT {ROLLUP_DOMAIN_SQL.format(domain='domain')} AS domain, {', '.join(EXPORT_COLUMNS)}, description_hash
+                FROM jobs
+                WHERE timestamp >= %s AND timestamp < %s {domain_condition}
+                ORDER BY 1, id;
+                """, (day_start, day_end, *params))
+                check_not_archiving(lookup, date_str)
+                yield from resolve_descriptions(cur, lambda hashes: fetch_descriptions(lookup, hashes), fetch_size)
+
+    def backfill_rollups(self, start_day=None, end_day=None):
+        with db_cursor(commit=True) as cur:
+            backfill_rollups(cur, start_day, end_day)
+
+    def load_day(self, day, rows, chunk_rows=10_000):
+        # COPY into a staging table carrying each row's search document, then
+        # insert from there so the search vectors are computed server-side
+        description_field = LOAD_COLUMNS.index('job_description')
+        columns = [('description_hash' if column == 'job_description' else column) for column in LOAD_COLUMNS]
+        day_start, day_end = utc_day_range(day)
+        with db_cursor(commit=True) as cur:
+            from schema import ensure_partitions
+            ensure_partitions(cur, 0, day_start.date())
+            cur.execute("DELETE FROM jobs WHERE timestamp >= %s AND timestamp < %s;", (day_start, day_end))
+            cur.execute(f"""
+                CREATE TEMP TABLE load_jobs ON COMMIT DROP AS
+                SELECT {', '.join(columns)}, ''::text AS search_document FROM jobs LIMIT 0;
+            """)
+            rows = iter(rows)
+            while True:
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                descriptions = []
+                for row in islice(rows, chunk_rows):
+                    description = pack_description(row[description_field])
+                    descriptions.append(description)
+                    document = search_document(dict(zip(LOAD_COLUMNS, row)))
+                    row = list(row)
+                    row[description_field] = f"\\x{description[0].hex()}" if description else None
+                    writer.writerow(row + [document])
+                if not descriptions:
+                    break
+                store_descriptions(cur, descriptions)
+                buffer.seek(0)
+                cur.copy_expert("COPY load_jobs FROM STDIN WITH (FORMAT csv)", buffer)
+                cur.execute(f"""
+                    INSERT INTO jobs ({', '.join(columns)}, search_vector)
+                    SELECT {', '.join(columns)}, {TSVECTOR_SQL.format(document='search_document')} FROM load_jobs;
+                    TRUNCATE load_jobs;
+                """)
+            backfill_rollups(cur, day, day)
+
+    def search_jobs(self, query=None, domain=None, user_id=None, start_day=None, end_day=None, before_id=None,
+                    limit=SEARCH_PAGE_SIZE):
+        conditions, params = [], []
+        if query:
+            conditions.append("search_vector @@ websearch_to_tsquery(%s, %s)")
+            params += [SEARCH_LANGUAGE, query]
+        if domain == "other":
+            conditions.append(f"{ROLLUP_DOMAIN_SQL.format(domain='domain')} = 'other'")
+        elif domain:
+            conditions.append("domain = %s")
+            params.append(domain)
+        if user_id:
+            conditions.append("user_id = %s")
+            params.append(user_id)
+        if start_day:
+            conditions.append("timestamp >= %s")
+            params.append(utc_day_range(start_day)[0])
+        if end_day:
+            conditions.append("timestamp < %s")
+            params.append(utc_day_range(end_day)[1])
+        if before_id is not None:
+            conditions.append("id < %s")
+            params.append(before_id)
+        where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+
+        with db_cursor() as cur:
+            # Newest first by id, so the next page is just "id < last id"
+            cur.execute(f"""
+                -- search_jobs
+                SELECT id, user_id, company_name, job_title, location, job_url, domain, timestamp,
+                       job_description, description_hash
+                FROM jobs
+                {where}
+                ORDER BY id DESC
+                LIMIT %s;
+            """, (*params, limit))
+            rows = cur.fetchall()
+            return search_results(rows, lambda hashes: fetch_descriptions(cur, hashes))
+
+    def ensure_partitions(self, months_ahead):
+        from schema import ensure_partitions
+        with db_cursor(commit=True) as cur:
+            return ensure_partitions(cur, months_ahead)
+
+    def archivable_months(self, before):
+        from schema import list_month_partitions
+        with db_cursor() as cur:
+            months = set(list_month_partitions(cur))
+            # Late rows for months without a partition (any more) wait in the default one
+            cur.execute("""
+                -- archivable_default_months
+                SELECT DISTINCT date_trunc('month', timestamp AT TIME ZONE 'UTC')::date AS month
+                FROM jobs_default
+                WHERE timestamp < %s;
+            """, (utc_day_range(before)[0],))
+            months.update(row['month'] for row in cur.fetchall())
+        return sorted(month for month in months if next_month(month) <= before)
+
+    def archive_month(self, month, write_day):
+        from schema import PARTITION_LOCK, PARTITION_LOCK_TIMEOUT, list_month_partitions, month_bounds, partition_name
+        name = partition_name(month)
+        start, end = month_bounds(month)
+        with db_connection() as conn:
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_try_advisory_lock(%s, %s) AS locked", ARCHIVE_LOCK)
+                    if not cur.fetchone()['locked']:
+                        return 0  # Another host is archiving; it (or the next pass) gets this month
+            finally:
+                conn.autocommit = False
+
+            try:
+                # 1️⃣ Gather the month in a standalone table: detach its partition
+                # and move in late rows from the default partition. New rows
+                # for the month go to the default partition from here on.
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_advisory_xact_lock(%s, %s)", PARTITION_LOCK)
+                    cur.execute("SELECT set_config('lock_timeout', %s, true)", (PARTITION_LOCK_TIMEOUT,))
+                    attached = list_month_partitions(cur).get(month)
+                    if attached is None:
+                        cur.execute(f"CREATE TABLE {name} (LIKE jobs INCLUDING DEFAULTS INCLUDING CONSTRAINTS);")
+                    elif attached:
+                        cur.execute(f"ALTER TABLE jobs DETACH PARTITION {name};")
+                    cur.execute(f"""
+                        WITH moved AS (
+                            DELETE FROM jobs_default WHERE timestamp >= %s AND timestamp < %s RETURNING *
+                        )
+                        INSERT INTO {name} SELECT * FROM moved;
+                    """, (start, end))
+                conn.commit()
+
+                # 2️⃣ Archive it a day at a time, then drop it. A failed run leaves
+                # the detached table behind for the next one to finish.
+                archived = 0
+                day = start.date()
+                while day < end.date():
+                    day_start, day_end = utc_day_range(day)
+                    with conn.cursor(name=f"archive_{day:%Y%m%d}", cursor_factory=psycopg2.extensions.cursor) as cur, \
+                            conn.cursor() as lookup:
+                        cur.itersize = EXPORT_FETCH_SIZE
+                        cur.execute(f"""
+                            SELECT id, {ROLLUP_DOMAIN_SQL.format(domain='domain')} AS export_domain,
+                                   {', '.join(LOAD_COLUMNS)}, description_hash
+                            FROM {name}
+                            WHERE timestamp >= %s AND timestamp < %s
+                            ORDER BY 2, id;
+                        """, (day_start, day_end))
+                        archived += write_day(day.isoformat(), resolve_descriptions(
+                            cur, lambda hashes: fetch_descriptions(lookup, hashes), field=ARCHIVE_DESCRIPTION_FIELD))
+                    day += timedelta(days=1)
+                with conn.cursor() as cur:
+                    cur.execute(f"DROP TABLE {name};")
+                conn.commit()
+                return archived
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                conn.autocommit = True
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT pg_advisory_unlock(%s, %s)", ARCHIVE_LOCK)
+                finally:
+                    conn.autocommit = False
+
+    def prune_descriptions(self):
+        # Writers are only held off (DESCRIPTIONS_LOCK) for the final delete,
+        # not for the scan of the whole jobs table
+        from schema import list_month_partitions, partition_name
+        with db_cursor(commit=True) as cur:
+            # Not while a month is being archived, and counting the references
+            # from a detached month a failed run left behind
+            cur.execute("SELECT pg_advisory_xact_lock(%s, %s)", ARCHIVE_LOCK)
+            detached_references = "".join(
+                f"\n                  AND NOT EXISTS (SELECT 1 FROM {partition_name(month)} p WHERE p.description_hash = d.hash)"
+                for month, attached in list_month_partitions(cur).items() if not attached)
+            # Once no writer is mid-transaction, every job up to this id has committed
+            cur.execute("SELECT pg_advisory_lock(%s, %s)", DESCRIPTIONS_LOCK)
+            try:
+                cur.execute("SELECT COALESCE(MAX(id), 0) AS id FROM jobs;")
+                settled_id = cur.fetchone()['id']
+            finally:
+                cur.execute("SELECT pg_advisory_unlock(%s, %s)", DESCRIPTIONS_LOCK)
+            cur.execute(f"""
+                -- prune_description_candidates
+                CREATE TEMP TABLE prune_candidates ON COMMIT DROP AS
+                SELECT hash FROM job_descriptions d
+                WHERE NOT EXISTS (SELECT 1 FROM jobs WHERE jobs.description_hash = d.hash){detached_references};
+            """)
+            # Jobs after settled_id may have committed after that scan started
+            cur.execute("SELECT pg_advisory_xact_lock(%s, %s)", DESCRIPTIONS_LOCK)
+            cur.execute("""
+                -- prune_descriptions
+                DELETE FROM job_descriptions d USING prune_candidates c
+                WHERE d.hash = c.hash
+                  AND NOT EXISTS (SELECT 1 FROM jobs WHERE jobs.id > %s AND jobs.description_hash = d.hash);
+            """, (settled_id,))
+            return cur.rowcount
+
+    def warm(self):
+        get_pool().fill()
+
+    def close(self):
+        close_pool()
+
+    def stats(self):
+        return {"backend": self.name, "pool": get_pool_stats()}
@@ -0,0 +1,706 @@
+# storage/sqlite.py - Embedded SQLite backend for single-node installs
+#
+# One database file (SQLITE_PATH) in WAL mode: readers never block the writer
+# and every gunicorn worker opens the same file. Writes run in BEGIN IMMEDIATE
+# transactions, which take SQLite's single write lock up front and so play the
+# part of Postgres' advisory locks - the limit / duplicate check and the insert
+# can't interleave with another writer.
+#
+# Timestamps are stored as UTC text ('YYYY-MM-DD HH:MM:SS.ffffff') so they sort
+# chronologically and the first 10 characters are the UTC day. The rollup
+# tables have the same shape as in Postgres, so rollups.py reads them through
+# a cursor that speaks its %s / dict-row dialect.
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from itertools import islice
+
+from classifier import CLASSIFY_SCOPES, CLASSIFY_DESCRIPTION_FIELD
+from descriptions import pack_description, unpack_description, resolve_descriptions
+from job_store import DAILY_LIMIT, DUPLICATE_WINDOW_DAYS, validate_batch, plan_batch, finish_batch, dedup_key
+from metrics import observe_query
+from near_duplicates import job_signature, to_db
+from partitions import ARCHIVE_DESCRIPTION_FIELD, next_month
+from rollups import get_day_summary, get_range_summary
+from search import search_document, search_results, fts5_query, SEARCH_PAGE_SIZE
+from .base import Storage, EXPORT_COLUMNS, LOAD_COLUMNS
+
+SQLITE_PATH = os.getenv("SQLITE_PATH", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "job_logger.sqlite3"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # FULL to survive power loss, not just crashes
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", 10))  # seconds to wait for the write lock
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", 64 * 1024))
+
+sqlite3.register_adapter(date, lambda day: day.isoformat())
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+
+
+def migrate_descriptions(conn, batch_size=1000):
+    """Move descriptions into the content-addressed job_descriptions table"""
+    conn.execute("ALTER TABLE jobs ADD COLUMN description_hash BLOB;")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS job_descriptions (
+            hash BLOB PRIMARY KEY,
+            body BLOB NOT NULL,
+            length INTEGER NOT NULL
+        );
+    """)
+    last_id = 0
+    while True:
+        rows = conn.execute("""
+            SELECT id, job_description FROM jobs
+            WHERE job_description IS NOT NULL AND id > ?
+            ORDER BY id
+            LIMIT ?;
+        """, (last_id, batch_size)).fetchall()
+        if not rows:
+            return
+        packed = [(row[0], pack_description(row[1])) for row in rows]
+        conn.executemany(STORE_DESCRIPTION_SQL, [description for _, description in packed])
+        conn.executemany("UPDATE jobs SET description_hash = ?, job_description = NULL WHERE id = ?;",
+                         [(description[0], job_id) for job_id, description in packed])
+        last_id = rows[-1][0]
+
+
+def migrate_minhashes(conn, batch_size=1000):
+    """Near-duplicate signatures for the jobs still inside the duplicate window"""
+    conn.execute("ALTER TABLE jobs ADD COLUMN minhash BLOB;")
+    window_start = to_utc_text(datetime.utcnow() - timedelta(days=DUPLICATE_WINDOW_DAYS))
+    last_id = 0
+    while True:
+        rows = conn.execute("""
+            SELECT jobs.id, jobs.job_title, jobs.job_description, job_descriptions.body
+            FROM jobs
+            LEFT JOIN job_descriptions ON job_descriptions.hash = jobs.description_hash
+            WHERE jobs.timestamp >= ? AND jobs.id > ?
+            ORDER BY jobs.id
+            LIMIT ?;
+        """, (window_start, last_id, batch_size)).fetchall()
+        if not rows:
+            return
+        signatures = []
+        for job_id, job_title, inline, body in rows:
+            description = unpack_description(body) if body is not None else inline
+            signature = job_signature({'job_title': job_title, 'job_description': description})
+            if signature is not None:
+                signatures.append((to_db(signature), job_id))
+        conn.executemany("UPDATE jobs SET minhash = ? WHERE id = ?;", signatures)
+        last_id = rows[-1][0]
+
+
+def job_search_documents(conn, where, params, batch_size=1000):
+    """(id, search document) of the jobs matching a WHERE clause, by id"""
+    last_id = 0
+    while True:
+        rows = conn.execute(f"""
+            SELECT jobs.id, jobs.job_title, jobs.company_name, jobs.location, jobs.job_description, job_descriptions.body
+            FROM jobs
+            LEFT JOIN job_descriptions ON job_descriptions.hash = jobs.description_hash
+            WHERE ({where}) AND jobs.id > ?
+            ORDER BY jobs.id
+            LIMIT ?;
+        """, (*params, last_id, batch_size)).fetchall()
+        if not rows:
+            return
+        for job_id, job_title, company_name, location, inline, body in rows:
+            yield job_id, search_document({
+                'job_title': job_title, 'company_name': company_name, 'location': location,
+                'job_description': unpack_description(body) if body is not None else inline,
+            })
+        last_id = rows[-1][0]
+
+
+def migrate_search(conn):
+    """Full-text index of every job. Contentless, since the description is only
+    stored compressed; removing a job from it means passing its document again
+    (see job_search_documents)"""
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS jobs_fts
+        USING fts5(document, content='', tokenize='porter unicode61 remove_diacritics 2');
+    """)
+    conn.executemany(INDEX_JOB_SQL, job_search_documents(conn, "1", ()))
+
+
+# (version, description, SQL or callable(conn)) - applied in order and tracked
+# in PRAGMA user_version
+MIGRATIONS = [
+    (1, "jobs table, indexes and daily rollups", """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,  -- never reuses ids, export watermarks rely on it
+            user_id TEXT NOT NULL,
+            company_name TEXT,
+            job_title TEXT,
+            location TEXT,
+            job_description TEXT,
+            job_url TEXT,
+            domain TEXT,
+            timestamp TEXT NOT NULL,
+            fingerprint TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_user_timestamp ON jobs (user_id, timestamp);
+        CREATE INDEX IF NOT EXISTS idx_jobs_timestamp_domain ON jobs (timestamp, domain);
+        CREATE INDEX IF NOT EXISTS idx_jobs_fingerprint_timestamp ON jobs (fingerprint, timestamp);
+        CREATE TABLE IF NOT EXISTS daily_domain_counts (
+            day DATE NOT NULL,
+            domain TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, domain)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS daily_active_users (
+            day DATE NOT NULL,
+            user_id TEXT NOT NULL,
+            PRIMARY KEY (day, user_id)
+        ) WITHOUT ROWID;
+    """),
+    (2, "content-addressed compressed job descriptions", migrate_descriptions),
+    (3, "MinHash signatures for near-duplicate detection", migrate_minhashes),
+    (4, "full-text search index", migrate_search),
+    (5, "flag domains filled in by the classifier", """
+        ALTER TABLE jobs ADD COLUMN domain_auto INTEGER NOT NULL DEFAULT 0;
+    """),
+]
+
+INSERT_JOB_SQL = """
+    -- insert_job
+    INSERT INTO jobs (user_id, company_name, job_title, location, description_hash, job_url, domain, timestamp,
+                      fingerprint, minhash)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+"""
+INDEX_JOB_SQL = """
+    -- index_job
+    INSERT INTO jobs_fts (rowid, document) VALUES (?, ?);
+"""
+UNINDEX_JOB_SQL = """
+    -- unindex_job
+    INSERT INTO jobs_fts (jobs_fts, rowid, document) VALUES ('delete', ?, ?);
+"""
+STORE_DESCRIPTION_SQL = """
+    -- store_descriptions
+    INSERT INTO job_descriptions (hash, body, length) VALUES (?, ?, ?)
+    ON CONFLICT (hash) DO NOTHING;
+"""
+ROLLUP_DOMAIN_UPSERT = """
+    -- rollup_domains
+    INSERT INTO daily_domain_counts (day, domain, count) VALUES (?, ?, ?)
+    ON CONFLICT (day, domain) DO UPDATE SET count = count + excluded.count;
+"""
+ROLLUP_USER_UPSERT = """
+    -- rollup_users
+    INSERT INTO daily_active_users (day, user_id) VALUES (?, ?)
+    ON CONFLICT DO NOTHING;
+"""
+
+
+def to_utc_text(value):
+    """Normalize an ISO 8601 timestamp (naive = UTC) to the stored UTC text form"""
+    if isinstance(value, datetime):
+        moment = value
+    else:
+        moment = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def day_bounds(day):
+    """Half-open [start, end) of a UTC date in the stored timestamp form"""
+    if not isinstance(day, date):
+        day = date.fromisoformat(day)
+    return f"{day.isoformat()} 00:00:00", f"{(day + timedelta(days=1)).isoformat()} 00:00:00"
+
+
+def rollup_domain(domain):
+    return domain or "other"  # Must match ROLLUP_DOMAIN_SQL
+
+
+class RollupCursor:
+    """sqlite3 cursor accepting the psycopg2-style SQL in rollups.py (%s
+    placeholders, dict rows) so the summary code is shared with Postgres"""
+
+    _translated = {}
+
+    def __init__(self, conn):
+        self._cur = conn.cursor()
+
+    def execute(self, sql, params=()):
+        query = self._translated.get(sql)
+        if query is None:
+            query = self._translated[sql] = sql.replace("%%", "\0").replace("%s", "?").replace("\0", "%")
+        started = time.perf_counter()
+        self._cur.execute(query, params)
+        observe_query(sql, time.perf_counter() - started)
+
+    def fetchone(self):
+        row = self._cur.fetchone()
+        return dict(row) if row is not None else None
+
+    def fetchall(self):
+        return [dict(row) for row in self._cur.fetchall()]
+
+
+class SQLiteStorage(Storage):
+    name = "sqlite"
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._migrated = False
+
+    # ---- connections --------------------------------------------------------
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None,
+                               detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS};")
+        conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB};")
+        conn.execute("PRAGMA temp_store=MEMORY;")
+        return conn
+
+    def _conn(self):
+        """This thread's connection (reopened after a fork)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._connect()
+            self._local.conn, self._local.pid = conn, os.getpid()
+            if not self._migrated:
+                self.migrate()
+        return conn
+
+    def warm(self):
+        self._conn()
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
+
+    def _execute(self, conn, sql, params=()):
+        started = time.perf_counter()
+        cur = conn.execute(sql, params)
+        observe_query(sql, time.perf_counter() - started)
+        return cur
+
+    @contextmanager
+    def _write(self):
+        """BEGIN IMMEDIATE ... COMMIT, rolled back if the block raises"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK;")
+            raise
+        conn.execute("COMMIT;")
+
+    def migrate(self):
+        conn = getattr(self._local, "conn", None) or self._connect()
+        self._local.conn, self._local.pid = conn, os.getpid()
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            current = conn.execute("PRAGMA user_version;").fetchone()[0]
+            for version, description, step in MIGRATIONS:
+                if version <= current:
+                    continue
+                if callable(step):
+                    step(conn)
+                else:
+                    for statement in step.split(";"):
+                        if statement.strip():
+                            conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {int(version)};")
+                print(f"✅ Applied SQLite migration {version}: {description}")
+        except BaseException:
+            conn.execute("ROLLBACK;")
+            raise
+        conn.execute("COMMIT;")
+        self._migrated = True
+
+    # ---- writes -------------------------------------------------------------
+
+    def _store_descriptions(self, conn, rows):
+        """Store the descriptions of normalized rows; returns the rows with the
+        description replaced by its hash"""
+        packed_rows, descriptions = [], {}
+        for row in rows:
+            description = pack_description(row[4])
+            if description:
+                descriptions[description[0]] = description
+            packed_rows.append((*row[:4], description[0] if description else None, *row[5:]))
+        conn.executemany(STORE_DESCRIPTION_SQL, [descriptions[key] for key in sorted(descriptions)])
+        return packed_rows
+
+    def _insert_rows(self, conn, rows):
+        """Insert normalized rows and index them for search; returns their ids"""
+        documents = [search_document({'job_title': row[2], 'company_name': row[1], 'location': row[3],
+                                      'job_description': row[4]}) for row in rows]
+        job_ids = [self._execute(conn, INSERT_JOB_SQL, row).lastrowid for row in self._store_descriptions(conn, rows)]
+        conn.executemany(INDEX_JOB_SQL, zip(job_ids, documents))
+        return job_ids
+
+    def _insert(self, conn, rows):
+        """Insert normalized rows and add them to the rollups; returns their ids"""
+        job_ids, domain_counts, users = self._insert_rows(conn, rows), {}, set()
+        for row in rows:
+            day = row[7][:10]
+            key = (day, rollup_domain(row[6]))
+            domain_counts[key] = domain_counts.get(key, 0) + 1
+            users.add((day, row[0]))
+        conn.executemany(ROLLUP_DOMAIN_UPSERT, [(day, domain, n) for (day, domain), n in sorted(domain_counts.items())])
+        conn.executemany(ROLLUP_USER_UPSERT, sorted(users))
+        return job_ids
+
+    @staticmethod
+    def _job_row(data, fingerprint, minhash=None):
+        return (data['user_id'], data['company_name'], data['job_title'], data['location'],
+                data['job_description'], data['job_url'], data['domain'], to_utc_text(data['timestamp']),
+                fingerprint, minhash)
+
+    def log_job(self, data, fingerprint, today, minhash=None):
+        row = self._job_row(data, fingerprint, minhash)
+        day_start, day_end = day_bounds(today)
+        window_start = to_utc_text(datetime.utcnow() - timedelta(days=DUPLICATE_WINDOW_DAYS))
+
+        with self._write() as conn:
+            current_count = self._execute(conn, """
+                -- log_job_count
+                SELECT COUNT(*) FROM jobs WHERE user_id = ? AND timestamp >= ? AND timestamp < ?;
+            """, (data['user_id'], day_start, day_end)).fetchone()[0]
+            duplicate = self._execute(conn, """
+                -- log_job_dedup
+                SELECT id FROM jobs WHERE fingerprint = ? AND timestamp >= ? LIMIT 1;
+            """, (fingerprint, window_start)).fetchone()
+
+            job_id = job_day = None
+            if current_count < DAILY_LIMIT and duplicate is None:
+                job_id = self._insert(conn, [row])[0]
+                job_day = date.fromisoformat(row[7][:10])
+
+        return {
+            "current_count": current_count,
+            "duplicate_id": duplicate[0] if duplicate else None,
+            "job_id": job_id,
+            "job_day": job_day,
+        }
+
+    def is_transient_error(self, error):
+        # Locked / busy database, disk full or I/O errors
+        return isinstance(error, (sqlite3.OperationalError, OSError))
+
+    def log_jobs(self, jobs, minhashes=None):
+        results, valid = validate_batch(jobs)
+        if not valid:
+            return results
+        rows = {index: self._job_row(data, dedup_key(data), minhashes[index] if minhashes else None)
+                for index, data in valid}
+        fingerprints = {index: rows[index][8] for index, _ in valid}
+        user_ids = sorted({data['user_id'] for _, data in valid})
+        keys = sorted(set(fingerprints.values()))
+        day_start, day_end = day_bounds(datetime.utcnow().date())
+        window_start = to_utc_text(datetime.utcnow() - timedelta(days=DUPLICATE_WINDOW_DAYS))
+
+        with self._write() as conn:
+            counts = dict(self._execute(conn, f"""
+                -- batch_day_counts
+                SELECT user_id, COUNT(*) FROM jobs
+                WHERE user_id IN ({','.join('?' * len(user_ids))}) AND timestamp >= ? AND timestamp < ?
+                GROUP BY user_id;
+            """, (*user_ids, day_start, day_end)).fetchall())
+            existing = dict(self._execute(conn, f"""
+                -- batch_dedup
+                SELECT fingerprint, MIN(id) FROM jobs
+                WHERE fingerprint IN ({','.join('?' * len(keys))}) AND timestamp >= ?
+                GROUP BY fingerprint;
+            """, (*keys, window_start)).fetchall())
+
+            to_insert = plan_batch(results, valid, fingerprints, counts, existing)
+            job_ids = self._insert(conn, [rows[index] for index, _, _ in to_insert])
+
+        return finish_batch(results, to_insert, job_ids)
+
+    def load_day(self, day, rows):
+        day_start, day_end = day_bounds(day)
+        with self._write() as conn:
+            conn.executemany(UNINDEX_JOB_SQL, job_search_documents(
+                conn, "jobs.timestamp >= ? AND jobs.timestamp < ?", (day_start, day_end)))
+            conn.execute("DELETE FROM jobs WHERE timestamp >= ? AND timestamp < ?;", (day_start, day_end))
+            rows = iter(rows)
+            while True:
+                chunk = [(*row[:7], to_utc_text(row[7]), row[8], None) for row in islice(rows, 10_000)]
+                if not chunk:
+                    break
+                self._insert_rows(conn, chunk)
+            self._backfill(conn, day, day)
+
+    def archivable_months(self, before):
+        months = self._execute(self._conn(), """
+            -- archivable_months
+            SELECT DISTINCT substr(timestamp, 1, 7) FROM jobs WHERE timestamp < ?;
+        """, (day_bounds(before)[0],)).fetchall()
+        months = [date.fromisoformat(f"{row[0]}-01") for row in months]
+        return sorted(month for month in months if next_month(month) <= before)
+
+    def archive_month(self, month, write_day):
+        # A day per write transaction: writers wait for one day's archive, not a month's
+        archived = 0
+        day = month
+        while day < next_month(month):
+            day_start, day_end = day_bounds(day)
+            with self._write() as conn:
+                cur = self._execute(conn, f"""
+                    -- archive_day
+                    SELECT id, COALESCE(NULLIF(domain, ''), 'other'), {', '.join(LOAD_COLUMNS)}, description_hash
+                    FROM jobs
+                    WHERE timestamp >= ? AND timestamp < ?
+                    ORDER BY 2, id;
+                """, (day_start, day_end))
+
+                def fetch_bodies(hashes):
+                    return dict(self._execute(conn, f"""
+                        -- fetch_descriptions
+                        SELECT hash, body FROM job_descriptions WHERE hash IN ({','.join('?' * len(hashes))});
+                    """, hashes).fetchall())
+
+                timestamp_field = 2 + LOAD_COLUMNS.index('timestamp')
+                rows = ((*row[:timestamp_field], datetime.fromisoformat(row[timestamp_field]), *row[timestamp_field + 1:])
+                        for row in cur)
+                count = write_day(day.isoformat(), resolve_descriptions(rows, fetch_bodies,
+                                                                        field=ARCHIVE_DESCRIPTION_FIELD))
+                if count:
+                    conn.executemany(UNINDEX_JOB_SQL, job_search_documents(
+                        conn, "jobs.timestamp >= ? AND jobs.timestamp < ?", (day_start, day_end)))
+                    conn.execute("DELETE FROM jobs WHERE timestamp >= ? AND timestamp < ?;", (day_start, day_end))
+            archived += count
+            day += timedelta(days=1)
+        return archived
+
+    def reclassify_jobs(self, changes, day=None):
+        moves, days = {}, {}
+        with self._write() as conn:
+            for job_id, old_domain, new_domain in changes:
+                row = self._execute(conn, """
+                    -- reclassify_job
+                    UPDATE jobs SET domain = ?, domain_auto = 1
+                    WHERE id = ? AND domain IS ?
+                    RETURNING substr(timestamp, 1, 10);
+                """, (new_domain, job_id, old_domain)).fetchone()
+                if row is None:
+                    continue  # Gone, or its domain changed since it was read
+                changed_day = date.fromisoformat(row[0])
+                days[changed_day] = days.get(changed_day, 0) + 1
+                for domain, delta in ((rollup_domain(old_domain), -1), (rollup_domain(new_domain), 1)):
+                    moves[(changed_day, domain)] = moves.get((changed_day, domain), 0) + delta
+            conn.executemany(ROLLUP_DOMAIN_UPSERT, [(changed_day, domain, delta) for (changed_day, domain), delta
+                                                    in sorted(moves.items()) if delta])
+            conn.executemany("DELETE FROM daily_domain_counts WHERE day = ? AND count <= 0;",
+                             [(changed_day,) for changed_day in sorted(days)])
+        return days
+
+    def prune_descriptions(self):
+        with self._write() as conn:
+            return self._execute(conn, """
+                -- prune_descriptions
+                DELETE FROM job_descriptions
+                WHERE NOT EXISTS (SELECT 1 FROM jobs WHERE jobs.description_hash = job_descriptions.hash);
+            """).rowcount
+
+    def _backfill(self, conn, start_day=None, end_day=None):
+        if start_day is None:
+            # Archived days (partitions.py) have no jobs left to count; keep their rollups
+            first = conn.execute("SELECT MIN(timestamp) FROM jobs;").fetchone()[0]
+            if first is None:
+                return
+            start_day = date.fromisoformat(first[:10])
+        conditions, params = [], []
+        day_conditions, day_params = [], []
+        if start_day:
+            conditions.append("timestamp >= ?")
+            params.append(day_bounds(start_day)[0])
+            day_conditions.append("day >= ?")
+            day_params.append(start_day)
+        if end_day:
+            conditions.append("timestamp < ?")
+            params.append(day_bounds(end_day)[1])
+            day_conditions.append("day <= ?")
+            day_params.append(end_day)
+        where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+        day_where = ("WHERE " + " AND ".join(day_conditions)) if day_conditions else ""
+
+        conn.execute(f"DELETE FROM daily_domain_counts {day_where};", day_params)
+        conn.execute(f"DELETE FROM daily_active_users {day_where};", day_params)
+        conn.execute(f"""
+            INSERT INTO daily_domain_counts (day, domain, count)
+            SELECT substr(timestamp, 1, 10), COALESCE(NULLIF(domain, ''), 'other'), COUNT(*)
+            FROM jobs {where}
+            GROUP BY 1, 2;
+        """, params)
+        conn.execute(f"""
+            INSERT INTO daily_active_users (day, user_id)
+            SELECT DISTINCT substr(timestamp, 1, 10), user_id
+            FROM jobs {where};
+        """, params)
+
+    def backfill_rollups(self, start_day=None, end_day=None):
+        with self._write() as conn:
+            self._backfill(conn, start_day, end_day)
+
+    # ---- reads --------------------------------------------------------------
+
+    def recent_signatures(self, since, after_id=0):
+        rows = self._execute(self._conn(), """
+            -- recent_signatures
+            SELECT id, minhash, fingerprint, job_title, company_name, location, timestamp
+            FROM jobs
+            WHERE id > ? AND timestamp >= ? AND minhash IS NOT NULL
+            ORDER BY id;
+        """, (after_id, to_utc_text(datetime.utcfromtimestamp(since)))).fetchall()
+        return [(*row[:6], datetime.fromisoformat(row[6]).replace(tzinfo=timezone.utc).timestamp()) for row in rows]
+
+    def count_user_jobs(self, user_id, day):
+        day_start, day_end = day_bounds(day)
+        return self._execute(self._conn(), """
+            -- user_job_count
+            SELECT COUNT(*) FROM jobs WHERE user_id = ? AND timestamp >= ? AND timestamp < ?;
+        """, (user_id, day_start, day_end)).fetchone()[0]
+
+    def day_summary(self, day):
+        return get_day_summary(RollupCursor(self._conn()), day)
+
+    def range_summary(self, start_day, end_day):
+        return get_range_summary(RollupCursor(self._conn()), start_day, end_day)
+
+    def search_jobs(self, query=None, domain=None, user_id=None, start_day=None, end_day=None, before_id=None,
+                    limit=SEARCH_PAGE_SIZE):
+        conditions, params = [], []
+        source, key = "jobs", "jobs.id"
+        if query:
+            match = fts5_query(query)
+            if match is None:
+                return []
+            # Keyed on the FTS rowid, FTS5 yields matches newest first and
+            # applies the cursor itself, so a page stops after `limit` rows
+            source, key = "jobs_fts JOIN jobs ON jobs.id = jobs_fts.rowid", "jobs_fts.rowid"
+            conditions.append("jobs_fts MATCH ?")
+            params.append(match)
+        if domain == "other":
+            conditions.append("COALESCE(NULLIF(domain, ''), 'other') = 'other'")
+        elif domain:
+            conditions.append("domain = ?")
+            params.append(domain)
+        if user_id:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        if start_day:
+            conditions.append("timestamp >= ?")
+            params.append(day_bounds(start_day)[0])
+        if end_day:
+            conditions.append("timestamp < ?")
+            params.append(day_bounds(end_day)[1])
+        if before_id is not None:
+            conditions.append(f"{key} < ?")
+            params.append(before_id)
+        where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+
+        conn = self._conn()
+        rows = self._execute(conn, f"""
+            -- search_jobs
+            SELECT jobs.id, user_id, company_name, job_title, location, job_url, domain, timestamp,
+                   job_description, description_hash
+            FROM {source}
+            {where}
+            ORDER BY {key} DESC
+            LIMIT ?;
+        """, (*params, limit)).fetchall()
+        rows = [{**dict(row), 'timestamp': datetime.fromisoformat(row['timestamp'])} for row in rows]
+
+        def fetch_bodies(hashes):
+            return dict(self._execute(conn, f"""
+                -- fetch_descriptions
+                SELECT hash, body FROM job_descriptions WHERE hash IN ({','.join('?' * len(hashes))});
+            """, hashes).fetchall())
+
+        return search_results(rows, fetch_bodies)
+
+    def first_job_day(self):
+        first = self._execute(self._conn(), """
+            -- first_job_day
+            SELECT MIN(timestamp) FROM jobs;
+        """).fetchone()[0]
+        return date.fromisoformat(first[:10]) if first else None
+
+    def classification_rows(self, day, scope="unclassified"):
+        # Own connection, like the export: the caller writes while this streams
+        day_start, day_end = day_bounds(day)
+        conn = self._connect()
+        try:
+            conn.row_factory = None
+            cur = conn.execute(f"""
+                SELECT id, domain, domain_auto, job_title, job_description, description_hash
+                FROM jobs
+                WHERE timestamp >= ? AND timestamp < ? AND {CLASSIFY_SCOPES[scope]}
+                ORDER BY id;
+            """, (day_start, day_end))
+
+            def fetch_bodies(hashes):
+                return dict(self._execute(conn, f"""
+                    -- fetch_descriptions
+                    SELECT hash, body FROM job_descriptions WHERE hash IN ({','.join('?' * len(hashes))});
+                """, hashes).fetchall())
+
+            yield from resolve_descriptions(cur, fetch_bodies, field=CLASSIFY_DESCRIPTION_FIELD)
+        finally:
+            conn.close()
+
+    def export_watermark(self, date_str):
+        day_start, day_end = day_bounds(date_str)
+        row = self._execute(self._conn(), """
+            -- export_watermark
+            SELECT COUNT(*), COALESCE(MAX(id), 0) FROM jobs WHERE timestamp >= ? AND timestamp < ?;
+        """, (day_start, day_end)).fetchone()
+        return row[0], row[1]
+
+    def stream_export_rows(self, date_str, domain=None):
+        # Own connection and plain tuples; WAL lets writers carry on meanwhile.
+        # Descriptions are looked up per chunk of rows on the same connection.
+        day_start, day_end = day_bounds(date_str)
+        domain_condition, params = "", ()
+        if domain == "other":
+            domain_condition = "AND COALESCE(NULLIF(domain, ''), 'other') = 'other'"
+        elif domain:
+            domain_condition, params = "AND domain = ?", (domain,)
+        conn = self._connect()
+        try:
+            conn.row_factory = None
+            # Spill the domain sort to disk rather than holding the day in memory
+            conn.execute("PRAGMA temp_store=FILE;")
+            conn.execute("PRAGMA cache_size=-8192;")
+            cur = conn.execute(f"""
+                SELECT COALESCE(NULLIF(domain, ''), 'other') AS domain, {', '.join(EXPORT_COLUMNS)}, description_hash
+                FROM jobs
+                WHERE timestamp >= ? AND timestamp < ? {domain_condition}
+                ORDER BY 1, id;
+            """, (day_start, day_end, *params))
+
+            def fetch_bodies(hashes):
+                return dict(self._execute(conn, f"""
+                    -- fetch_descriptions
+                    SELECT hash, body FROM job_descriptions WHERE hash IN ({','.join('?' * len(hashes))});
+                """, hashes).fetchall())
+
+            yield from resolve_descriptions(cur, fetch_bodies)
+        finally:
+            conn.close()
+
+    def stats(self):
+        wal_path = f"{self.path}-wal"
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "db_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            "wal_bytes": os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+        }
@@ -0,0 +1,98 @@
+# test_near_duplicates.py - The near-duplicate check on the logging path
+#
+# Runs against a throwaway embedded SQLite database, from server/:
+#
+#     python -m unittest discover tests
+
+import os
+import sys
+import tempfile
+import time
+import unittest
+from datetime import datetime
+
+_work_dir = tempfile.TemporaryDirectory()
+os.environ.update({
+    "STORAGE_BACKEND": "sqlite",
+    "SQLITE_PATH": os.path.join(_work_dir.name, "jobs.sqlite3"),
+    "QUOTA_DB": os.path.join(_work_dir.name, "quota.sqlite3"),
+    "CLASSIFY_ENABLED": "0",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_store import log_job, log_jobs  # noqa: E402
+from near_duplicates import get_near_duplicate_index  # noqa: E402
+from storage import get_storage  # noqa: E402
+
+BOILERPLATE = (
+    "Acme builds the payments platform trusted by thousands of merchants worldwide. We are a remote friendly "
+    "team that values ownership, kindness and shipping often. Benefits include competitive salary, equity, "
+    "health insurance for you and your family, a learning budget, and four weeks of paid vacation every year. "
+    "Acme is an equal opportunity employer and welcomes applicants from every background. "
+)
+
+
+def job(user_id, title, role_text, url):
+    return {
+        "user_id": user_id,
+        "company_name": "Acme",
+        "job_title": title,
+        "location": "Berlin",
+        "job_description": BOILERPLATE + role_text,
+        "job_url": url,
+        "domain": "software_development",
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+    }
+
+
+BACKEND = job("user-a", "Senior Backend Engineer",
+              "You will design APIs in Python and Go and run Postgres at scale.",
+              "https://boards.greenhouse.io/acme/jobs/1001")
+DESIGNER = job("user-b", "Product Designer",
+               "You will own the checkout flows in Figma and run user research.",
+               "https://boards.greenhouse.io/acme/jobs/1002")
+
+
+class NearDuplicateTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        get_storage().migrate()
+        index = get_near_duplicate_index()
+        deadline = time.monotonic() + 10
+        while not index.ready and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert index.ready, "near-duplicate index did not load"
+
+    def test_distinct_roles_sharing_boilerplate_are_both_logged(self):
+        first = log_job(BACKEND)
+        second = log_job(DESIGNER)
+        self.assertEqual(first["status"], "success")
+        self.assertEqual(second["status"], "success")
+        self.assertNotEqual(first["job_id"], second["job_id"])
+
+    def test_repost_is_logged_and_points_at_the_original(self):
+        original = log_job(job("user-c", "Data Engineer", "You will build Spark pipelines on Airflow.",
+                               "https://jobs.lever.co/acme/2001"))
+        repost = log_job(job("user-d", "Data Engineer", "You will build Spark pipelines on Airflow.",
+                             "https://acme.com/careers/data-engineer"))
+        self.assertEqual(repost["status"], "possible_duplicate")
+        self.assertIsNotNone(repost["job_id"])
+        self.assertNotEqual(repost["job_id"], original["job_id"])
+        self.assertEqual(repost["duplicate_job_id"], original["job_id"])
+
+    def test_batch_repost_is_logged(self):
+        results = log_jobs([
+            job("user-e", "Site Reliability Engineer", "You will run Kubernetes and on-call.",
+                "https://jobs.lever.co/acme/3001"),
+            job("user-e", "Site Reliability Engineer", "You will run Kubernetes and on-call.",
+                "https://acme.com/careers/sre"),
+            job("user-e", "Frontend Engineer", "You will build React interfaces.",
+                "https://jobs.lever.co/acme/3002"),
+        ])
+        self.assertEqual([result["status"] for result in results], ["success", "possible_duplicate", "success"])
+        self.assertEqual(results[1]["duplicate_job_id"], results[0]["job_id"])
+        self.assertIsNotNone(results[1]["job_id"])
+
+
+if __name__ == "__main__":
+    unittest.main()